@@ -5,17 +5,40 @@ multiple policies on the same resource type.
 """
 import pickle  # nosec nosemgrep
 
+from collections import Counter
 from datetime import datetime, timedelta
 import os
 import logging
 import sqlite3
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 log = logging.getLogger('custodian.cache')
 
 CACHE_NOTIFY = False
 
+# Execution scoped population store, see c7n.planner
+SHARED_STORE = None
+
+# Default bytes of compressed values held by a sqlite cache, the
+# cache_size option sets it in megabytes.
+CACHE_SIZE = 1024 * 1024 * 1024
+
 
 def factory(config):
+    backend = _factory(config)
+    # Populations are only shared across policies when caching is enabled,
+    # disabling it (ie. a zero cache period) asks for a fresh fetch per policy.
+    if SHARED_STORE is not None and not isinstance(backend, NullCache):
+        return SharedCache(config, SHARED_STORE, backend)
+    return backend
+
+
+def _factory(config):
 
     global CACHE_NOTIFY
 
@@ -52,6 +75,9 @@ class Cache:
     def size(self):
         return 0
 
+    def get_stats(self):
+        return {}
+
     def close(self):
         pass
 
@@ -89,10 +115,64 @@ class InMemoryCache(Cache):
         return sum(map(len, self.data.values()))
 
 
+class SharedCache(Cache):
+    """Layer a run scoped population store over a configured cache.
+
+    Populations are held pickled, so each reader gets an isolated copy
+    it can annotate freely without affecting other policies.
+    """
+
+    def __init__(self, config, store, backend):
+        super().__init__(config)
+        self.store = store
+        self.backend = backend
+
+    def load(self):
+        return self.backend.load()
+
+    def get(self, key):
+        ekey = encode(key)
+        value = self.store.get(ekey)
+        if value is not None:
+            return pickle.loads(value)  # nosec nosemgrep
+        data = self.backend.get(key)
+        if data is not None:
+            self.store[ekey] = encode(data)
+        return data
+
+    def save(self, key, data):
+        self.store[encode(key)] = encode(data)
+        self.backend.save(key, data)
+
+    def size(self):
+        return self.backend.size()
+
+    def get_stats(self):
+        return self.backend.get_stats()
+
+    def close(self):
+        self.backend.close()
+
+
 def encode(key):
     return pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)  # nosemgrep
 
 
+def compress(value):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor().compress(value)
+    return 'zlib', zlib.compress(value)
+
+
+def decompress(codec, value):
+    if codec == 'zlib':
+        return zlib.decompress(value)
+    elif codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(value)
+    # written by an install with a codec we don't have
+    return None
+
+
 def resolve_path(path):
     return os.path.abspath(
         os.path.expanduser(
@@ -100,20 +180,59 @@ def resolve_path(path):
 
 
 class SqlKvCache(Cache):
+    """Sqlite backed cache shared by processes on a host.
+
+    Values are stored compressed (zstd if available, else zlib) with the
+    account, region and resource type of their key indexed for selective
+    invalidation. The database uses write ahead logging so concurrent
+    readers aren't blocked by writers, and entries are evicted least
+    recently used first to keep the total of their sizes under the
+    configured cache size.
+    """
+
+    # Bump on schema or value encoding changes, older caches are dropped.
+    version = 2
 
     create_table = """
     create table if not exists c7n_cache (
         key blob primary key,
         value blob,
-        create_date timestamp
+        codec text,
+        account text,
+        region text,
+        resource text,
+        size integer,
+        create_date timestamp,
+        access_date timestamp
     )
     """
 
+    create_indexes = (
+        "create index if not exists c7n_cache_scope on c7n_cache (account, region, resource)",
+        "create index if not exists c7n_cache_access on c7n_cache (access_date)",
+    )
+
+    # Seconds to wait on locks held by other processes
+    busy_timeout = 30
+
     def __init__(self, config):
         super().__init__(config)
         self.cache_period = config.cache_period
         self.cache_path = resolve_path(config.cache)
+        cache_size = getattr(config, 'cache_size', None)
+        self.cache_size = cache_size and cache_size * 1024 * 1024 or CACHE_SIZE
         self.conn = None
+        self.stats = Counter()
+        # Upper bound on the total size of entries, from the last eviction
+        # check plus the sizes of values saved since.
+        self.total_size = None
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.cache_path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute('pragma journal_mode=wal')
+        conn.execute('pragma synchronous=normal')
+        return conn
 
     def init(self):
         # migration from pickle cache file
@@ -126,8 +245,8 @@ class SqlKvCache(Cache):
         elif not os.path.exists(os.path.dirname(self.cache_path)):
             # parent directory creation
             os.makedirs(os.path.dirname(self.cache_path))
-        self.conn = sqlite3.connect(self.cache_path)
-        self.conn.execute(self.create_table)
+        self.conn = self.connect()
+        self.migrate()
         with self.conn as cursor:
             result = cursor.execute(
                 'delete from c7n_cache where create_date < ?',
@@ -135,37 +254,124 @@ class SqlKvCache(Cache):
             if result.rowcount:
                 log.debug('expired %d stale cache entries', result.rowcount)
 
+    def migrate(self):
+        if self.conn.execute('pragma user_version').fetchone()[0] == self.version:
+            return
+        self.conn.execute('begin immediate')
+        try:
+            # recheck as another process may have migrated while we waited
+            migrated = self.conn.execute(
+                'pragma user_version').fetchone()[0] == self.version
+            if not migrated:
+                log.debug('migrating cache to version %d', self.version)
+                self.conn.execute('drop table if exists c7n_cache')
+                self.conn.execute(self.create_table)
+                for index in self.create_indexes:
+                    self.conn.execute(index)
+                self.conn.execute('pragma user_version = %d' % self.version)
+            self.conn.execute('commit')
+        except Exception:
+            self.conn.execute('rollback')
+            raise
+        if not migrated:
+            # release the space of previous cache versions
+            self.conn.execute('vacuum')
+
     def load(self):
         if not self.conn:
             self.init()
         return True
 
     def get(self, key):
+        ekey = sqlite3.Binary(encode(key))
         with self.conn as cursor:
             r = cursor.execute(
-                'select value, create_date from c7n_cache where key = ?',
-                [sqlite3.Binary(encode(key))]
-            )
+                'select value, codec, create_date from c7n_cache where key = ?', [ekey])
             row = r.fetchone()
             if row is None:
+                self.stats['misses'] += 1
                 return None
-            value, create_date = row
+            value, codec, create_date = row
             create_date = sqlite3.converters['TIMESTAMP'](create_date.encode('utf8'))
             if (datetime.utcnow() - create_date).total_seconds() / 60.0 > self.cache_period:
+                self.stats['misses'] += 1
                 return None
-            return pickle.loads(value)  # nosec nosemgrep
+            data = decompress(codec, value)
+            if data is None:
+                self.stats['misses'] += 1
+                return None
+            cursor.execute(
+                'update c7n_cache set access_date = ? where key = ?',
+                (datetime.utcnow(), ekey))
+        self.stats['hits'] += 1
+        self.stats['bytes_read'] += len(value)
+        return pickle.loads(data)  # nosec nosemgrep
 
     def save(self, key, data, timestamp=None):
+        codec, value = compress(encode(data))
+        scope = isinstance(key, dict) and key or {}
         with self.conn as cursor:
             timestamp = timestamp or datetime.utcnow()
             cursor.execute(
-                'replace into c7n_cache (key, value, create_date) values (?, ?, ?)',
-                (sqlite3.Binary(encode(key)), sqlite3.Binary(encode(data)), timestamp))
+                'replace into c7n_cache (key, value, codec, account, region, resource,'
+                ' size, create_date, access_date) values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (sqlite3.Binary(encode(key)), sqlite3.Binary(value), codec,
+                 scope.get('account'), scope.get('region'), scope.get('resource'),
+                 len(value), timestamp, datetime.utcnow()))
+        self.stats['bytes_written'] += len(value)
+        if self.total_size is not None:
+            self.total_size += len(value)
+        if self.total_size is None or self.total_size > self.cache_size:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries in excess of the cache size.
+
+        Saves only check the cache's total size once the values written
+        since the last check could exceed the cache size.
+        """
+        total = self.conn.execute(
+            'select coalesce(sum(size), 0) from c7n_cache').fetchone()[0]
+        self.total_size = total
+        if total <= self.cache_size:
+            return
+        evict = []
+        for key, size in self.conn.execute(
+                'select key, size from c7n_cache order by access_date'):
+            if total <= self.cache_size:
+                break
+            evict.append((key,))
+            total -= size
+        with self.conn as cursor:
+            cursor.executemany('delete from c7n_cache where key = ?', evict)
+        self.total_size = total
+        log.debug('evicted %d cache entries', len(evict))
+
+    def invalidate(self, account=None, region=None, resource=None):
+        """Remove the entries matching the given key scope."""
+        clauses, params = [], []
+        for column, value in (
+                ('account', account), ('region', region), ('resource', resource)):
+            if value is not None:
+                clauses.append('%s = ?' % column)
+                params.append(value)
+        query = 'delete from c7n_cache'
+        if clauses:
+            query += ' where ' + ' and '.join(clauses)
+        with self.conn as cursor:
+            return cursor.execute(query, params).rowcount
+
+    def get_stats(self):
+        return dict(self.stats)
 
     def size(self):
+        if self.conn:
+            return self.conn.execute(
+                'select coalesce(sum(size), 0) from c7n_cache').fetchone()[0]
         return os.path.exists(self.cache_path) and os.path.getsize(self.cache_path) or 0
 
     def close(self):
         if self.conn:
             self.conn.close()
             self.conn = None
+            self.total_size = None
@@ -97,6 +97,10 @@ def _default_options(p, exclude=[]):
         p.add_argument(
             "--cache-period", default=15, type=int,
             help="Cache validity in minutes (default %(default)i)")
+        p.add_argument(
+            "--cache-size", default=1024, type=int,
+            help="Cache size in megabytes, least recently used entries are "
+            "evicted beyond it (default %(default)i)")
     else:
         p.add_argument("--cache", default=None, help=argparse.SUPPRESS)
     if 'session-policy' not in exclude:
@@ -216,6 +220,10 @@ def setup_parser():
         "when passing multiple regions is suffixed with the region. Resources ",
         "with global endpoints are run just once and are suffixed with the first ",
         "region passed in or us-east-1 if running against 'all' regions.",
+        "",
+        "Policies execute in file order. With --group-policies, policies querying ",
+        "the same resources execute together, so policies may not execute in ",
+        "file order.",
         ""
     ))
 
@@ -245,6 +253,19 @@ def setup_parser():
         dest="tracer",
         help="Tracing integration",
         default=None, nargs="?", const="default")
+    run.add_argument(
+        "--group-policies", action="store_true",
+        help="Execute policies querying the same resources together, "
+        "rather than in file order")
+    run.add_argument(
+        "--parallel", type=int, default=1, metavar="N",
+        help="Number of policy groups to execute concurrently")
+    run.add_argument(
+        "--optimize-filters", action="store_true",
+        help="Order policy filters by their recorded cost and selectivity")
+    run.add_argument(
+        "--explain", action="store_true",
+        help="Log the filter evaluation plan of each policy")
 
     schema_desc = ("Browse the available vocabularies (resources, filters, modes, and "
                    "actions) for policy construction. The selector "
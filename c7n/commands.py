@@ -1,6 +1,7 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
 from collections import Counter, defaultdict
+from contextlib import nullcontext
 from datetime import timedelta, datetime
 from functools import wraps
 import json
@@ -14,11 +15,13 @@ from typing import List
 import yaml
 from yaml.constructor import ConstructorError
 
-from c7n import deprecated
+from c7n import deprecated, optimizer
 from c7n.exceptions import ClientError, PolicyValidationError
 from c7n.loader import SourceLocator
 from c7n.provider import clouds
+from c7n.planner import FetchPlanner
 from c7n.policy import Policy, PolicyCollection, load as policy_load
+from c7n.scheduler import PolicyScheduler
 from c7n.schema import ElementSchema, StructureParser, generate
 from c7n.utils import load_file, local_session, SafeLoader, yaml_dump
 from c7n.config import Bag, Config
@@ -288,8 +291,6 @@ def validate(options):
 
 @policy_command
 def run(options, policies: List[Policy]) -> None:
-    exit_code = 0
-
     # AWS - Sanity check that we have an assumable role before executing policies
     # Todo - move this behind provider interface
     if options.assume_role and [p for p in policies if p.provider_name == 'aws']:
@@ -303,21 +304,32 @@ def run(options, policies: List[Policy]) -> None:
             sys.exit(1)
 
     errored_policies: List[str] = []
-    for policy in policies:
+
+    def execute(policy):
         try:
             policy()
         except Exception:
-            exit_code = 2
             errored_policies.append(policy.name)
             if options.debug:
                 raise
             log.exception(
                 "Error while executing policy %s, continuing" % (
                     policy.name))
-    if exit_code != 0:
+
+    planner = FetchPlanner(policies, group=options.get('group_policies', False))
+    recording = nullcontext()
+    if options.get('optimize_filters') or options.get('explain'):
+        recording = optimizer.Recording(optimizer.get_stats_path(options))
+    with recording, planner:
+        if (options.get('parallel') or 1) > 1:
+            PolicyScheduler(planner, options.parallel).run(execute)
+        else:
+            for policy in planner:
+                execute(policy)
+    if errored_policies:
         log.error("The following policies had errors while executing\n - %s" % (
             "\n - ".join(errored_policies)))
-        sys.exit(exit_code)
+        sys.exit(2)
 
 
 @policy_command
@@ -11,6 +11,7 @@ from botocore.session import get_session
 from boto3 import Session
 import json
 
+from c7n import ratelimit
 from c7n.version import version
 from c7n.utils import get_retry
 
@@ -101,6 +102,8 @@ class SessionFactory:
         if self._policy_name:
             session._session.user_agent_extra = f"c7n/policy#{self._policy_name}"
 
+        ratelimit.LIMITER.register(session, ratelimit.get_account(self))
+
         for s in self._subscribers:
             s(session)
 
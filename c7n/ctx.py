@@ -6,6 +6,7 @@ import os
 
 
 from c7n.output import (
+    EXECUTION,
     api_stats_outputs,
     blob_outputs,
     log_outputs,
@@ -34,6 +35,7 @@ class ExecutionContext:
         self.logs = None
         self.api_stats = None
         self.sys_stats = None
+        self.execution_token = None
 
         # A few tests patch on metrics flush
         # For backward compatibility, accept both 'metrics' and 'metrics_enabled' params (PR #4361)
@@ -73,6 +75,8 @@ class ExecutionContext:
     def __enter__(self):
         self.initialize()
         self.session_factory.policy_name = self.policy.name
+        # Scope log output to this policy's execution
+        self.execution_token = EXECUTION.set(self)
         self.sys_stats.__enter__()
         self.output.__enter__()
         self.logs.__enter__()
@@ -100,11 +104,20 @@ class ExecutionContext:
             self.logs.__exit__(exc_type, exc_value, exc_traceback)
             if self.output_logs:
                 self.output_logs.__exit__(exc_type, exc_value, exc_traceback)
+            # Tracers may write to the output, before it's closed/uploaded.
+            write_trace = getattr(self.tracer, 'write', None)
+            if write_trace:
+                write_trace()
+            # Api stats keep tracing calls made by the output until written.
+            detach_api_stats = getattr(self.api_stats, 'detach', None)
+            if detach_api_stats:
+                detach_api_stats()
             self.output.__exit__(exc_type, exc_value, exc_traceback)
 
         self.tracer.__exit__()
 
         self.session_factory.policy_name = None
+        EXECUTION.reset(self.execution_token)
         # IMPORTANT: multi-account execution (c7n-org and others) need
         # to manually reset this.  Why: Not doing this means we get
         # excessive memory usage from client reconstruction for dynamic-gen
@@ -7,7 +7,7 @@ from pathlib import Path
 
 from c7n.actions import ActionRegistry
 from c7n.exceptions import PolicyExecutionError, PolicyValidationError
-from c7n.filters import FilterRegistry
+from c7n.filters import FilterRegistry, columnar
 from c7n.manager import ResourceManager
 from c7n.provider import Provider, clouds
 from c7n.query import sources
@@ -130,6 +130,13 @@ class Data(ResourceManager):
             resources = self.filter_resources(resources)
         return resources
 
+    def filter_resources(self, resources, event=None, filters=None):
+        if filters is None:
+            filters = self.plan_filters(self.filters)
+        if columnar.is_enabled(resources):
+            return columnar.filter_resources(self, resources, event, filters)
+        return super().filter_resources(resources, event, filters)
+
     def get_source(self):
         source_type = self.data.get("source", "disk")
         return self.source_mapping[source_type](self.data.get("query", []))
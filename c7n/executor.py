@@ -1,10 +1,23 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
-from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)  # noqa
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor  # noqa
 
+import contextvars
 import threading
 
 
+class ThreadPoolExecutor(futures.ThreadPoolExecutor):
+    """Thread pool executing calls in the context they were submitted from.
+
+    Context variables, ie. the policy whose log output a thread's records
+    belong to, are propagated to the worker threads.
+    """
+
+    def submit(self, fn, *args, **kw):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kw)
+
+
 class MainThreadExecutor:
     """ For running tests.
 
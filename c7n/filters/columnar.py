@@ -0,0 +1,244 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Columnar filter evaluation for large resource sets.
+
+Keys referenced by value filters are extracted once into typed arrays,
+and value filters and and/or/not blocks of them are evaluated as
+boolean masks. Comparisons of numbers, ages and strings are
+vectorized, other compilable filters are evaluated per resource into
+the mask, and filters which can't be compiled are processed as usual.
+
+Requires numpy, when it isn't installed resources are filtered per
+resource.
+"""
+import datetime
+from datetime import timedelta
+
+from dateutil.tz import tzutc
+
+from c7n.filters.core import (
+    And, Not, Or, ValueFilter, VALUE_TYPE_CONVERTERS)
+from c7n.utils import parse_date
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+# Minimum resource count for columnar evaluation to be used
+MIN_RESOURCES = 1000
+
+# Ints beyond this lose precision as floats
+MAX_EXACT_INT = 2 ** 53
+
+# Value sentinels with special match semantics
+SENTINELS = ('absent', 'present', 'not-null', 'empty')
+
+NUMERIC_TYPES = (None, 'integer', 'float', 'size', 'unique_size')
+
+if np is not None:
+    COMPARISONS = {
+        'eq': np.equal,
+        'equal': np.equal,
+        'ne': np.not_equal,
+        'not-equal': np.not_equal,
+        'gt': np.greater,
+        'greater-than': np.greater,
+        'ge': np.greater_equal,
+        'gte': np.greater_equal,
+        'le': np.less_equal,
+        'lte': np.less_equal,
+        'lt': np.less,
+        'less-than': np.less,
+        None: np.equal,
+    }
+else:  # pragma: no cover
+    COMPARISONS = {}
+
+
+def is_enabled(resources):
+    return np is not None and len(resources) >= MIN_RESOURCES
+
+
+def filter_resources(manager, resources, event=None, filters=None):
+    """Filter resources evaluating runs of compilable filters as masks.
+
+    Filters are applied in order, consecutive compilable filters are
+    combined into a single mask, other filters are processed on the
+    resources matched so far.
+    """
+    if filters is None:
+        filters = manager.filters
+    original = len(resources)
+    run = []
+    for f in filters:
+        if f.compile() is not None:
+            run.append(f)
+            continue
+        resources = process_run(manager, run, resources)
+        run = []
+        if not resources:
+            break
+        with manager.ctx.tracer.subsegment("filter:%s" % f.type):
+            resources = f.process(resources, event)
+    if run and resources:
+        resources = process_run(manager, run, resources)
+    manager.log.debug("Columnar filtered from %d to %d %s" % (
+        original, len(resources), manager.__class__.__name__.lower()))
+    return resources
+
+
+def process_run(manager, run, resources):
+    if not run or not resources:
+        return resources
+    with manager.ctx.tracer.subsegment("filter:columnar"):
+        evaluator = ColumnarEvaluator(resources)
+        mask = evaluator.mask_all(run)
+        matched = [resources[idx] for idx in np.flatnonzero(mask)]
+        for r in matched:
+            for f in run:
+                f.annotate_match(r)
+    return matched
+
+
+class ColumnarEvaluator:
+    """Evaluate compiled filters as boolean masks over a resource list."""
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.columns = {}
+
+    def mask(self, f):
+        if isinstance(f, And):
+            return self.mask_all(f.filters)
+        elif isinstance(f, Or):
+            mask = np.zeros(len(self.resources), dtype=bool)
+            for child in f.filters:
+                mask |= self.mask(child)
+            return mask
+        elif isinstance(f, Not):
+            return ~self.mask_all(f.filters)
+        elif isinstance(f, ValueFilter):
+            return self.value_mask(f)
+        return self.predicate_mask(f.compile())
+
+    def mask_all(self, filters):
+        mask = np.ones(len(self.resources), dtype=bool)
+        for f in filters:
+            mask &= self.mask(f)
+        return mask
+
+    def predicate_mask(self, matcher, rows=None):
+        if rows is None:
+            return np.fromiter(
+                (matcher(r) for r in self.resources), dtype=bool,
+                count=len(self.resources))
+        return np.fromiter(
+            (matcher(self.resources[idx]) for idx in rows), dtype=bool,
+            count=len(rows))
+
+    def value_mask(self, f):
+        # compiling initializes the filter's key, value and operator.
+        matcher = f.compile()
+        vectorized = self.vectorize(f)
+        if vectorized is None:
+            return self.predicate_mask(matcher)
+        mask, valid = vectorized
+        # rows whose values don't have a typed representation are
+        # evaluated with the filter's predicate.
+        rows = np.flatnonzero(~valid)
+        if len(rows):
+            mask[rows] = self.predicate_mask(matcher, rows)
+        return mask
+
+    def vectorize(self, f):
+        """Return a (mask, valid) pair, or None if the filter isn't vectorized."""
+        v, op_name, vtype = f.v, f.op, f.vtype
+        if isinstance(v, bool):
+            return None
+        if isinstance(v, (int, float)) and op_name in COMPARISONS:
+            op = COMPARISONS[op_name]
+            if vtype in NUMERIC_TYPES:
+                values, valid = self.get_column(f, 'number')
+                return op(values, v), valid
+            elif vtype in ('age', 'expiration'):
+                values, valid = self.get_column(f, 'date')
+                now = datetime.datetime.now(tz=tzutc())
+                if vtype == 'age':
+                    return op((now - timedelta(v)).timestamp(), values), valid
+                return op(values, (now + timedelta(v)).timestamp()), valid
+        elif vtype is None and isinstance(v, str) and v not in SENTINELS:
+            if op_name in ('eq', 'equal', 'ne', 'not-equal', None):
+                values, is_str, valid = self.get_column(f, 'string')
+                mask = (values == v) & is_str
+                if op_name in ('ne', 'not-equal'):
+                    mask = ~mask
+                return mask, valid
+        elif (vtype is None and op_name in ('in', 'not-in', 'ni') and
+                isinstance(v, (list, tuple, set)) and
+                all(isinstance(i, str) for i in v)):
+            values, is_str, valid = self.get_column(f, 'string')
+            mask = np.isin(values, list(v)) & is_str
+            if op_name != 'in':
+                mask = ~mask
+            return mask, valid
+        return None
+
+    def get_column(self, f, kind):
+        key = (f.k, f.data.get('value_regex'), f.vtype, kind)
+        if key not in self.columns:
+            self.columns[key] = getattr(self, 'load_%s' % kind)(f)
+        return self.columns[key]
+
+    def load_raw(self, f):
+        get_value = f.compile_resource_value(f.k)
+        return [get_value(r) for r in self.resources]
+
+    def get_raw(self, f):
+        key = (f.k, f.data.get('value_regex'), None, 'raw')
+        if key not in self.columns:
+            self.columns[key] = self.load_raw(f)
+        return self.columns[key]
+
+    def load_number(self, f):
+        convert = VALUE_TYPE_CONVERTERS[f.vtype]
+        raw = self.get_raw(f)
+        values = np.zeros(len(raw), dtype=float)
+        valid = np.zeros(len(raw), dtype=bool)
+        for idx, value in enumerate(raw):
+            if convert is not None:
+                value = convert(value)
+            if (isinstance(value, float) or
+                    isinstance(value, int) and -MAX_EXACT_INT <= value <= MAX_EXACT_INT):
+                values[idx] = value
+                valid[idx] = True
+            elif value is None:
+                # nan compares as None does, unequal and unordered
+                values[idx] = np.nan
+                valid[idx] = True
+        return values, valid
+
+    def load_date(self, f):
+        raw = self.get_raw(f)
+        values = np.zeros(len(raw), dtype=float)
+        valid = np.zeros(len(raw), dtype=bool)
+        for idx, value in enumerate(raw):
+            value = parse_date(value)
+            if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+                values[idx] = value.timestamp()
+                valid[idx] = True
+        return values, valid
+
+    def load_string(self, f):
+        raw = self.get_raw(f)
+        is_str = np.fromiter(
+            (isinstance(value, str) for value in raw), dtype=bool, count=len(raw))
+        # missing values compare as unequal to strings, and an empty
+        # list for in/not-in.
+        valid = is_str | np.fromiter(
+            (value is None for value in raw), dtype=bool, count=len(raw))
+        values = np.array(
+            [value if isinstance(value, str) else '' for value in raw], dtype=str)
+        return values, is_str, valid
@@ -17,6 +17,7 @@ from dateutil.parser import parse
 from c7n.vendored.distutils import version
 from random import sample
 
+from c7n import optimizer
 from c7n.element import Element
 from c7n.exceptions import PolicyValidationError, PolicyExecutionError
 from c7n.manager import ResourceManager
@@ -204,6 +205,30 @@ class Filter(Element):
         """ Bulk process resources and return filtered set."""
         return list(filter(self, resources))
 
+    def is_streamable(self):
+        """Whether the filter evaluates each resource independently.
+
+        Streamable filters can be applied a page at a time when a policy
+        streams its resources, see QueryResourceManager.streaming.
+        """
+        return False
+
+    def is_commutative(self):
+        """Whether the filter's result is independent of its position.
+
+        Commutative filters within an `and` block may be reordered, see
+        c7n.optimizer.
+        """
+        return self.is_streamable()
+
+    def compile(self):
+        """Return a predicate evaluating the filter against a single resource.
+
+        Compiled predicates don't annotate resources. Filters which can't
+        be evaluated independently per resource return None.
+        """
+        return None
+
     def get_block_operator(self):
         """Determine the immediate parent boolean operator for a filter"""
         # Top level operator is `and`
@@ -316,6 +341,8 @@ def union_list(a, b):
 
 class BooleanGroupFilter(Filter):
 
+    _matcher = None
+
     def __init__(self, data, registry, manager):
         super(BooleanGroupFilter, self).__init__(data)
         self.registry = registry
@@ -337,6 +364,44 @@ class BooleanGroupFilter(Filter):
     def __bool__(self):
         return True
 
+    def is_streamable(self):
+        return all(f.is_streamable() for f in self.filters)
+
+    def is_commutative(self):
+        return all(isinstance(f, Filter) and f.is_commutative() for f in self.filters)
+
+    def compile(self):
+        matchers = [
+            f.compile() if isinstance(f, Filter) else None for f in self.filters]
+        if None in matchers:
+            return None
+        return self.compile_group(matchers)
+
+    def compile_group(self, matchers):
+        """Combine the compiled predicates of the group's filters.
+
+        Returns None when the group can't be compiled.
+        """
+        return None
+
+    def get_matcher(self):
+        if self._matcher is None:
+            self._matcher = self.compile() or False
+        return self._matcher
+
+    def process_compiled(self, resources):
+        """Evaluate the group in a single pass over resources.
+
+        Only used for groups consisting entirely of compilable filters,
+        annotations are applied to matched resources as the equivalent
+        set based evaluation would leave them.
+        """
+        matcher = self.get_matcher()
+        matched = [r for r in resources if matcher(r)]
+        for r in matched:
+            self.annotate_match(r)
+        return matched
+
     def get_deprecations(self):
         """Return any matching deprecations for the nested filters."""
         deprecations = []
@@ -348,10 +413,26 @@ class BooleanGroupFilter(Filter):
 class Or(BooleanGroupFilter):
 
     def process(self, resources, event=None):
+        if self.manager and self.get_matcher():
+            return self.process_compiled(resources)
         if self.manager:
             return self.process_set(resources, event)
         return super(Or, self).process(resources, event)
 
+    def compile_group(self, matchers):
+        def match_any(r):
+            for m in matchers:
+                if m(r):
+                    return True
+            return False
+        self._child_matchers = matchers
+        return match_any
+
+    def annotate_match(self, r):
+        for f, m in zip(self.filters, self._child_matchers):
+            if m(r):
+                f.annotate_match(r)
+
     def __call__(self, r):
         """Fallback for older unit tests that don't utilize a query manager"""
         for f in self.filters:
@@ -381,11 +462,13 @@ class Or(BooleanGroupFilter):
 class And(BooleanGroupFilter):
 
     def process(self, resources, events=None):
+        if self.manager and self.get_matcher():
+            return self.process_compiled(resources)
         if self.manager:
             sweeper = AnnotationSweeper(self.get_resource_type_id(), resources)
 
         for f in self.filters:
-            resources = f.process(resources, events)
+            resources = optimizer.process_filter(self.manager, f, resources, events)
             if not resources:
                 break
 
@@ -394,14 +477,41 @@ class And(BooleanGroupFilter):
 
         return resources
 
+    def compile_group(self, matchers):
+        def match_all(r):
+            for m in matchers:
+                if not m(r):
+                    return False
+            return True
+        return match_all
+
+    def annotate_match(self, r):
+        for f in self.filters:
+            f.annotate_match(r)
+
 
 class Not(BooleanGroupFilter):
 
     def process(self, resources, event=None):
+        if self.manager and self.get_matcher():
+            return self.process_compiled(resources)
         if self.manager:
             return self.process_set(resources, event)
         return super(Not, self).process(resources, event)
 
+    def compile_group(self, matchers):
+        # There is an implicit 'and' for self.filters
+        def match_none(r):
+            for m in matchers:
+                if not m(r):
+                    return True
+            return False
+        return match_none
+
+    def annotate_match(self, r):
+        # annotations within a not block are always swept
+        return
+
     def __call__(self, r):
         """Fallback for older unit tests that don't utilize a query manager"""
 
@@ -423,7 +533,7 @@ class Not(BooleanGroupFilter):
         sweeper = AnnotationSweeper(rtype_id, resources)
 
         for f in self.filters:
-            resources = f.process(resources, event)
+            resources = optimizer.process_filter(self.manager, f, resources, event)
             if not resources:
                 break
 
@@ -487,6 +597,138 @@ class ComparableVersion(version.LooseVersion):
             return False
 
 
+def convert_normalize(value):
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def convert_integer(value):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return 0
+
+
+def convert_float(value):
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return 0.0
+
+
+def convert_size(value):
+    try:
+        return len(value)
+    except TypeError:
+        return 0
+
+
+def convert_unique_size(value):
+    try:
+        return len(set(value))
+    except TypeError:
+        return 0
+
+
+def convert_cidr_size(value):
+    cidr = parse_cidr(value)
+    if cidr:
+        return cidr.prefixlen
+    return 0
+
+
+# Value types whose conversion only applies to the resource value, used
+# by compiled value filters, see ValueFilter.process_value_type.
+VALUE_TYPE_CONVERTERS = {
+    None: None,
+    'normalize': convert_normalize,
+    'integer': convert_integer,
+    'float': convert_float,
+    'size': convert_size,
+    'unique_size': convert_unique_size,
+    'cidr_size': convert_cidr_size,
+    'date': parse_date,
+    'version': ComparableVersion,
+}
+
+
+def operator_in_set(x, y):
+    try:
+        return x in y
+    except TypeError:
+        # unhashable values can't be equal to any member
+        return False
+
+
+def operator_ni_set(x, y):
+    try:
+        return x not in y
+    except TypeError:
+        return True
+
+
+def compile_operator(op_name, v):
+    """Return an operator specialized for a constant value."""
+    if op_name in ('regex', 'regex-case') and isinstance(v, str):
+        try:
+            pattern = re.compile(
+                v, flags=re.IGNORECASE if op_name == 'regex' else 0)
+        except re.error:
+            return OPERATORS[op_name]
+        return lambda x, y: isinstance(x, str) and bool(pattern.match(x))
+    elif op_name in ('in', 'not-in', 'ni') and isinstance(v, (list, tuple, set)):
+        try:
+            values = frozenset(v)
+        except TypeError:
+            return OPERATORS[op_name]
+        op = operator_in_set if op_name == 'in' else operator_ni_set
+        return lambda x, y: op(x, values)
+    return OPERATORS[op_name]
+
+
+def compile_match(get_value, v, op_name, empty_in, convert=None, convert_pair=None):
+    """Build a value filter predicate, see ValueFilter.compile.
+
+    Either `convert` converts the resource value for comparison against
+    the constant sentinel `v`, or `convert_pair` is a function of resource
+    value and resource returning the sentinel and resource values.
+    """
+    op = None
+    if op_name and convert_pair is not None:
+        op = OPERATORS[op_name]
+    elif op_name:
+        op = compile_operator(op_name, v)
+
+    def match(i):
+        if i is None:
+            return False
+        r = get_value(i)
+        if empty_in and r is None:
+            r = ()
+        if convert_pair is not None:
+            s, r = convert_pair(r, i)
+        else:
+            s = v
+            if convert is not None:
+                r = convert(r)
+        if r is None and s == 'absent':
+            return True
+        elif r is not None and s == 'present':
+            return True
+        elif s == 'not-null' and r:
+            return True
+        elif s == 'empty' and not r:
+            return True
+        elif op is not None:
+            try:
+                return op(r, s)
+            except TypeError:
+                return False
+        return r == s
+    return match
+
+
 class ValueFilter(BaseValueFilter):
     """Generic value filter using jmespath
     """
@@ -513,6 +755,7 @@ class ValueFilter(BaseValueFilter):
     schema_alias = True
     annotate = True
     required_keys = {'value', 'key'}
+    _matcher = None
 
     def _validate_resource_count(self):
         """ Specific validation for `resource_count` type
@@ -585,10 +828,14 @@ class ValueFilter(BaseValueFilter):
             return self.process(i)
 
         matched = self.match(i)
-        if matched and self.annotate:
-            set_annotation(i, ANNOTATION_KEY, self.k)
+        if matched:
+            self.annotate_match(i)
         return matched
 
+    def annotate_match(self, i):
+        if self.annotate:
+            set_annotation(i, ANNOTATION_KEY, self.k)
+
     def process(self, resources, event=None):
         # For the resource_count filter we operate on the full set of resources.
         if self.data.get('value_type') == 'resource_count':
@@ -599,6 +846,17 @@ class ValueFilter(BaseValueFilter):
 
         return super(ValueFilter, self).process(resources, event)
 
+    def is_streamable(self):
+        return (type(self).process is ValueFilter.process and
+                self.data.get('value_type') != 'resource_count')
+
+    def is_commutative(self):
+        # filters on annotations depend on the filters which produce them
+        keys = [self.data.get(k, '') for k in ('key', 'value_path')]
+        if len(self.data) == 1 and 'type' not in self.data:
+            keys = list(self.data)
+        return self.is_streamable() and not any('c7n' in str(k) for k in keys)
+
     def get_resource_value(self, k, i):
         return super(ValueFilter, self).get_resource_value(k, i, self.data.get('value_regex'))
 
@@ -629,6 +887,11 @@ class ValueFilter(BaseValueFilter):
         return jmespath_search(self.data.get('value_path'), i)
 
     def match(self, i):
+        if self._matcher is None:
+            self._matcher = self.compile_match() or self.match_resource
+        return self._matcher(i)
+
+    def initialize_content(self, i):
         if self.v is None and len(self.data) == 1:
             [(self.k, self.v)] = self.data.items()
         elif self.v is None and not hasattr(self, 'content_initialized'):
@@ -644,6 +907,9 @@ class ValueFilter(BaseValueFilter):
             self.content_initialized = True
             self.vtype = self.data.get('value_type')
 
+    def match_resource(self, i):
+        self.initialize_content(i)
+
         if i is None:
             return False
 
@@ -678,6 +944,99 @@ class ValueFilter(BaseValueFilter):
 
         return False
 
+    def is_compilable(self):
+        klass = type(self)
+        return (klass.match is ValueFilter.match and
+                klass.match_resource is ValueFilter.match_resource and
+                klass.get_resource_value is ValueFilter.get_resource_value and
+                klass.process_value_type is ValueFilter.process_value_type and
+                'value_path' not in self.data and
+                self.data.get('value_type') != 'resource_count')
+
+    def compile(self):
+        klass = type(self)
+        if klass.process is not ValueFilter.process or klass.__call__ is not ValueFilter.__call__:
+            return None
+        if self._matcher is None:
+            self._matcher = self.compile_match() or self.match_resource
+        if self._matcher == self.match_resource:
+            return None
+        return self._matcher
+
+    def compile_match(self):
+        """Compile the filter's value match into a predicate over a resource.
+
+        The key accessor, value, value type conversion and operator are
+        resolved once, per resource evaluation only extracts and compares
+        the resource value. Filters customizing value extraction or
+        matching are not compiled.
+        """
+        if not self.is_compilable():
+            return None
+        self.initialize_content(None)
+        get_value = self.compile_resource_value(self.k)
+        vtype, op_name = self.vtype, self.op
+        empty_in = op_name in ('in', 'not-in', 'ni')
+
+        if vtype is not None and vtype not in VALUE_TYPE_CONVERTERS:
+            # sentinel varies by resource or time, convert per resource.
+            def convert_pair(r, i):
+                return self.process_value_type(self.v, r, i)
+            return compile_match(
+                get_value, None, op_name, empty_in, convert_pair=convert_pair)
+
+        v = self.v
+        if vtype == 'date':
+            v = parse_date(v)
+        elif vtype == 'version':
+            v = ComparableVersion(v)
+        return compile_match(
+            get_value, v, op_name, empty_in, convert=VALUE_TYPE_CONVERTERS[vtype])
+
+    def compile_resource_value(self, k):
+        """Return an accessor for a resource's value of key `k`."""
+        if k.startswith('tag:'):
+            tk = k.split(':', 1)[1]
+
+            def get_value(i):
+                if 'Tags' in i:
+                    for t in i.get("Tags", []):
+                        if t.get('Key') == tk:
+                            return t.get('Value')
+                elif 'labels' in i:
+                    return i.get('labels', {}).get(tk, None)
+                elif 'tags' in i:
+                    return (i.get('tags', {}) or {}).get(tk, None)
+                return None
+        else:
+            # keys present verbatim (ie. annotations) aren't always
+            # valid expressions, compile on first use.
+            expr = []
+
+            def get_value(i):
+                if k in i:
+                    return i.get(k)
+                if not expr:
+                    expr.append(jmespath_compile(k))
+                return expr[0].search(i)
+
+        if not self.data.get('value_regex'):
+            return get_value
+        pattern = re.compile(self.data['value_regex'])
+
+        def get_regex_value(i):
+            r = get_value(i)
+            if r is None:
+                return r
+            try:
+                capture = pattern.match(r)
+            except (ValueError, TypeError):
+                return None
+            if capture is None:
+                return None
+            return capture.group(1)
+        return get_regex_value
+
     def process_value_type(self, sentinel, value, resource):
         if self.vtype == 'normalize' and isinstance(value, str):
             return sentinel, value.strip().lower()
@@ -774,6 +1133,9 @@ class AgeFilter(Filter):
                 "date_attribute must be overriden in subclass")
         return self
 
+    def is_streamable(self):
+        return type(self).process is Filter.process
+
     def get_resource_date(self, i):
         v = i[self.date_attribute]
         if not isinstance(v, datetime.datetime):
@@ -29,6 +29,7 @@ References
 import fnmatch
 import logging
 import json
+from functools import cached_property
 
 from c7n.filters import Filter
 from c7n.resolver import ValuesFrom
@@ -57,55 +58,72 @@ class PolicyChecker:
     """
     def __init__(self, checker_config):
         self.checker_config = checker_config
+        # results by policy document and statement, many resources
+        # share identical policies (ie. from the same template).
+        self.documents = {}
+        self.statements = {}
 
     # Config properties
     @property
     def return_allowed(self):
         return self.checker_config.get('return_allowed', False)
 
-    @property
+    @cached_property
     def allowed_accounts(self):
-        return self.checker_config.get('allowed_accounts', ())
+        return frozenset(self.checker_config.get('allowed_accounts', ()))
 
     @property
     def everyone_only(self):
         return self.checker_config.get('everyone_only', False)
 
-    @property
+    @cached_property
     def check_actions(self):
-        return self.checker_config.get('check_actions', ())
+        return tuple(self.checker_config.get('check_actions', ()))
 
-    @property
+    @cached_property
     def whitelist_conditions(self):
-        return set(v.lower() for v in self.checker_config.get('whitelist_conditions', ()))
+        return frozenset(v.lower() for v in self.checker_config.get('whitelist_conditions', ()))
 
-    @property
+    @cached_property
     def allowed_vpce(self):
-        return self.checker_config.get('allowed_vpce', ())
+        return frozenset(self.checker_config.get('allowed_vpce', ()))
 
-    @property
+    @cached_property
     def allowed_vpc(self):
-        return self.checker_config.get('allowed_vpc', ())
+        return frozenset(self.checker_config.get('allowed_vpc', ()))
 
-    @property
+    @cached_property
     def allowed_orgid(self):
-        return self.checker_config.get('allowed_orgid', ())
+        return frozenset(self.checker_config.get('allowed_orgid', ()))
 
     # Policy statement handling
     def check(self, policy_text):
         if isinstance(policy_text, str):
-            policy = json.loads(policy_text)
+            key = policy_text
         else:
-            policy = policy_text
-
+            key = json.dumps(policy_text, sort_keys=True)
+        results = self.documents.get(key)
+        if results is None:
+            results = self.documents[key] = self.check_document(key)
+        allowlist_statements, violations = results
+        return list(allowlist_statements if self.return_allowed else violations)
+
+    def check_document(self, policy_text):
+        policy = json.loads(policy_text)
         allowlist_statements, violations = [], []
 
         for s in policy.get('Statement', ()):
-            if self.handle_statement(s):
+            if self.check_statement(s):
                 violations.append(s)
             else:
                 allowlist_statements.append(s)
-        return allowlist_statements if self.return_allowed else violations
+        return allowlist_statements, violations
+
+    def check_statement(self, s):
+        key = json.dumps(s, sort_keys=True)
+        if key not in self.statements:
+            self.statements[key] = bool(self.handle_statement(s))
+        return self.statements[key]
 
     def handle_statement(self, s):
         if (all((self.handle_principal(s),
@@ -291,6 +309,9 @@ class CrossAccountAccessFilter(Filter):
 
     checker_factory = PolicyChecker
 
+    def is_commutative(self):
+        return True
+
     def process(self, resources, event=None):
         self.everyone_only = self.data.get('everyone_only', False)
         self.return_allowed = self.data.get('return_allowed', False)
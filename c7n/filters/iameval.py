@@ -0,0 +1,274 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""
+IAM Identity Policy Evaluator
+-----------------------------
+
+Local evaluation of identity policies, for checking the permissions of
+many principals without a policy simulator call per principal.
+
+Decisions follow IAM's documented evaluation logic, an explicit deny in
+any policy wins, otherwise an action is allowed if an identity policy
+allows it and every guardrail policy (permission boundaries, service
+control policies) also allows it, else it's implicitly denied. Requests
+carry only the context values given, conditions on absent keys evaluate
+as documented for missing context values.
+
+Policy constructs the evaluator doesn't model (policy variables,
+unknown condition operators, wildcard requested actions, resource
+specific statements when evaluating any resource) raise Unsupported,
+callers should fall back to the simulator.
+
+References
+
+- IAM Policy Evaluation
+  https://docs.aws.amazon.com/IAM/latest/UserGuide/reference_policies_evaluation-logic.html
+
+- IAM Condition Operators
+  https://docs.aws.amazon.com/IAM/latest/UserGuide/reference_policies_elements_condition_operators.html
+
+"""
+import fnmatch
+import ipaddress
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from dateutil.parser import parse as parse_date
+
+
+class Unsupported(Exception):
+    """A policy or request the evaluator can't decide."""
+
+
+ALLOWED = 'allowed'
+EXPLICIT_DENY = 'explicitDeny'
+IMPLICIT_DENY = 'implicitDeny'
+
+
+@lru_cache(maxsize=4096)
+def _pattern(pattern, case_sensitive):
+    regex = fnmatch.translate(pattern)
+    return re.compile(regex, 0 if case_sensitive else re.IGNORECASE)
+
+
+def match_pattern(pattern, value, case_sensitive=True):
+    if '${' in pattern:
+        raise Unsupported("policy variable %s" % pattern)
+    if pattern == '*':
+        return True
+    # fnmatch treats brackets as character classes, iam doesn't.
+    if '[' in pattern:
+        pattern = pattern.replace('[', '[[]')
+    return bool(_pattern(pattern, case_sensitive).match(value))
+
+
+def as_list(value):
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _string_equals(a, b):
+    return a == b
+
+
+def _string_equals_ignore_case(a, b):
+    return a.lower() == b.lower()
+
+
+def _string_like(a, b):
+    return match_pattern(b, a)
+
+
+def _numeric(op):
+    def compare(a, b):
+        return op(float(a), float(b))
+    return compare
+
+
+def _date(op):
+    def compare(a, b):
+        return op(_parse_date(a), _parse_date(b))
+    return compare
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.utcfromtimestamp(float(value))
+    except ValueError:
+        return parse_date(value).replace(tzinfo=None)
+
+
+def _bool(a, b):
+    return str(a).lower() == str(b).lower()
+
+
+def _ip_address(a, b):
+    return ipaddress.ip_address(a) in ipaddress.ip_network(b, strict=False)
+
+
+def _arn_like(a, b):
+    if a.count(':') < 5 or b.count(':') < 5:
+        return False
+    return all(match_pattern(p, v) for p, v in zip(b.split(':', 5), a.split(':', 5)))
+
+
+# operator -> (comparison of a request value with a policy value, negated)
+OPERATORS = {
+    'StringEquals': (_string_equals, False),
+    'StringNotEquals': (_string_equals, True),
+    'StringEqualsIgnoreCase': (_string_equals_ignore_case, False),
+    'StringNotEqualsIgnoreCase': (_string_equals_ignore_case, True),
+    'StringLike': (_string_like, False),
+    'StringNotLike': (_string_like, True),
+    'NumericEquals': (_numeric(lambda a, b: a == b), False),
+    'NumericNotEquals': (_numeric(lambda a, b: a == b), True),
+    'NumericLessThan': (_numeric(lambda a, b: a < b), False),
+    'NumericLessThanEquals': (_numeric(lambda a, b: a <= b), False),
+    'NumericGreaterThan': (_numeric(lambda a, b: a > b), False),
+    'NumericGreaterThanEquals': (_numeric(lambda a, b: a >= b), False),
+    'DateEquals': (_date(lambda a, b: a == b), False),
+    'DateNotEquals': (_date(lambda a, b: a == b), True),
+    'DateLessThan': (_date(lambda a, b: a < b), False),
+    'DateLessThanEquals': (_date(lambda a, b: a <= b), False),
+    'DateGreaterThan': (_date(lambda a, b: a > b), False),
+    'DateGreaterThanEquals': (_date(lambda a, b: a >= b), False),
+    'Bool': (_bool, False),
+    'IpAddress': (_ip_address, False),
+    'NotIpAddress': (_ip_address, True),
+    'ArnEquals': (_arn_like, False),
+    'ArnNotEquals': (_arn_like, True),
+    'ArnLike': (_arn_like, False),
+    'ArnNotLike': (_arn_like, True),
+}
+
+
+def evaluate_condition(operator, key, policy_values, context):
+    """Evaluate a single condition operator and key against request context."""
+    qualifier = None
+    if ':' in operator:
+        qualifier, operator = operator.split(':', 1)
+        if qualifier not in ('ForAnyValue', 'ForAllValues'):
+            raise Unsupported("condition qualifier %s" % qualifier)
+    if_exists = operator.endswith('IfExists')
+    if if_exists:
+        operator = operator[:-len('IfExists')]
+
+    request_values = context.get(key.lower())
+    policy_values = [str(v) if isinstance(v, bool) else v for v in as_list(policy_values)]
+
+    if operator == 'Null':
+        return (request_values is None) == _bool(policy_values[0], 'true')
+    if operator not in OPERATORS:
+        raise Unsupported("condition operator %s" % operator)
+    for v in policy_values:
+        if isinstance(v, str) and '${' in v:
+            raise Unsupported("policy variable %s" % v)
+    compare, negated = OPERATORS[operator]
+
+    if request_values is None:
+        if if_exists or qualifier == 'ForAllValues':
+            return True
+        return negated and qualifier is None
+
+    def matches(value):
+        try:
+            matched = any(compare(value, p) for p in policy_values)
+        except (TypeError, ValueError):
+            matched = False
+        return not matched if negated else matched
+
+    request_values = as_list(request_values)
+    if qualifier == 'ForAllValues':
+        return all(matches(v) for v in request_values)
+    if qualifier == 'ForAnyValue' or len(request_values) > 1:
+        return any(matches(v) for v in request_values)
+    return matches(request_values[0])
+
+
+class Statement:
+
+    def __init__(self, data, source=None):
+        self.data = data
+        self.source = source
+        self.effect = data.get('Effect')
+        if self.effect not in ('Allow', 'Deny'):
+            raise Unsupported("statement effect %s" % self.effect)
+        if 'Principal' in data or 'NotPrincipal' in data:
+            raise Unsupported("resource policy statement")
+
+    def match_action(self, action):
+        if 'Action' in self.data:
+            return any(match_pattern(p, action, False) for p in as_list(self.data['Action']))
+        return not any(
+            match_pattern(p, action, False) for p in as_list(self.data.get('NotAction', ())))
+
+    def match_resource(self, resource):
+        if resource == '*' and '*' not in as_list(self.data.get('Resource', ())):
+            # the simulator's treatment of resource specific statements
+            # when simulating any resource isn't documented.
+            raise Unsupported("resource specific statement")
+        if 'Resource' in self.data:
+            return any(match_pattern(p, resource) for p in as_list(self.data['Resource']))
+        return not any(
+            match_pattern(p, resource) for p in as_list(self.data.get('NotResource', ())))
+
+    def match_condition(self, context):
+        for operator, clauses in self.data.get('Condition', {}).items():
+            for key, values in clauses.items():
+                if not evaluate_condition(operator, key, values, context):
+                    return False
+        return True
+
+    def match(self, action, resource, context):
+        return (self.match_action(action) and
+                self.match_resource(resource) and
+                self.match_condition(context))
+
+
+def get_statements(document, source=None):
+    if isinstance(document, str):
+        document = json.loads(document)
+    return [Statement(s, source) for s in as_list(document.get('Statement', ()))]
+
+
+class PolicyEvaluator:
+    """Evaluate requests against a principal's identity policies.
+
+    Guardrails are policies which must also allow a request, ie.
+    permission boundaries and service control policies.
+    """
+
+    def __init__(self, policies, guardrails=()):
+        self.policies = [get_statements(p) for p in policies]
+        self.guardrails = [get_statements(p) for p in guardrails]
+
+    def evaluate(self, action, resource='*', context=None):
+        if '*' in action or '?' in action:
+            raise Unsupported("wildcard action %s" % action)
+        context = {k.lower(): v for k, v in (context or {}).items()}
+
+        def matched(statements, effect):
+            return [s for s in statements
+                    if s.effect == effect and s.match(action, resource, context)]
+
+        for statements in self.policies + self.guardrails:
+            if matched(statements, 'Deny'):
+                return EXPLICIT_DENY
+        if not any(matched(statements, 'Allow') for statements in self.policies):
+            return IMPLICIT_DENY
+        for statements in self.guardrails:
+            if not matched(statements, 'Allow'):
+                return IMPLICIT_DENY
+        return ALLOWED
+
+    def simulate(self, actions, resource='*', context=None):
+        """Return evaluation results in the policy simulator's form."""
+        return [{'EvalActionName': action,
+                 'EvalResourceName': resource,
+                 'EvalDecision': self.evaluate(action, resource, context)}
+                for action in actions]
@@ -47,22 +47,16 @@ class KmsRelatedFilter(RelatedResourceFilter):
     AnnotationKey = "matched-kms-key"
 
     def get_related(self, resources):
-        resource_manager = self.get_resource_manager()
         related_ids = self.get_related_ids(resources)
-        if len(related_ids) < self.FetchThreshold:
-            related = resource_manager.get_resources(list(related_ids))
-        else:
-            related = resource_manager.resources()
-        related_map = {}
-
-        for r in related:
+        related = {}
+        for rid, r in self.get_related_index().get(related_ids, self.FetchThreshold).items():
+            # keys may be shared with other filters, annotate a copy.
+            r = related[rid] = dict(r)
             # `AliasNames` is set when we fetch keys, but only for keys
             # which have aliases defined. Fall back to an empty string
             # to avoid lookup errors in filters.
             r['c7n:AliasName'] = r.get('AliasNames', ('',))[0]
-            related_map[r['KeyId']] = r
-
-        return related_map
+        return related
 
     def get_related_ids(self, resources):
         related_ids = super().get_related_ids(resources)
@@ -86,7 +80,7 @@ class KmsRelatedFilter(RelatedResourceFilter):
     def key_alias_to_key_id(self):
         # convert key alias to key id for cache lookup
         # else cache lookup returns [] even if the key exists
-        key_manager = self.get_resource_manager()
+        key_manager = self.get_related_index().manager
         alias_to_id = {}
         for kid, kaliases in key_manager.alias_map.items():
             alias_to_id.update({alias: kid for alias in kaliases})
@@ -4,16 +4,41 @@
 CloudWatch Metrics suppport for resources
 """
 import re
+import threading
 
 from collections import namedtuple
 from concurrent.futures import as_completed
 from datetime import datetime, timedelta
 
+from c7n import ratelimit
 from c7n.exceptions import PolicyValidationError
 from c7n.filters.core import Filter, OPERATORS
 from c7n.utils import local_session, type_schema, chunks
 
 
+# Execution scoped datapoint caches by account and region, see c7n.planner
+METRIC_DATA = None
+METRIC_DATA_LOCK = threading.Lock()
+
+# Dimensions are a tuple of (name, value) pairs
+MetricQuery = namedtuple(
+    'MetricQuery', 'namespace metric dimensions statistic period')
+
+
+def get_datapoint_cache(manager):
+    """Return the execution scoped datapoint cache for a manager's account/region.
+
+    The cache maps a query and its window (start, end) to datapoints.
+    Outside of an execution (see c7n.planner), fetched datapoints are
+    not retained.
+    """
+    if METRIC_DATA is None:
+        return {}
+    with METRIC_DATA_LOCK:
+        return METRIC_DATA.setdefault(
+            (manager.config.account_id, manager.config.region), {})
+
+
 class MetricsFilter(Filter):
     """Supports cloud watch metrics filters on resources.
 
@@ -21,8 +46,8 @@ class MetricsFilter(Filter):
 
     Docs on cloud watch metrics
 
-    - GetMetricStatistics
-      https://docs.aws.amazon.com/AmazonCloudWatch/latest/APIReference/API_GetMetricStatistics.html
+    - GetMetricData
+      https://docs.aws.amazon.com/AmazonCloudWatch/latest/APIReference/API_GetMetricData.html
 
     - Supported Metrics
       https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/aws-services-cloudwatch-metrics.html
@@ -67,6 +92,12 @@ class MetricsFilter(Filter):
     policy to treat their request counts as 0.
 
     Note the default statistic for metrics is Average.
+
+    Metrics are retrieved with GetMetricData, batching queries across
+    resources, and identical queries over the same window are only
+    fetched once per execution across filters and policies. Note
+    GetMetricData doesn't return units, so datapoints don't carry a
+    Unit key.
     """
 
     schema = type_schema(
@@ -88,10 +119,12 @@ class MetricsFilter(Filter):
            'missing-value': {'type': 'number'},
            'required': ('value', 'name')})
     schema_alias = True
-    permissions = ("cloudwatch:GetMetricStatistics",)
+    permissions = ("cloudwatch:GetMetricData",)
 
     MAX_QUERY_POINTS = 50850
     MAX_RESULT_POINTS = 1440
+    # GetMetricData limit on metric queries per request
+    MAX_DATA_QUERIES = 500
 
     # Default per service, for overloaded services like ec2
     # we do type specific default namespace annotation
@@ -192,22 +225,40 @@ class MetricsFilter(Filter):
                 ns = self.DEFAULT_NAMESPACE[self.model.service]
         self.namespace = ns
 
-        self.log.debug("Querying metrics for %d", len(resources))
-        matched = []
-        with self.executor_factory(max_workers=3) as w:
-            futures = []
-            for resource_set in chunks(resources, 50):
-                futures.append(
-                    w.submit(self.process_resource_set, resource_set))
+        # Note this annotation cache is policy scoped, not across
+        # policies, still the lack of full qualification on the key
+        # means multiple filters within a policy using the same metric
+        # across different periods or dimensions would be problematic.
+        key = "%s.%s.%s.%s" % (self.namespace, self.metric, self.statistics, str(self.days))
+
+        queries, evaluated = {}, []
+        for r in resources:
+            try:
+                if key not in r.setdefault('c7n.metrics', {}):
+                    queries.setdefault(self.get_metric_query(r), []).append(r)
+            except Exception as e:
+                self.log.warning("CW Retrieval error: %s" % e)
+                continue
+            evaluated.append(r)
+
+        self.log.debug(
+            "Querying metrics for %d resources %d queries", len(resources), len(queries))
+        datapoints = self.get_metric_data(list(queries))
+        for query, resource_set in queries.items():
+            if query not in datapoints:
+                continue
+            for r in resource_set:
+                r['c7n.metrics'][key] = list(datapoints[query])
 
-            for f in as_completed(futures):
-                if f.exception():
-                    self.log.warning(
-                        "CW Retrieval error: %s" % f.exception())
-                    continue
-                matched.extend(f.result())
+        matched = []
+        for r in evaluated:
+            if key in r['c7n.metrics'] and self.match_resource(r, r['c7n.metrics'][key]):
+                matched.append(r)
         return matched
 
+    def is_commutative(self):
+        return True
+
     def get_dimensions(self, resource):
         return [{'Name': self.model.dimension,
                  'Value': resource[self.model.dimension]}]
@@ -220,79 +271,111 @@ class MetricsFilter(Filter):
             dims.append({'Name': k, 'Value': v})
         return dims
 
-    def process_resource_set(self, resource_set):
+    def get_metric_query(self, resource):
+        # if we overload dimensions with multiple resources we get
+        # the statistics/average over those resources.
+        dimensions = self.get_dimensions(resource)
+        # Merge in any filter specified metrics, get_dimensions is
+        # commonly overridden so we can't do it there.
+        dimensions.extend(self.get_user_dimensions())
+        return MetricQuery(
+            self.namespace, self.metric,
+            tuple(sorted((d['Name'], d['Value']) for d in dimensions)),
+            self.statistics, self.period)
+
+    def get_metric_data(self, queries):
+        """Return a mapping of query to datapoints.
+
+        Queries whose retrieval failed are omitted.
+        """
+        datapoint_cache = get_datapoint_cache(self.manager)
+        results, pending = {}, []
+        for q in queries:
+            datapoints = datapoint_cache.get((q, self.start, self.end))
+            if datapoints is None:
+                pending.append(q)
+            else:
+                results[q] = datapoints
+        if not pending:
+            return results
+
         client = local_session(
             self.manager.session_factory).client('cloudwatch')
+        max_workers = ratelimit.get_workers(3, 'cloudwatch', client.meta.region_name)
+        with self.executor_factory(max_workers=max_workers) as w:
+            futures = []
+            for query_set in chunks(pending, self.MAX_DATA_QUERIES):
+                futures.append(
+                    w.submit(self.process_query_set, client, query_set))
 
-        matched = []
-        for r in resource_set:
-            # if we overload dimensions with multiple resources we get
-            # the statistics/average over those resources.
-            dimensions = self.get_dimensions(r)
-            # Merge in any filter specified metrics, get_dimensions is
-            # commonly overridden so we can't do it there.
-            dimensions.extend(self.get_user_dimensions())
-
-            collected_metrics = r.setdefault('c7n.metrics', {})
-            # Note this annotation cache is policy scoped, not across
-            # policies, still the lack of full qualification on the key
-            # means multiple filters within a policy using the same metric
-            # across different periods or dimensions would be problematic.
-            key = "%s.%s.%s.%s" % (self.namespace, self.metric, self.statistics, str(self.days))
-
-            params = dict(
-                Namespace=self.namespace,
-                MetricName=self.metric,
-                StartTime=self.start,
-                EndTime=self.end,
-                Period=self.period,
-                Dimensions=dimensions
-            )
-
-            stats_key = (self.statistics in self.standard_stats
-                         and 'Statistics' or 'ExtendedStatistics')
-            params[stats_key] = [self.statistics]
-
-            if key not in collected_metrics:
-                collected_metrics[key] = client.get_metric_statistics(
-                    **params)['Datapoints']
-
-            # In certain cases CloudWatch reports no data for a metric.
-            # If the policy specifies a fill value for missing data, add
-            # that here before testing for matches. Otherwise, skip
-            # matching entirely.
-            if len(collected_metrics[key]) == 0:
-                if 'missing-value' not in self.data:
+            for f in as_completed(futures):
+                if f.exception():
+                    self.log.warning(
+                        "CW Retrieval error: %s" % f.exception())
                     continue
-                collected_metrics[key].append({
-                    'Timestamp': self.start,
-                    self.statistics: self.data['missing-value'],
-                    'c7n:detail': 'Fill value for missing data'
-                })
-
-            if self.data.get('percent-attr'):
-                rvalue = r[self.data.get('percent-attr')]
-                if self.data.get('attr-multiplier'):
-                    rvalue = rvalue * self.data['attr-multiplier']
-                all_meet_condition = True
-                for data_point in collected_metrics[key]:
-                    percent = (data_point[self.statistics] / rvalue * 100)
-                    if not self.op(percent, self.value):
-                        all_meet_condition = False
-                        break
-                if all_meet_condition:
-                    matched.append(r)
-            else:
-                all_meet_condition = True
-                for data_point in collected_metrics[key]:
-                    if 'ExtendedStatistics' in data_point:
-                        data_point = data_point['ExtendedStatistics']
-                    if not self.op(data_point[self.statistics], self.value):
-                        all_meet_condition = False
-                        break
-                if all_meet_condition:
-                    matched.append(r)
-        return matched
+                for q, datapoints in f.result().items():
+                    datapoint_cache[(q, self.start, self.end)] = datapoints
+                    results[q] = datapoints
+        return results
+
+    def process_query_set(self, client, query_set):
+        query_ids = {'m%d' % idx: q for idx, q in enumerate(query_set)}
+        params = dict(
+            MetricDataQueries=[{
+                'Id': qid,
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': q.namespace,
+                        'MetricName': q.metric,
+                        'Dimensions': [
+                            {'Name': n, 'Value': v} for n, v in q.dimensions]},
+                    'Period': q.period,
+                    'Stat': q.statistic},
+                'ReturnData': True} for qid, q in query_ids.items()],
+            StartTime=self.start,
+            EndTime=self.end,
+            ScanBy='TimestampAscending')
+
+        results = {q: [] for q in query_set}
+        paginator = client.get_paginator('get_metric_data')
+        for page in paginator.paginate(**params):
+            for series in page['MetricDataResults']:
+                q = query_ids[series['Id']]
+                results[q].extend(
+                    {'Timestamp': t, q.statistic: v}
+                    for t, v in zip(series['Timestamps'], series['Values']))
+        return results
+
+    def match_resource(self, r, datapoints):
+        # In certain cases CloudWatch reports no data for a metric.
+        # If the policy specifies a fill value for missing data, add
+        # that here before testing for matches. Otherwise, skip
+        # matching entirely.
+        if len(datapoints) == 0:
+            if 'missing-value' not in self.data:
+                return False
+            datapoints.append({
+                'Timestamp': self.start,
+                self.statistics: self.data['missing-value'],
+                'c7n:detail': 'Fill value for missing data'
+            })
+
+        if self.data.get('percent-attr'):
+            rvalue = r[self.data.get('percent-attr')]
+            if self.data.get('attr-multiplier'):
+                rvalue = rvalue * self.data['attr-multiplier']
+            for data_point in datapoints:
+                percent = (data_point[self.statistics] / rvalue * 100)
+                if not self.op(percent, self.value):
+                    return False
+            return True
+
+        for data_point in datapoints:
+            if 'ExtendedStatistics' in data_point:
+                data_point = data_point['ExtendedStatistics']
+            if not self.op(data_point[self.statistics], self.value):
+                return False
+        return True
 
 
 class ShieldMetrics(MetricsFilter):
@@ -249,6 +249,7 @@ might look like:
 
 """
 # note we have to module import for our testing mocks
+from collections import OrderedDict
 import datetime
 import logging
 from os.path import join
@@ -262,6 +263,9 @@ from c7n.resolver import ValuesFrom
 
 log = logging.getLogger('custodian.offhours')
 
+# Number of distinct tag values whose schedules are kept per filter
+SCHEDULE_CACHE_SIZE = 1024
+
 
 def brackets_removed(u):
     return u.translate({ord('['): None, ord(']'): None})
@@ -356,6 +360,10 @@ class Time(Filter):
         self.parser = ScheduleParser(self.default_schedule)
 
         self.id_key = None
+        # per filter schedules by tag value, and per run clocks by timezone
+        self.schedules = OrderedDict()
+        self.clocks = None
+        self.skip_days = None
 
         self.opted_out = []
         self.parse_errors = []
@@ -377,7 +385,12 @@ class Time(Filter):
         return self
 
     def process(self, resources, event=None):
-        resources = super(Time, self).process(resources)
+        self.clocks = {}
+        self.skip_days = None
+        try:
+            resources = super(Time, self).process(resources)
+        finally:
+            self.clocks = None
         if self.parse_errors and self.manager and self.manager.ctx.log_dir:
             self.log.warning("parse errors %d", len(self.parse_errors))
             with open(join(
@@ -429,41 +442,71 @@ class Time(Filter):
         # dateutil.parser.parse to process: value='off=(m-f,1);' properly.
         # before this normalization, some cases would silently fail.
         value = ';'.join(filter(None, value.split(';')))
-        if self.parser.has_resource_schedule(value, time_type):
-            schedule = self.parser.parse(value)
-        elif self.parser.keys_are_valid(value):
-            # respect timezone from tag
-            raw_data = self.parser.raw_data(value)
-            if 'tz' in raw_data:
-                schedule = dict(self.default_schedule)
-                schedule['tz'] = raw_data['tz']
-            else:
-                schedule = self.default_schedule
-        else:
-            schedule = None
+        schedule, tz = self.get_schedule(value, time_type)
         if schedule is None:
             log.warning(
                 "Invalid schedule on resource:%s value:%s", rid, value)
             self.parse_errors.append((rid, value))
             return False
-        tz = self.get_tz(schedule['tz'])
         if not tz:
             log.warning(
                 "Could not resolve tz on resource:%s value:%s", rid, value)
             self.parse_errors.append((rid, value))
             return False
-        now = datetime.datetime.now(tz).replace(
-            minute=0, second=0, microsecond=0)
-        now_str = now.strftime("%Y-%m-%d")
-        if 'skip-days-from' in self.data:
-            values = ValuesFrom(self.data['skip-days-from'], self.manager)
-            self.skip_days = values.get_values()
-        else:
-            self.skip_days = self.data.get('skip-days', [])
-        if now_str in self.skip_days:
+        now = self.get_now(schedule['tz'], tz)
+        if now.strftime("%Y-%m-%d") in self.get_skip_days():
             return False
         return self.match(now, schedule)
 
+    def get_schedule(self, value, time_type):
+        """Return the schedule and timezone of a normalized tag value.
+
+        Schedules are kept in a bounded lru by tag value, as resources
+        typically share a handful of distinct schedules.
+        """
+        if value in self.schedules:
+            self.schedules.move_to_end(value)
+            return self.schedules[value]
+        schedule = tz = None
+        if self.parser.has_resource_schedule(value, time_type):
+            schedule = self.parser.parse(value)
+        elif self.parser.keys_are_valid(value):
+            # respect timezone from tag
+            raw_data = self.parser.raw_data(value)
+            if 'tz' in raw_data:
+                schedule = dict(self.default_schedule)
+                schedule['tz'] = raw_data['tz']
+            else:
+                schedule = self.default_schedule
+        if schedule is not None:
+            tz = self.get_tz(schedule['tz'])
+        self.schedules[value] = schedule, tz
+        if len(self.schedules) > SCHEDULE_CACHE_SIZE:
+            self.schedules.popitem(last=False)
+        return schedule, tz
+
+    def get_now(self, tz_name, tz):
+        """Return the current hour in a timezone.
+
+        Within a run (ie. process) the hour is computed once per timezone.
+        """
+        if self.clocks is not None and tz_name in self.clocks:
+            return self.clocks[tz_name]
+        now = datetime.datetime.now(tz).replace(
+            minute=0, second=0, microsecond=0)
+        if self.clocks is not None:
+            self.clocks[tz_name] = now
+        return now
+
+    def get_skip_days(self):
+        if self.skip_days is None:
+            if 'skip-days-from' in self.data:
+                values = ValuesFrom(self.data['skip-days-from'], self.manager)
+                self.skip_days = set(values.get_values())
+            else:
+                self.skip_days = set(self.data.get('skip-days', ()))
+        return self.skip_days
+
     def match(self, now, schedule):
         time = schedule.get(self.time_type, ())
         for item in time:
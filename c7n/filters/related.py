@@ -2,11 +2,112 @@
 # SPDX-License-Identifier: Apache-2.0
 import importlib
 from functools import lru_cache
+import threading
 
 from .core import ValueFilter, OPERATORS
 from c7n.query import ChildResourceQuery
 from c7n.utils import jmespath_search
 
+# Execution scoped related resource indexes, see c7n.planner
+RELATED_INDEXES = None
+INDEX_LOCK = threading.Lock()
+
+
+class RelatedStore:
+    """Related resources retrieved for a resource type, by id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.fetched = set()
+        self.complete = False
+
+
+class RelatedIndex:
+    """Index of a related resource type's population by id.
+
+    Resources are fetched by id while few ids are needed, or as a whole
+    population once, and retained so subsequent lookups by any filter
+    sharing the index's store are served from it. Fetches use the
+    index's own manager, so they're accounted to its policy's execution.
+
+    Resources may be shared by filters of several policies, and must be
+    copied before being annotated.
+    """
+
+    def __init__(self, manager, store=None):
+        self.manager = manager
+        self.store = store or RelatedStore()
+
+    @property
+    def lock(self):
+        return self.store.lock
+
+    @property
+    def resources(self):
+        return self.store.resources
+
+    @property
+    def fetched(self):
+        return self.store.fetched
+
+    @property
+    def complete(self):
+        return self.store.complete
+
+    def add(self, resources):
+        model = self.manager.get_model()
+        for r in resources or ():
+            self.resources[r[model.id]] = r
+
+    def load(self):
+        """Fetch the full population of the resource type."""
+        with self.lock:
+            if not self.complete:
+                self.add(self.manager.resources())
+                self.store.complete = True
+        return self.resources
+
+    def fetch(self, ids, *args):
+        """Fetch resources by id which haven't been looked up yet."""
+        with self.lock:
+            missing = [i for i in set(ids) if i not in self.fetched and i not in self.resources]
+            if missing:
+                self.add(self.manager.get_resources(missing, *args))
+                self.fetched.update(missing)
+
+    def get(self, ids, threshold):
+        """Return a map of id to resource for the given ids.
+
+        If at least threshold ids haven't been looked up, the full
+        population is fetched rather than the ids.
+        """
+        if not self.complete:
+            pending = [i for i in ids if i not in self.fetched and i not in self.resources]
+            if len(pending) < threshold:
+                self.fetch(pending)
+            else:
+                self.load()
+        return {i: self.resources[i] for i in ids if i in self.resources}
+
+
+def get_related_index(manager, related_manager):
+    """Return the index of a manager's related resource type.
+
+    Within an execution (see c7n.planner) index stores are shared per
+    account, region, resource type and source, otherwise a new store is
+    used.
+    """
+    if RELATED_INDEXES is None:
+        return RelatedIndex(related_manager)
+    key = (manager.config.get('account_id'), manager.config.get('region'),
+           related_manager.__class__, related_manager.data.get('source'))
+    with INDEX_LOCK:
+        store = RELATED_INDEXES.get(key)
+        if store is None:
+            store = RELATED_INDEXES[key] = RelatedStore()
+    return RelatedIndex(related_manager, store)
+
 
 class RelatedResourceFilter(ValueFilter):
 
@@ -39,19 +140,13 @@ class RelatedResourceFilter(ValueFilter):
             "[].%s" % self.RelatedIdsExpression, resources))
 
     def get_related(self, resources):
-        resource_manager = self.get_resource_manager()
         related_ids = self.get_related_ids(resources)
-        model = resource_manager.get_model()
-        if len(related_ids) < self.FetchThreshold:
-            related = resource_manager.get_resources(list(related_ids))
-        else:
-            related = resource_manager.resources()
-
-        if related is None:
-            return {}
+        # related resources may be shared with other filters, return copies.
+        return {rid: dict(r) for rid, r in self.get_related_index().get(
+            related_ids, self.FetchThreshold).items()}
 
-        return {r[model.id]: r for r in related
-                if r[model.id] in related_ids}
+    def get_related_index(self):
+        return get_related_index(self.manager, self.get_resource_manager())
 
     @lru_cache(maxsize=None)
     def get_resource_manager(self):
@@ -132,7 +227,7 @@ class RelatedResourceByIdFilter(RelatedResourceFilter):
             if matched_vpc:
                 for vpc in matched_vpc:
                     related_resources = related.get(vpc, [])
-                    related_resources.append(r)
+                    related_resources.append(dict(r))
                     related[vpc] = related_resources
         return related
 
@@ -193,7 +288,8 @@ class ChildResourceFilter(RelatedResourceFilter):
         )
         children = child_query.filter(child_resource_manager, parent_ids=list(parent_ids))
         for r in children:
-            self.child_resources.setdefault(r[self.ChildResourceParentKey], []).append(r)
+            self.child_resources.setdefault(
+                r[self.ChildResourceParentKey], []).append(dict(r))
 
         return self.child_resources
 
@@ -43,15 +43,53 @@ class Error:
         return e.response.get('Error', {}).get('Code')
 
 
+# PutLogEvents limits, events are sized as their utf8 message plus a
+# fixed overhead, and a batch can't span more than a day.
+EVENT_OVERHEAD = 26
+MAX_BATCH_BYTES = 1048576
+MAX_BATCH_EVENTS = 10000
+MAX_EVENT_BYTES = 262144 - EVENT_OVERHEAD
+MAX_BATCH_SPAN = 24 * 60 * 60 * 1000
+
+log = logging.getLogger('custodian.log')
+
+
+def event_size(event):
+    return len(event['message'].encode('utf8')) + EVENT_OVERHEAD
+
+
+def get_batches(events, max_bytes=MAX_BATCH_BYTES, max_events=MAX_BATCH_EVENTS):
+    """Split timestamp ordered events into batches within PutLogEvents limits."""
+    batch, size = [], 0
+    for e in events:
+        esize = event_size(e)
+        if batch and (size + esize > max_bytes or len(batch) >= max_events or
+                      e['timestamp'] - batch[0]['timestamp'] > MAX_BATCH_SPAN):
+            yield batch
+            batch, size = [], 0
+        batch.append(e)
+        size += esize
+    if batch:
+        yield batch
+
+
 class CloudWatchLogHandler(logging.Handler):
     """Python Log Handler to Send to Cloud Watch Logs
 
+    Messages are buffered and sent by a background thread in batches up
+    to the PutLogEvents limits. The handler's queue to the thread is
+    bounded, when it's full emitting blocks for up to queue_timeout
+    seconds before messages are dropped (and counted).
+
     https://docs.aws.amazon.com/AmazonCloudWatch/latest/logs/WhatIsCloudWatchLogs.html
     """
 
-    batch_size = 20
+    batch_size = MAX_BATCH_EVENTS
+    batch_bytes = MAX_BATCH_BYTES
     batch_interval = 40
     batch_min_buffer = 10
+    queue_size = 1000
+    queue_timeout = 5
 
     def __init__(self, log_group=__name__, log_stream=None,
                  session_factory=None):
@@ -60,8 +98,9 @@ class CloudWatchLogHandler(logging.Handler):
         self.log_stream = log_stream
         self.session_factory = session_factory
         self.transport = None
-        self.queue = Queue.Queue()
+        self.queue = Queue.Queue(self.queue_size)
         self.threads = []
+        self.dropped = 0
         # do some basic buffering before sending to transport to minimize
         # queue/threading overhead
         self.buf = []
@@ -109,29 +148,42 @@ class CloudWatchLogHandler(logging.Handler):
         self.last_seen = message.created
 
     def flush(self):
-        """Ensure all logging output has been flushed."""
+        """Send buffered logging output, without waiting for delivery.
+
+        Delivery of all output is waited on by close.
+        """
         if self.shutdown:
             return
         self.flush_buffers(force=True)
-        self.queue.put(FLUSH_MARKER)
-        self.queue.join()
+        try:
+            self.queue.put(FLUSH_MARKER, timeout=self.queue_timeout)
+        except Queue.Full:
+            # the transport is behind, queued output is sent as it catches up.
+            pass
 
     def close(self):
         if self.shutdown:
             return
         self.shutdown = True
+        self.flush_buffers(force=True)
         self.queue.put(SHUTDOWN_MARKER)
         self.queue.join()
         for t in self.threads:
             t.join()
         self.threads = []
+        if self.dropped:
+            log.warning(
+                "log group:%s dropped %d messages", self.log_group, self.dropped)
 
     # End logging.Handler API
 
     def format_message(self, msg):
         """format message."""
+        message = self.format(msg)
+        if len(message) * 4 > MAX_EVENT_BYTES:
+            message = message.encode('utf8')[:MAX_EVENT_BYTES].decode('utf8', 'ignore')
         return {'timestamp': int(msg.created * 1000),
-                'message': self.format(msg),
+                'message': message,
                 'stream': self.log_stream or msg.name,
                 'group': self.log_group}
 
@@ -139,28 +191,34 @@ class CloudWatchLogHandler(logging.Handler):
         """start thread transports."""
         self.transport = Transport(
             self.queue, self.batch_size, self.batch_interval,
-            self.session_factory)
+            self.session_factory, self.batch_bytes)
         thread = threading.Thread(target=self.transport.loop)
         self.threads.append(thread)
         thread.daemon = True
         thread.start()
 
     def flush_buffers(self, force=False):
-        if not force and len(self.buf) < self.batch_min_buffer:
+        if not self.buf or not force and len(self.buf) < self.batch_min_buffer:
             return
-        self.queue.put(self.buf)
+        try:
+            self.queue.put(self.buf, timeout=self.queue_timeout)
+        except Queue.Full:
+            self.dropped += len(self.buf)
         self.buf = []
 
 
 class Transport:
 
-    def __init__(self, queue, batch_size, batch_interval, session_factory):
+    def __init__(self, queue, batch_size, batch_interval, session_factory,
+                 batch_bytes=MAX_BATCH_BYTES):
         self.queue = queue
         self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
         self.batch_interval = batch_interval
         self.client = session_factory().client('logs')
-        self.sequences = {}
+        self.streams = set()
         self.buffers = {}
+        self.sizes = {}
         self.error = None
 
     def create_stream(self, group, stream):
@@ -177,29 +235,34 @@ class Transport:
         for k, messages in self.buffers.items():
             self.send_group(k, messages)
         self.buffers = {}
+        self.sizes = {}
 
     def send_group(self, k, messages):
         group, stream = k.split('=', 1)
-        if stream not in self.sequences:
+        if k not in self.streams:
             if not self.create_stream(group, stream):
                 return
-            self.sequences[stream] = None
-        params = dict(
-            logGroupName=group, logStreamName=stream,
-            logEvents=sorted(
-                messages, key=itemgetter('timestamp'), reverse=False))
-        if self.sequences[stream]:
-            params['sequenceToken'] = self.sequences[stream]
-        try:
-            response = self.client.put_log_events(**params)
-        except ClientError as e:
-            if Error.code(e) in (Error.AlreadyAccepted, Error.InvalidToken):
-                self.sequences[stream] = e.response['Error']['Message'].rsplit(
-                    " ", 1)[-1]
-                return self.send_group(k, messages)
-            self.error = e
-            return
-        self.sequences[stream] = response['nextSequenceToken']
+            self.streams.add(k)
+        # log streams no longer require sequence tokens for puts.
+        for batch in get_batches(
+                sorted(messages, key=itemgetter('timestamp')),
+                self.batch_bytes, self.batch_size):
+            try:
+                self.client.put_log_events(
+                    logGroupName=group, logStreamName=stream, logEvents=batch)
+            except ClientError as e:
+                if Error.code(e) != Error.AlreadyAccepted:
+                    self.error = e
+                    return
+
+    def add(self, k, messages):
+        """Buffer messages for a stream, sending once a batch is full."""
+        self.buffers.setdefault(k, []).extend(messages)
+        self.sizes[k] = self.sizes.get(k, 0) + sum(map(event_size, messages))
+        if (self.sizes[k] >= self.batch_bytes or
+                len(self.buffers[k]) >= self.batch_size):
+            self.send_group(k, self.buffers.pop(k))
+            self.sizes.pop(k)
 
     def loop(self):
         def keyed(datum):
@@ -220,9 +283,10 @@ class Transport:
             elif datum == FLUSH_MARKER:
                 self.send()
             elif datum == SHUTDOWN_MARKER:
+                self.send()
                 self.queue.task_done()
                 return
             else:
                 for k, group in itertools.groupby(datum, keyed):
-                    self.buffers.setdefault(k, []).extend(group)
+                    self.add(k, list(group))
             self.queue.task_done()
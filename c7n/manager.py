@@ -3,7 +3,7 @@
 from collections import deque
 import logging
 
-from c7n import cache, deprecated
+from c7n import cache, deprecated, optimizer
 from c7n.executor import ThreadPoolExecutor
 from c7n.provider import clouds
 from c7n.registry import PluginRegistry
@@ -99,18 +99,20 @@ class ResourceManager:
             return klass(self.ctx, {'source': self.source_type})
         return klass(self.ctx, data or {})
 
-    def filter_resources(self, resources, event=None):
+    def filter_resources(self, resources, event=None, filters=None):
+        if filters is None:
+            filters = self.plan_filters(self.filters)
         original = len(resources)
         if event and event.get('debug', False):
             self.log.info(
-                "Filtering resources using %d filters", len(self.filters))
-        for idx, f in enumerate(self.filters, start=1):
+                "Filtering resources using %d filters", len(filters))
+        for idx, f in enumerate(filters, start=1):
             if not resources:
                 break
             rcount = len(resources)
 
             with self.ctx.tracer.subsegment("filter:%s" % f.type):
-                resources = f.process(resources, event)
+                resources = optimizer.process_filter(self, f, resources, event)
 
             if event and event.get('debug', False):
                 self.log.debug(
@@ -120,6 +122,18 @@ class ResourceManager:
             original, len(resources), self.__class__.__name__.lower()))
         return resources
 
+    def plan_filters(self, filters):
+        """Return filters in evaluation order, see c7n.optimizer."""
+        options = self.ctx.options or {}
+        if options.get('optimize_filters'):
+            filters = optimizer.plan_filters(self, filters)
+        if options.get('explain') and filters:
+            self.log.info(
+                "policy:%s resource:%s filter plan\n%s",
+                self.ctx.policy.name, getattr(self, 'type', None),
+                "\n".join(optimizer.explain_filters(self, filters)))
+        return filters
+
     def get_model(self):
         """Returns the resource meta-model.
         """
@@ -0,0 +1,293 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Cost based ordering of policy filters.
+
+The cost (time and api calls per resource) and selectivity (fraction of
+resources matched) of each filter are recorded per resource type during
+a run and persisted locally. When filter optimization is enabled,
+commutative filters within `and` blocks, including a policy's top level
+filters, are ordered so cheap and selective filters run first and
+expensive filters see fewer resources.
+
+Filters which depend on the output of other filters (ie. value filters
+on `c7n:` annotations, or filters over the whole resource set) are not
+commutative, and act as barriers that filters aren't moved across.
+Commutative filters which annotate resources (ie. `cross-account`) keep
+their order relative to value filters on their annotation key.
+"""
+import contextlib
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+log = logging.getLogger('custodian.optimizer')
+
+# Run scoped filter statistics, set for the duration of `custodian run`
+STATS = None
+
+STATS_FILE = 'cloud-custodian-filter-stats.json'
+
+# Cost in seconds attributed to each api call, as calls also consume
+# service rate limits.
+API_CALL_COST = 0.05
+
+# Estimates for filters without recorded statistics, filters which
+# evaluate resources independently are generally in memory matches.
+DEFAULT_LOCAL_COST = 0.00001
+DEFAULT_COST = 0.01
+DEFAULT_SELECTIVITY = 0.5
+
+
+def get_stats_path(options):
+    """Return the statistics file path, stored alongside the resource cache."""
+    cache = options.get('cache')
+    if cache and cache != 'memory':
+        base = os.path.dirname(os.path.abspath(os.path.expanduser(cache)))
+    else:
+        base = os.path.expanduser('~/.cache')
+    return os.path.join(base, STATS_FILE)
+
+
+def get_filter_key(f):
+    return json.dumps(f.data, sort_keys=True, default=str)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on a file, where the platform supports it."""
+    with open(path, 'a') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        # closing the file releases the lock
+        yield
+
+
+def add_entry(data, resource_type, key, values):
+    entry = data.setdefault(resource_type, {}).setdefault(
+        key, {'runs': 0, 'resources': 0, 'matched': 0, 'seconds': 0.0, 'api_calls': 0})
+    for k, v in values.items():
+        entry[k] = entry.get(k, 0) + v
+
+
+class FilterStats:
+    """Per resource type filter cost and selectivity statistics.
+
+    The statistics file may be shared by concurrent runs (ie. c7n-org
+    workers), so saving merges the statistics recorded since loading
+    into the file's current contents.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.data = {}
+        self.recorded = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as fh:
+                self.data = json.load(fh)
+        except (OSError, ValueError) as e:
+            log.warning("Unable to load filter stats %s error:%s", self.path, e)
+            return False
+        return True
+
+    def save(self):
+        if not self.path or not self.recorded:
+            return
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with self.lock, file_lock(self.path + '.lock'):
+                current = FilterStats(self.path)
+                current.load()
+                for resource_type, entries in self.recorded.items():
+                    for key, values in entries.items():
+                        add_entry(current.data, resource_type, key, values)
+                # write and rename, so readers never see a partial file.
+                fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w') as fh:
+                        json.dump(current.data, fh, indent=2, sort_keys=True)
+                    os.replace(temp_path, self.path)
+                except OSError:
+                    os.remove(temp_path)
+                    raise
+                self.data, self.recorded = current.data, {}
+        except OSError as e:
+            log.warning("Unable to save filter stats %s error:%s", self.path, e)
+
+    def record(self, resource_type, f, count, matched, seconds, api_calls=0):
+        key = get_filter_key(f)
+        values = {'runs': 1, 'resources': count, 'matched': matched,
+                  'seconds': seconds, 'api_calls': api_calls}
+        with self.lock:
+            add_entry(self.data, resource_type, key, values)
+            add_entry(self.recorded, resource_type, key, values)
+
+    def get(self, resource_type, f):
+        return self.data.get(resource_type, {}).get(get_filter_key(f))
+
+    def estimate(self, resource_type, f):
+        """Return (cost per resource, selectivity, recorded) for a filter."""
+        entry = self.get(resource_type, f)
+        if not entry or not entry['resources']:
+            cost = f.is_streamable() and DEFAULT_LOCAL_COST or DEFAULT_COST
+            return cost, DEFAULT_SELECTIVITY, False
+        cost = (entry['seconds'] + entry['api_calls'] * API_CALL_COST) / entry['resources']
+        return cost, entry['matched'] / entry['resources'], True
+
+
+def get_resource_type(manager):
+    return getattr(manager, 'type', manager.__class__.__name__.lower())
+
+
+def get_api_calls(manager):
+    api_stats = getattr(manager.ctx, 'api_stats', None)
+    if api_stats is None:
+        return 0
+    return sum(v for v in api_stats.get_snapshot().values() if isinstance(v, int))
+
+
+def process_filter(manager, f, resources, event=None):
+    """Process a filter, recording its statistics when a run is recording."""
+    stats = STATS
+    if stats is None or manager is None:
+        return f.process(resources, event)
+    calls = get_api_calls(manager)
+    t = time.time()
+    results = f.process(resources, event)
+    stats.record(
+        get_resource_type(manager), f, len(resources), len(results),
+        time.time() - t, get_api_calls(manager) - calls)
+    return results
+
+
+def get_rank(stats, resource_type, f):
+    # the expected cost of a filter per resource it removes
+    cost, selectivity, _ = stats.estimate(resource_type, f)
+    return cost / max(1.0 - selectivity, 0.001)
+
+
+def get_annotation_keys(f):
+    """Return the resource keys a filter annotates."""
+    if f.type in ('and', 'or', 'not'):
+        return set().union(*[get_annotation_keys(c) for c in f.filters])
+    key = getattr(f, 'annotation_key', None)
+    return key and {key} or set()
+
+
+def get_value_keys(f):
+    """Return the resource key expressions a filter reads."""
+    if f.type in ('and', 'or', 'not'):
+        return set().union(*[get_value_keys(c) for c in f.filters])
+    if len(f.data) == 1 and 'type' not in f.data:
+        # shorthand value filter, `key: value`
+        return set(f.data)
+    return {str(f.data[k]) for k in ('key', 'value_path') if f.data.get(k)}
+
+
+def is_dependent(f, run):
+    """Whether a filter reads or writes annotations of filters in a run."""
+    for other in run:
+        for reads, writes in ((f, other), (other, f)):
+            keys = get_annotation_keys(writes)
+            if any(k in expr for k in keys for expr in get_value_keys(reads)):
+                return True
+    return False
+
+
+def plan_block(manager, block, stats):
+    """Return a copy of a boolean block with its nested filters planned.
+
+    The policy's filters are left as written.
+    """
+    planned = copy.copy(block)
+    planned._matcher = None
+    if block.type == 'or':
+        # or blocks evaluate each child over the whole set, only
+        # their nested blocks are planned.
+        planned.filters = [
+            child.type in ('and', 'or', 'not') and plan_block(manager, child, stats) or child
+            for child in block.filters]
+    else:
+        planned.filters = plan_filters(manager, block.filters, stats)
+    return planned
+
+
+def plan_filters(manager, filters, stats=None):
+    """Return filters ordered by estimated cost and selectivity.
+
+    Runs of commutative filters are sorted by rank, other filters keep
+    their position. A filter that reads an annotation written by another
+    filter in the run, or writes one read by it, starts a new run. Nested
+    `and` and `not` blocks are planned into copies of the blocks, the
+    given filters aren't modified.
+    """
+    stats = stats or STATS or FilterStats()
+    resource_type = get_resource_type(manager)
+    planned, run = [], []
+    for f in filters:
+        if f.type in ('and', 'or', 'not'):
+            f = plan_block(manager, f, stats)
+        if f.is_commutative():
+            if is_dependent(f, run):
+                planned.extend(sorted(run, key=lambda f: get_rank(stats, resource_type, f)))
+                run = []
+            run.append(f)
+            continue
+        planned.extend(sorted(run, key=lambda f: get_rank(stats, resource_type, f)))
+        planned.append(f)
+        run = []
+    planned.extend(sorted(run, key=lambda f: get_rank(stats, resource_type, f)))
+    return planned
+
+
+def explain_filters(manager, filters, stats=None, depth=0):
+    """Return a description of the filter plan, one line per filter."""
+    stats = stats or STATS or FilterStats()
+    resource_type = get_resource_type(manager)
+    lines = []
+    for idx, f in enumerate(filters, start=1):
+        cost, selectivity, recorded = stats.estimate(resource_type, f)
+        label = f.type in ('and', 'or', 'not') and f.type or get_filter_key(f)
+        lines.append("%s%d. %s cost:%.6fs selectivity:%.2f%s%s" % (
+            "  " * depth, idx, label, cost, selectivity,
+            not recorded and " (estimated)" or "",
+            not f.is_commutative() and " barrier" or ""))
+        if f.type in ('and', 'or', 'not'):
+            lines.extend(explain_filters(manager, f.filters, stats, depth + 1))
+    return lines
+
+
+class Recording:
+    """Record filter statistics for the duration of a run.
+
+    Statistics are loaded from and saved to the given path.
+    """
+
+    def __init__(self, path):
+        self.stats = FilterStats(path)
+
+    def __enter__(self):
+        global STATS
+        self.stats.load()
+        STATS = self.stats
+        return self.stats
+
+    def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
+        global STATS
+        STATS = None
+        self.stats.save()
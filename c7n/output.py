@@ -8,20 +8,25 @@ See docs/usage/outputs.rst
 
 """
 import contextlib
+import contextvars
 import datetime
 import gzip
+import io
 import logging
 import os
+import re
 import shutil
 import tempfile
+import threading
 import time
 import uuid
 
 from abc import ABC, abstractmethod
 
 from c7n.exceptions import InvalidOutputConfig
+from c7n.executor import ThreadPoolExecutor
 from c7n.registry import PluginRegistry
-from c7n.utils import parse_url_config, join_output_path
+from c7n.utils import parse_url_config, join_output_path, dumps
 
 try:
     import psutil
@@ -30,6 +35,11 @@ try:
 except ImportError:
     HAVE_PSUTIL = False
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 log = logging.getLogger('custodian.output')
 
 
@@ -104,11 +114,204 @@ class NullTracer:
         """Enter main segment for policy execution.
         """
 
+    def write(self):
+        """Write trace output to the policy's output, before it's closed.
+        """
+
     def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
         """Exit main segment for policy execution.
         """
 
 
+class TraceSegment:
+    """A timed section of a policy execution with the api calls made in it."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.error = None
+        # service.operation -> [calls, seconds, retries, bytes]
+        self.api_calls = {}
+
+    def close(self):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.thread_time() - self.cpu_start
+
+    def record_call(self, operation, latency, retries, size):
+        stats = self.api_calls.setdefault(operation, [0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += latency
+        stats[2] += retries
+        stats[3] += size
+
+    def get_api_totals(self):
+        totals = [0, 0.0, 0, 0]
+        for stats in self.api_calls.values():
+            totals = [t + s for t, s in zip(totals, stats)]
+        return totals
+
+
+@tracer_outputs.register('local')
+class LocalTracer(NullTracer):
+    """Trace the hot paths of a policy execution to local files.
+
+    Records the wall time, thread cpu time and api calls (count, latency,
+    retries and response bytes) of each subsegment. Api calls are attributed
+    to the innermost open subsegment of the calling thread, or for worker
+    threads to that of the thread executing the policy. Calls are recorded
+    by provider api stats via record_api_call.
+
+    A chrome trace event file (loadable by speedscope, perfetto or
+    chrome://tracing) and a summary table are written to the policy's
+    output directory as it's closed, segments still open (ie. the
+    policy's and output's) are recorded up to that time.
+    """
+
+    trace_file = 'trace.json'
+    summary_file = 'trace-summary.txt'
+
+    def __init__(self, ctx, config=None):
+        super().__init__(ctx, config)
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self.main_stack = None
+        self.root = None
+        self.segments = []
+
+    def get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def get_active(self):
+        stack = getattr(self._local, 'stack', None) or self.main_stack
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def subsegment(self, name):
+        segment = TraceSegment(name, self.get_active())
+        stack = self.get_stack()
+        stack.append(segment)
+        try:
+            yield segment
+        except Exception as e:
+            segment.error = "%s: %s" % (type(e).__name__, e)
+            raise
+        finally:
+            stack.pop()
+            segment.close()
+            with self.lock:
+                self.segments.append(segment)
+
+    def record_api_call(self, service, operation, latency, retries=0, size=0):
+        segment = self.get_active()
+        if segment is None:
+            return
+        with self.lock:
+            segment.record_call(
+                "%s.%s" % (service, operation), latency, retries, size)
+
+    def __enter__(self):
+        self.segments = []
+        self.root = TraceSegment(self.ctx.policy.name)
+        self.main_stack = self.get_stack()
+        self.main_stack.append(self.root)
+
+    def write(self):
+        if self.root is None:
+            return
+        segments = list(self.segments)
+        for s in self.main_stack:
+            s.close()
+            segments.append(s)
+        self.ctx.output.write_file(
+            self.trace_file, dumps(self.get_trace(segments), indent=None))
+        self.ctx.output.write_file(self.summary_file, self.get_summary(segments))
+        log.debug("trace written to %s", self.ctx.log_dir)
+
+    def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
+        if self.root is None:
+            return
+        self.main_stack.remove(self.root)
+        self.root.close()
+        self.segments.append(self.root)
+        self.root = self.main_stack = None
+
+    def get_trace(self, segments=None):
+        """Return the trace in chrome trace event format."""
+        pid = os.getpid()
+        events = []
+        for s in sorted(segments or self.segments, key=lambda s: s.start):
+            calls, latency, retries, size = s.get_api_totals()
+            args = {'cpu_ms': round(s.cpu * 1000, 3),
+                    'api_calls': calls,
+                    'api_ms': round(latency * 1000, 3),
+                    'api_retries': retries,
+                    'api_bytes': size}
+            if s.api_calls:
+                args['api'] = {
+                    op: {'calls': c, 'ms': round(t * 1000, 3), 'retries': r, 'bytes': b}
+                    for op, (c, t, r, b) in sorted(s.api_calls.items())}
+            if s.error:
+                args['error'] = s.error
+            events.append({
+                'name': s.name, 'cat': 'custodian', 'ph': 'X',
+                'pid': pid, 'tid': s.tid,
+                'ts': round((s.start - self.root.start) * 1e6),
+                'dur': round(s.wall * 1e6),
+                'args': args})
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'policy': self.ctx.policy.name,
+                'resource': self.ctx.policy.resource_type,
+                'execution_id': getattr(self.ctx, 'execution_id', None)}}
+
+    def get_summary(self, segments=None):
+        """Return tables of time and api calls by subsegment and api operation.
+
+        Wall and cpu times include nested subsegments, api calls are only
+        counted in the innermost subsegment they were made in.
+        """
+        rows, operations = {}, {}
+        for s in segments or self.segments:
+            row = rows.setdefault(s.name, [0, 0.0, 0.0, 0, 0.0, 0, 0])
+            row[0] += 1
+            row[1] += s.wall
+            row[2] += s.cpu
+            for i, v in enumerate(s.get_api_totals(), 3):
+                row[i] += v
+            for op, stats in s.api_calls.items():
+                op_row = operations.setdefault((op, s.name), [0, 0.0, 0, 0])
+                operations[(op, s.name)] = [o + v for o, v in zip(op_row, stats)]
+
+        width = max([len(n) for n in rows] + [len('Segment')])
+        lines = ["%-*s %7s %10s %10s %9s %11s %7s %12s" % (
+            width, 'Segment', 'Count', 'Wall(s)', 'CPU(s)',
+            'Api Calls', 'Api Time(s)', 'Retries', 'Bytes')]
+        for name, row in sorted(rows.items(), key=lambda i: -i[1][1]):
+            lines.append("%-*s %7d %10.3f %10.3f %9d %11.3f %7d %12d" % (
+                width, name, *row))
+
+        if operations:
+            op_width = max([len(op) for op, _ in operations] + [len('Api Operation')])
+            lines.append('')
+            lines.append("%-*s %-*s %9s %11s %7s %12s" % (
+                op_width, 'Api Operation', width, 'Segment',
+                'Api Calls', 'Api Time(s)', 'Retries', 'Bytes'))
+            for (op, name), row in sorted(operations.items(), key=lambda i: -i[1][1]):
+                lines.append("%-*s %-*s %9d %11.3f %7d %12d" % (
+                    op_width, op, width, name, *row))
+        return "\n".join(lines) + "\n"
+
+
 class DeltaStats:
     """Capture stats (dictionary of string->integer) as a stack.
 
@@ -314,6 +517,89 @@ class LogMetrics(Metrics):
         return res
 
 
+@metrics_outputs.register('openmetrics')
+class OpenMetricsOutput(LogMetrics):
+    """Write metrics to an OpenMetrics text file, for offline runs.
+
+    Usage: ``--metrics openmetrics:///var/lib/node_exporter/textfile``
+
+    Each policy execution writes a file to the directory (ie. for a
+    prometheus node exporter's textfile collector), with metrics as
+    summaries of their values, labeled by their dimensions.
+    """
+
+    unit_suffixes = {'Seconds': '_seconds', 'Bytes': '_bytes'}
+
+    def __init__(self, ctx, config=None):
+        super().__init__(ctx, config)
+        self.series = {}
+
+    @property
+    def path(self):
+        name = "custodian-%s" % self.ctx.policy.name
+        region = getattr(getattr(self.ctx, 'options', None), 'region', None)
+        if region:
+            name += "-%s" % region
+        return os.path.join(
+            (self.config.get('netloc') or '') + (self.config.get('path') or ''),
+            "%s.prom" % name)
+
+    def get_metric_name(self, name, unit):
+        name = re.sub('(?<!^)(?=[A-Z][a-z])', '_', name).lower()
+        name = re.sub('[^a-z0-9_]+', '_', name)
+        return "custodian_%s%s" % (name, self.unit_suffixes.get(unit, ''))
+
+    def _put_metrics(self, ns, metrics):
+        for m in metrics:
+            key = (self.get_metric_name(m['MetricName'], m['Unit']),
+                   tuple((d['Name'].lower(), str(d['Value'])) for d in m['Dimensions']))
+            count, total = self.series.get(key, (0, 0))
+            self.series[key] = (count + 1, total + m['Value'])
+        self.write()
+
+    def write(self):
+        lines, name = [], None
+        for (sname, labels), (count, total) in sorted(self.series.items()):
+            if sname != name:
+                name = sname
+                lines.append("# TYPE %s summary" % name)
+            label_str = ",".join('%s="%s"' % (k, escape_label(v)) for k, v in labels)
+            lines.append("%s_count{%s} %d" % (name, label_str, count))
+            lines.append("%s_sum{%s} %s" % (name, label_str, repr(float(total))))
+        lines.append("# EOF")
+        path = self.path
+        # write and rename, so collectors never read a partial file.
+        with open(path + ".tmp", "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# The execution context of the policy running in the current thread, it
+# propagates to the policy's executor threads, see c7n.executor
+EXECUTION = contextvars.ContextVar('c7n_execution', default=None)
+
+
+class ExecutionLogFilter(logging.Filter):
+    """Exclude the log records of other concurrently executing policies.
+
+    Records are filtered in the thread which emitted them, so the policy
+    they belong to is the current execution context.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.execution = EXECUTION.get()
+
+    def filter(self, record):
+        if self.execution is None:
+            return True
+        return EXECUTION.get() in (None, self.execution)
+
+
 class LogOutput:
 
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -342,6 +628,7 @@ class LogOutput:
             return
         self.handler.setLevel(logging.DEBUG)
         self.handler.setFormatter(logging.Formatter(self.log_format))
+        self.handler.addFilter(ExecutionLogFilter())
         mlog = logging.getLogger('custodian')
         mlog.addHandler(self.handler)
 
@@ -408,6 +695,20 @@ class OutputFileHandler(ABC):
         "Write a file at the relative path specified with the value as the content."
         raise NotImplementedError()
 
+    def write_resources(self, resources):
+        "Write a policy's resources."
+        self.write_file('resources.json', dumps(resources, indent=2))
+
+
+def open_text(path, compression=None):
+    """Open a file for writing text, optionally compressed."""
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', compresslevel=7, encoding='utf8')
+    elif compression == 'zstd':
+        return io.TextIOWrapper(
+            zstandard.ZstdCompressor().stream_writer(open(path, 'wb')), encoding='utf8')
+    return open(path, 'w')
+
 
 @blob_outputs.register('null')
 class NullBlobOutput(OutputFileHandler):
@@ -430,18 +731,34 @@ class NullBlobOutput(OutputFileHandler):
     def write_file(self, rel_path, value):
         "A no-op for the null handler."
 
+    def write_resources(self, resources):
+        "A no-op for the null handler."
+
 
 @blob_outputs.register('file')
 @blob_outputs.register('default')
 class DirectoryOutput(OutputFileHandler):
+    """Write outputs to a local directory.
+
+    The resources file format is selectable with output url query
+    parameters, ie. ``file:///tmp/output?format=ndjson&compress=zstd``
+
+    - format: ``json`` (default) an indented array, or ``ndjson`` a
+      compact record per line
+    - compress: ``gzip`` or ``zstd``
+    """
 
     permissions = ()
+    resource_formats = ('json', 'ndjson')
+    compressions = {'gzip': '.gz', 'zstd': '.zst'}
+    default_compression = None
 
     def __init__(self, ctx, config):
         self.ctx = ctx
         self.config = config
+        self.get_resources_format()
 
-        output_path = self.get_output_path(config['url'])
+        output_path = self.get_output_path(config['url'].split('?', 1)[0])
         if output_path.startswith('file://'):
             output_path = output_path[len('file://'):]
 
@@ -462,16 +779,51 @@ class DirectoryOutput(OutputFileHandler):
         with open(os.path.join(self.root_dir, rel_path), 'w') as fh:
             fh.write(value)
 
+    def get_resources_format(self):
+        """Return the configured (format, compression) of resources files."""
+        config = getattr(self, 'config', None) or {}
+        fmt = config.get('format', 'json')
+        compression = config.get('compress', self.default_compression)
+        if fmt not in self.resource_formats:
+            raise InvalidOutputConfig("Invalid resources format: %s" % fmt)
+        if compression is not None and compression not in self.compressions:
+            raise InvalidOutputConfig("Invalid resources compression: %s" % compression)
+        if compression == 'zstd' and zstandard is None:
+            raise InvalidOutputConfig("zstd compression requires the zstandard package")
+        return fmt, compression
+
+    def get_resources_path(self):
+        fmt, compression = self.get_resources_format()
+        return os.path.join(self.root_dir, 'resources.%s%s' % (
+            fmt, self.compressions.get(compression, '')))
+
+    def write_resources(self, resources):
+        """Stream resources to a file, encoding them incrementally."""
+        fmt, compression = self.get_resources_format()
+        path = self.get_resources_path()
+        with open_text(path, compression) as fh:
+            if fmt == 'ndjson':
+                for r in resources:
+                    fh.write(dumps(r, indent=None))
+                    fh.write('\n')
+            else:
+                dumps(resources, fh, indent=2)
+
     def compress(self):
         # Compress files individually so thats easy to walk them, without
         # downloading tar and extracting.
         for root, dirs, files in os.walk(self.root_dir):
             for f in files:
-                fp = os.path.join(root, f)
-                with gzip.open(fp + ".gz", "wb", compresslevel=7) as zfh:
-                    with open(fp, "rb") as sfh:
-                        shutil.copyfileobj(sfh, zfh, length=2**15)
-                    os.remove(fp)
+                if f.endswith(tuple(self.compressions.values())):
+                    continue
+                self.compress_file(os.path.join(root, f))
+
+    def compress_file(self, fp):
+        with gzip.open(fp + ".gz", "wb", compresslevel=7) as zfh:
+            with open(fp, "rb") as sfh:
+                shutil.copyfileobj(sfh, zfh, length=2**15)
+            os.remove(fp)
+        return fp + ".gz"
 
     def get_output_path(self, output_url):
         if '{' not in output_url:
@@ -490,14 +842,29 @@ class DirectoryOutput(OutputFileHandler):
 
 
 class BlobOutput(DirectoryOutput):
+    """Write outputs to a local directory, uploaded to object storage.
+
+    Outputs are uploaded on exit, or with upload workers as each file
+    is written (ie. resources and action results) while the policy
+    executes, with any remaining files (ie. logs) uploaded on exit.
+    """
 
     log = logging.getLogger('custodian.output.blob')
+    # files are compressed for upload, write resources compressed
+    # rather than compressing them in a second pass.
+    default_compression = 'gzip'
+    # number of threads uploading files in the background
+    upload_workers = 0
+    executor_factory = ThreadPoolExecutor
 
     def __init__(self, ctx, config):
         self.ctx = ctx
         # we allow format strings in output urls so reparse config
         # post interpolation.
         self.config = parse_url_config(self.get_output_path(config['url']))
+        self.get_resources_format()
+        self.uploads = {}
+        self.upload_executor = None
         self.bucket = self.config.netloc
         self.key_prefix = self.config.path.strip('/')
         self.root_dir = tempfile.mkdtemp()
@@ -520,18 +887,77 @@ class BlobOutput(DirectoryOutput):
 
     def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
         self.log.debug("%s: uploading policy logs", self.type)
-        self.compress()
-        self.upload()
-        shutil.rmtree(self.root_dir)
+        try:
+            self.compress()
+            self.upload()
+        finally:
+            try:
+                self.flush()
+            finally:
+                shutil.rmtree(self.root_dir)
         self.log.debug("%s: policy logs uploaded", self.type)
 
+    def write_file(self, rel_path, value):
+        path = os.path.join(self.root_dir, rel_path)
+        self.wait_upload(self.get_upload_path(path))
+        super().write_file(rel_path, value)
+        self.upload_written(path)
+
+    def write_resources(self, resources):
+        self.wait_upload(self.get_upload_path(self.get_resources_path()))
+        super().write_resources(resources)
+        self.upload_written(self.get_resources_path())
+
+    def get_upload_path(self, path):
+        if path.endswith(tuple(self.compressions.values())):
+            return path
+        return path + '.gz'
+
+    def wait_upload(self, path):
+        """Wait for a file's pending upload, before the file is rewritten."""
+        future = self.uploads.pop(path, None)
+        if future is not None:
+            # the file is uploaded again once rewritten, so only wait
+            # for the superseded upload's completion.
+            future.exception()
+
+    def upload_written(self, path):
+        """Upload a completed file in the background."""
+        if not self.upload_workers:
+            return
+        if not path.endswith(tuple(self.compressions.values())):
+            path = self.compress_file(path)
+        self.schedule_upload(path)
+
+    def schedule_upload(self, path):
+        root, f = os.path.split(path)
+        key = "/".join(filter(None, [self.key_prefix, root[len(self.root_dir):], f]))
+        if not self.upload_workers:
+            self.upload_file(path, key)
+            self.uploads[path] = None
+            return
+        if self.upload_executor is None:
+            self.upload_executor = self.executor_factory(max_workers=self.upload_workers)
+        self.uploads[path] = self.upload_executor.submit(self.upload_file, path, key)
+
     def upload(self):
+        """Upload files not already uploaded, and wait for all uploads."""
         for root, dirs, files in os.walk(self.root_dir):
-            len_root_dir = len(self.root_dir)
             for f in files:
-                rel_path = root[len_root_dir:]
-                key = "/".join(filter(None, [self.key_prefix, rel_path, f]))
-                self.upload_file(os.path.join(root, f), key)
+                path = os.path.join(root, f)
+                if path not in self.uploads:
+                    self.schedule_upload(path)
+        self.flush()
+
+    def flush(self):
+        """Wait for background uploads, raising the first upload error."""
+        if self.upload_executor is None:
+            return
+        executor, self.upload_executor = self.upload_executor, None
+        executor.shutdown(wait=True)
+        for path, f in self.uploads.items():
+            if f is not None and f.exception():
+                raise f.exception()
 
     def upload_file(self, path, key):
         raise NotImplementedError("subclass responsibility")
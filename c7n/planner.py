@@ -0,0 +1,124 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Run planning across a set of policies.
+
+Policies that target the same resource population (provider, account,
+region, resource type, source and query) share it, so the population
+is fetched and augmented once per run and each policy filters an
+isolated copy of it. Populations are only shared when the resource
+cache is enabled.
+
+Policies execute in their given order, unless grouping is requested,
+where policies sharing a population execute together.
+"""
+from collections import OrderedDict
+import logging
+
+from c7n import cache
+from c7n.filters import metrics, related
+
+
+log = logging.getLogger('custodian.planner')
+
+
+class FetchPlanner:
+    """Group policies by the resource population they query.
+
+    Used as a context manager around policy execution, iteration yields
+    policies in their given order (or grouped by population if grouping),
+    and a group's population is released from the run scoped store once
+    its last policy has executed.
+
+    Populations fetched indirectly (ie. by related resource filters) are
+    retained until the planner exits, so they are shared by every policy
+    in the run, as are the related resource indexes built over them.
+    """
+
+    def __init__(self, policies, group=False):
+        self.policies = list(policies)
+        # whether iteration regroups policies by population, rather
+        # than keeping their given order.
+        self.group = group
+        self.store = None
+
+    @staticmethod
+    def get_fetch_key(policy):
+        """Return the population key for a policy, or None if unshareable."""
+        from c7n.policy import ServerlessExecutionMode
+
+        if (isinstance(policy.get_execution_mode(), ServerlessExecutionMode) and
+                not policy.options.dryrun):
+            return None
+        # without a cache populations aren't shared, see cache.factory
+        if not policy.options.cache or not policy.options.cache_period:
+            return None
+        manager = policy.resource_manager
+        if not hasattr(manager, 'get_cache_key') or not hasattr(manager, 'source'):
+            return None
+        try:
+            query = manager.source.get_query_params(None)
+        except Exception:
+            return None
+        return (policy.provider_name, cache.encode(manager.get_cache_key(query)))
+
+    def plan(self):
+        """Return an ordered list of (key, policies) groups.
+
+        Groups are ordered by first appearance, and policies retain their
+        relative order within a group.
+        """
+        groups = OrderedDict()
+        for p in self.policies:
+            key = self.get_fetch_key(p)
+            groups.setdefault(key if key is not None else id(p), (key, []))[1].append(p)
+        return list(groups.values())
+
+    def __iter__(self):
+        plan = self.plan()
+        log.debug(
+            "fetch plan policies:%d populations:%d grouped:%s",
+            len(self.policies), len([k for k, _ in plan if k is not None]), self.group)
+        if self.group:
+            for key, group in plan:
+                yield from group
+                self.release(key)
+            return
+        # in the given order, a population is released after the last
+        # policy querying it.
+        last = {id(group[-1]): key for key, group in plan}
+        for p in self.policies:
+            yield p
+            if id(p) in last:
+                self.release(last[id(p)])
+
+    def release(self, key):
+        """Release a group's population from the run scoped store."""
+        if key is not None and self.store is not None:
+            self.store.pop(key[1], None)
+
+    def __enter__(self):
+        self.store = {}
+        cache.SHARED_STORE = self.store
+        related.RELATED_INDEXES = {}
+        metrics.METRIC_DATA = {}
+        # policy resource managers are constructed at load time, rebind
+        # their caches to layer over the run scoped store.
+        self.rebind_caches()
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
+        cache.SHARED_STORE = None
+        related.RELATED_INDEXES = None
+        metrics.METRIC_DATA = None
+        self.rebind_caches()
+        self.store.clear()
+        self.store = None
+
+    def rebind_caches(self):
+        """Replace each policy's resource cache, closing the one it replaces."""
+        for p in self.policies:
+            manager = p.resource_manager
+            previous = getattr(manager, '_cache', None)
+            manager._cache = cache.factory(p.options)
+            if previous is not None:
+                previous.close()
@@ -312,6 +312,16 @@ class PullMode(PolicyExecutionMode):
 
     schema = utils.type_schema('pull')
 
+    def put_cache_metrics(self, ctx):
+        stats = self.policy.get_cache().get_stats()
+        if not stats:
+            return
+        ctx.metrics.put_metric("CacheHits", stats.get('hits', 0), "Count", Scope="Policy")
+        ctx.metrics.put_metric("CacheMisses", stats.get('misses', 0), "Count", Scope="Policy")
+        ctx.metrics.put_metric(
+            "CacheBytes", stats.get('bytes_read', 0) + stats.get('bytes_written', 0),
+            "Bytes", Scope="Policy")
+
     def run(self, *args, **kw):
         if not self.policy.is_runnable():
             return []
@@ -348,7 +358,8 @@ class PullMode(PolicyExecutionMode):
                 "ResourceCount", len(resources), "Count", Scope="Policy"
             )
             ctx.metrics.put_metric("ResourceTime", rt, "Seconds", Scope="Policy")
-            ctx.output.write_file('resources.json', utils.dumps(resources, indent=2))
+            self.put_cache_metrics(ctx)
+            ctx.output.write_resources(resources)
 
             if not resources:
                 return []
@@ -537,7 +548,7 @@ class LambdaMode(ServerlessExecutionMode):
                     "Invoking actions %s", self.policy.resource_manager.actions
                 )
 
-            ctx.output.write_file('resources.json', utils.dumps(resources, indent=2))
+            ctx.output.write_resources(resources)
 
             for action in self.policy.resource_manager.actions:
                 self.policy.log.info(
@@ -5,7 +5,6 @@ Query capability built on skew metamodel
 
 tags_spec -> s3, elb, rds
 """
-from concurrent.futures import as_completed
 import functools
 import itertools
 import json
@@ -13,6 +12,7 @@ from typing import List
 
 import os
 
+from c7n import ratelimit
 from c7n.actions import ActionRegistry
 from c7n.exceptions import ClientError, ResourceLimitExceeded, PolicyExecutionError
 from c7n.filters import FilterRegistry, MetricsFilter
@@ -61,8 +61,22 @@ class ResourceQuery:
 
         return data
 
-    def filter(self, resource_manager, **params):
-        """Query a set of resources."""
+    def _iter_client_enum(self, client, enum_op, params, path, retry=None):
+        """Yield the results of an enumeration a page at a time."""
+        if not client.can_paginate(enum_op):
+            yield self._invoke_client_enum(client, enum_op, params, path) or []
+            return
+        p = client.get_paginator(enum_op)
+        if retry:
+            p.PAGE_ITERATOR_CLS = RetryPageIterator
+        if path:
+            path = jmespath_compile(path)
+        for page in p.paginate(**params):
+            if path:
+                page = path.search(page)
+            yield page or []
+
+    def _get_enum_client(self, resource_manager, params):
         m = self.resolve(resource_manager.resource_type)
         if resource_manager.get_client:
             client = resource_manager.get_client()
@@ -72,10 +86,22 @@ class ResourceQuery:
         enum_op, path, extra_args = m.enum_spec
         if extra_args:
             params = {**extra_args, **params}
+        return client, enum_op, path, params
+
+    def filter(self, resource_manager, **params):
+        """Query a set of resources."""
+        client, enum_op, path, params = self._get_enum_client(resource_manager, params)
         return self._invoke_client_enum(
             client, enum_op, params, path,
             getattr(resource_manager, 'retry', None)) or []
 
+    def iter_filter(self, resource_manager, **params):
+        """Query a set of resources, yielding a page at a time."""
+        client, enum_op, path, params = self._get_enum_client(resource_manager, params)
+        yield from self._iter_client_enum(
+            client, enum_op, params, path,
+            getattr(resource_manager, 'retry', None))
+
     def get(self, resource_manager, identities):
         """Get resources by identities
         """
@@ -118,6 +144,9 @@ class ChildResourceQuery(ResourceQuery):
 
     parent_key = 'c7n:parent-id'
 
+    # Maximum number of parents enumerated concurrently
+    max_workers = 8
+
     def __init__(self, session_factory, manager, capture_parent_id=False):
         self.session_factory = session_factory
         self.manager = manager
@@ -125,6 +154,18 @@ class ChildResourceQuery(ResourceQuery):
 
     def filter(self, resource_manager, parent_ids=None, **params):
         """Query a set of resources."""
+        results = []
+        for subset in self.iter_filter(resource_manager, parent_ids, **params):
+            results.extend(subset)
+        return results
+
+    def iter_filter(self, resource_manager, parent_ids=None, **params):
+        """Query a set of resources, yielding each parent's children.
+
+        Parents are enumerated concurrently, and their children yielded
+        in parent order. An error enumerating a parent's children is
+        logged and the parent skipped, unless every parent errors.
+        """
         m = self.resolve(resource_manager.resource_type)
         if resource_manager.get_client:
             client = resource_manager.get_client()
@@ -148,27 +189,45 @@ class ChildResourceQuery(ResourceQuery):
         # Bail out with no parent ids...
         existing_param = parent_key in params
         if not existing_param and len(parent_ids) == 0:
-            return []
+            return
 
         # Handle a query with parent id
         if existing_param:
-            return self._invoke_client_enum(client, enum_op, params, path)
+            yield self._invoke_client_enum(client, enum_op, params, path) or []
+            return
 
         # Have to query separately for each parent's children.
-        results = []
-        for parent_id in parent_ids:
-            merged_params = self.get_parent_parameters(params, parent_id, parent_key)
-            subset = self._invoke_client_enum(
-                client, enum_op, merged_params, path, retry=self.manager.retry)
-            if annotate_parent:
-                for r in subset:
-                    r[self.parent_key] = parent_id
-            if subset:
+        max_workers = ratelimit.get_workers(
+            min(self.max_workers, len(parent_ids)), m.service, client.meta.region_name)
+        errors = []
+        with self.manager.executor_factory(max_workers=max_workers) as w:
+            futures = [
+                (parent_id, w.submit(
+                    self._invoke_client_enum, client, enum_op,
+                    self.get_parent_parameters(params, parent_id, parent_key),
+                    path, retry=self.manager.retry))
+                for parent_id in parent_ids]
+            for parent_id, f in futures:
+                if f.exception():
+                    if not isinstance(f.exception(), ClientError):
+                        raise f.exception()
+                    self.manager.log.warning(
+                        "Error enumerating %s of parent:%s error:%s",
+                        self.manager.type, parent_id, f.exception())
+                    errors.append(f.exception())
+                    continue
+                subset = f.result()
+                if not subset:
+                    continue
+                if annotate_parent:
+                    for r in subset:
+                        r[self.parent_key] = parent_id
                 if self.capture_parent_id:
-                    results.extend([(parent_id, s) for s in subset])
+                    yield [(parent_id, s) for s in subset]
                 else:
-                    results.extend(subset)
-        return results
+                    yield subset
+        if errors and len(errors) == len(parent_ids):
+            raise errors[0]
 
     def get_parent_parameters(self, params, parent_id, parent_key):
         return dict(params, **{parent_key: parent_id})
@@ -229,6 +288,14 @@ class DescribeSource:
     def resources(self, query):
         return self.query.filter(self.manager, **query)
 
+    def iter_resources(self, query):
+        """Yield resources a page at a time, for streaming execution."""
+        # subclasses customizing enumeration are fetched in one page.
+        if type(self).resources is not DescribeSource.resources:
+            yield self.resources(query)
+            return
+        yield from self.query.iter_filter(self.manager, **query)
+
     def get_query(self):
         return self.resource_query_factory(self.manager.session_factory)
 
@@ -270,8 +337,9 @@ class DescribeSource:
                 model.service, region_name=self.manager.config.region)
         _augment = functools.partial(
             _augment, self.manager, model, detail_spec, client)
-        with self.manager.executor_factory(
-                max_workers=self.manager.max_workers) as w:
+        max_workers = ratelimit.get_workers(
+            self.manager.max_workers, model.service, self.manager.config.region)
+        with self.manager.executor_factory(max_workers=max_workers) as w:
             results = list(w.map(
                 _augment, chunks(resources, self.manager.chunk_size)))
             return list(itertools.chain(*results))
@@ -298,28 +366,134 @@ class ConfigSource:
 
     retry = staticmethod(get_retry(('ThrottlingException',)))
 
+    # Maximum resource keys per batch get call
+    batch_size = 100
+    max_workers = 3
+
     def __init__(self, manager):
         self.manager = manager
         self.titleCase = self.manager.resource_type.id[0].isupper()
 
     def get_permissions(self):
-        return ["config:GetResourceConfigHistory",
-                "config:ListDiscoveredResources"]
+        perms = ["config:GetResourceConfigHistory",
+                 "config:ListDiscoveredResources",
+                 "config:BatchGetResourceConfig",
+                 "tag:GetResources"]
+        if self.get_aggregator():
+            perms.extend((
+                "config:SelectAggregateResourceConfig",
+                "config:ListAggregateDiscoveredResources",
+                "config:BatchGetAggregateResourceConfig",
+                "config:GetAggregateResourceConfig"))
+        return perms
+
+    def get_aggregator(self):
+        """Return the configuration aggregator the policy queries, if any."""
+        for q in self.manager.data.get('query', ()):
+            if 'aggregator' in q:
+                return q['aggregator']
 
     def get_resources(self, ids, cache=True):
+        return self._get_resources(ids)
+
+    def _get_resources(self, ids, ignore_errors=False):
         client = local_session(self.manager.session_factory).client('config')
-        results = []
         m = self.manager.get_model()
-        for i in ids:
+        results = []
+        max_workers = ratelimit.get_workers(
+            self.max_workers, 'config', client.meta.region_name)
+        with self.manager.executor_factory(max_workers=max_workers) as w:
+            futures = [
+                w.submit(self.get_resource_set, client, m.config_type, resource_set)
+                for resource_set in chunks(ids, self.batch_size)]
+            for f in futures:
+                if f.exception() and ignore_errors:
+                    self.manager.log.error(
+                        "Exception getting resources from config \n %s" % (
+                            f.exception()))
+                    continue
+                results.extend(f.result())
+        return self.load_resource_tags(list(filter(None, results)))
+
+    def get_resource_set(self, client, config_type, resource_ids):
+        response = self.retry(
+            client.batch_get_resource_config,
+            resourceKeys=[
+                {'resourceType': config_type, 'resourceId': i} for i in resource_ids])
+        results = [self.load_resource(item)
+                   for item in response.get('baseConfigurationItems', ())
+                   if item.get('configuration')]
+        # keys config couldn't process in the batch use the resource's history
+        for key in response.get('unprocessedResourceKeys', ()):
             revisions = self.retry(
                 client.get_resource_config_history,
-                resourceId=i,
-                resourceType=m.config_type,
+                resourceId=key['resourceId'],
+                resourceType=config_type,
                 limit=1).get('configurationItems')
-            if not revisions:
+            if revisions:
+                results.append(self.load_resource(revisions[0]))
+        return results
+
+    def get_aggregate_resource_set(self, client, aggregator, identifiers):
+        response = self.retry(
+            client.batch_get_aggregate_resource_config,
+            ConfigurationAggregatorName=aggregator,
+            ResourceIdentifiers=identifiers)
+        if response.get('UnprocessedResourceIdentifiers'):
+            self.manager.log.warning(
+                "config aggregator:%s unprocessed %d resources",
+                aggregator, len(response['UnprocessedResourceIdentifiers']))
+        results = []
+        for item in response.get('BaseConfigurationItems', ()):
+            if not item.get('configuration'):
                 continue
-            results.append(self.load_resource(revisions[0]))
-        return list(filter(None, results))
+            resource = self.load_aggregate_resource(item)
+            # the tagging api only covers the policy's account and region,
+            # other resources without tags use their item level config.
+            if 'Tags' not in resource and not self.is_local(resource):
+                resource = self.get_aggregate_resource_revision(client, aggregator, item)
+            results.append(resource)
+        return results
+
+    def get_aggregate_resource_revision(self, client, aggregator, item):
+        item = self.retry(
+            client.get_aggregate_resource_config,
+            ConfigurationAggregatorName=aggregator,
+            ResourceIdentifier={
+                'SourceAccountId': item['accountId'],
+                'SourceRegion': item['awsRegion'],
+                'ResourceId': item['resourceId'],
+                'ResourceType': item['resourceType']})['ConfigurationItem']
+        resource = self.load_aggregate_resource(item)
+        # item level configuration carries the resource's tags
+        resource.setdefault('Tags', [])
+        return resource
+
+    def is_local(self, resource):
+        """Whether a resource is in the policy's account and region."""
+        return (
+            resource.get('c7n:account-id', self.manager.account_id) ==
+            self.manager.account_id and
+            resource.get('c7n:region', self.manager.config.region) ==
+            self.manager.config.region)
+
+    def load_resource_tags(self, resources):
+        """Fill in tags for resources whose configuration items didn't carry them.
+
+        Batch get items don't include the item level tags of history items,
+        their tags are looked up by arn in bulk from the resource tagging api.
+        """
+        untagged = [r for r in resources if 'Tags' not in r and self.is_local(r)]
+        if untagged and self.manager.has_arn():
+            try:
+                universal_augment(self.manager, untagged)
+            except ClientError as e:
+                self.manager.log.warning(
+                    "Unable to load %s resource tags, error:%s",
+                    self.manager.type, e)
+        for r in untagged:
+            r.setdefault('Tags', [])
+        return resources
 
     def get_query_params(self, query):
         """Parse config select expression from policy and parameter.
@@ -350,8 +524,11 @@ class ConfigSource:
         else:
             _c = None
 
-        s = ("select resourceId, configuration, supplementaryConfiguration "
-             "where resourceType = '{}'").format(self.manager.resource_type.config_type)
+        fields = "resourceId, configuration, supplementaryConfiguration"
+        if self.get_aggregator():
+            fields += ", accountId, awsRegion"
+        s = ("select {} where resourceType = '{}'").format(
+            fields, self.manager.resource_type.config_type)
 
         if _c:
             s += "AND {}".format(_c)
@@ -365,6 +542,13 @@ class ConfigSource:
         self._load_resource_tags(resource, item)
         return resource
 
+    def load_aggregate_resource(self, item):
+        resource = self.load_resource(item)
+        if resource:
+            resource['c7n:account-id'] = item.get('accountId')
+            resource['c7n:region'] = item.get('awsRegion')
+        return resource
+
     def _load_item_config(self, item):
         if isinstance(item['configuration'], str):
             item_config = json.loads(item['configuration'])
@@ -399,48 +583,72 @@ class ConfigSource:
         paginator.PAGE_ITERATOR_CLS = RetryPageIterator
         pages = paginator.paginate(
             resourceType=self.manager.get_model().config_type)
+        ridents = pages.build_full_result()
+        resource_ids = [
+            r['resourceId'] for r in ridents.get('resourceIdentifiers', ())]
+        self.manager.log.debug(
+            "querying %d %s resources",
+            len(resource_ids),
+            self.manager.__class__.__name__.lower())
+        return self._get_resources(resource_ids, ignore_errors=True)
+
+    def get_listed_aggregate_resources(self, client, aggregator):
+        paginator = client.get_paginator('list_aggregate_discovered_resources')
+        paginator.PAGE_ITERATOR_CLS = RetryPageIterator
+        pages = paginator.paginate(
+            ConfigurationAggregatorName=aggregator,
+            ResourceType=self.manager.get_model().config_type)
+        identifiers = [
+            {k: r[k] for k in ('SourceAccountId', 'SourceRegion', 'ResourceId', 'ResourceType')}
+            for r in pages.build_full_result().get('ResourceIdentifiers', ())]
         results = []
-
-        with self.manager.executor_factory(max_workers=2) as w:
-            ridents = pages.build_full_result()
-            resource_ids = [
-                r['resourceId'] for r in ridents.get('resourceIdentifiers', ())]
-            self.manager.log.debug(
-                "querying %d %s resources",
-                len(resource_ids),
-                self.manager.__class__.__name__.lower())
-
-            for resource_set in chunks(resource_ids, 50):
-                futures = []
-                futures.append(w.submit(self.get_resources, resource_set))
-                for f in as_completed(futures):
-                    if f.exception():
-                        self.manager.log.error(
-                            "Exception getting resources from config \n %s" % (
-                                f.exception()))
-                    results.extend(f.result())
-        return results
+        max_workers = ratelimit.get_workers(
+            self.max_workers, 'config', client.meta.region_name)
+        with self.manager.executor_factory(max_workers=max_workers) as w:
+            futures = [
+                w.submit(self.get_aggregate_resource_set, client, aggregator, resource_set)
+                for resource_set in chunks(identifiers, self.batch_size)]
+            for f in futures:
+                if f.exception():
+                    self.manager.log.error(
+                        "Exception getting resources from config aggregator \n %s" % (
+                            f.exception()))
+                    continue
+                results.extend(f.result())
+        return self.load_resource_tags(list(filter(None, results)))
 
     def resources(self, query=None):
         client = local_session(self.manager.session_factory).client('config')
         query = self.get_query_params(query)
+        aggregator = self.get_aggregator()
+        if aggregator:
+            op, op_name = client.select_aggregate_resource_config, 'SelectAggregateResourceConfig'
+            params = {'ConfigurationAggregatorName': aggregator}
+            load_resource = self.load_aggregate_resource
+        else:
+            op, op_name = client.select_resource_config, 'SelectResourceConfig'
+            params = {}
+            load_resource = self.load_resource
         pager = Paginator(
-            client.select_resource_config,
+            op,
             {'input_token': 'NextToken', 'output_token': 'NextToken',
              'result_key': 'Results'},
-            client.meta.service_model.operation_model('SelectResourceConfig'))
+            client.meta.service_model.operation_model(op_name))
         pager.PAGE_ITERATOR_CLS = RetryPageIterator
 
         results = []
-        for page in pager.paginate(Expression=query['expr']):
+        for page in pager.paginate(Expression=query['expr'], **params):
             results.extend([
-                self.load_resource(json.loads(r)) for r in page['Results']])
+                load_resource(json.loads(r)) for r in page['Results']])
 
         # Config arbitrarily breaks which resource types its supports for query/select
         # on any given day, if we don't have a user defined query, then fallback
         # to iteration mode.
         if not results and query == self.get_query_params({}):
-            results = self.get_listed_resources(client)
+            if aggregator:
+                results = self.get_listed_aggregate_resources(client, aggregator)
+            else:
+                results = self.get_listed_resources(client)
         return results
 
     def augment(self, resources):
@@ -512,6 +720,10 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             perms.extend(self.permissions)
         return perms
 
+    @property
+    def streaming(self):
+        return bool(self.data.get('stream'))
+
     def get_cache_key(self, query):
         return {
             'account': self.account_id,
@@ -532,6 +744,11 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
                 self.log.debug("Using cached %s: %d" % (
                     "%s.%s" % (self.__class__.__module__, self.__class__.__name__),
                     len(resources)))
+                if augment and self._augment_incomplete(resources):
+                    self._cache.save(cache_key, resources)
+
+            if resources is None and augment and self.streaming:
+                return self._stream_resources(query or {})
 
             if resources is None:
                 if query is None:
@@ -553,6 +770,41 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             self.check_resource_limit(len(resources), resource_count)
         return resources
 
+    def _stream_resources(self, query):
+        """Flow source pages through augment and per resource filters.
+
+        Only the leading filters that evaluate resources independently are
+        applied per page, the stream is materialized at the first set
+        level filter (ie. reduce, resource_count) and the remainder are
+        applied to the collected selection. Streamed populations are not
+        cached.
+        """
+        streamed, remainder = split_streamable(self.plan_filters(self.filters))
+        if streamed:
+            self.log.debug(
+                "Streaming %d of %d filters", len(streamed), len(self.filters))
+        resource_count = 0
+        resources = []
+        with self.ctx.tracer.subsegment('resource-stream'):
+            for page in self._iter_source(query):
+                resource_count += len(page)
+                page = self.augment(page)
+                resources.extend(self.filter_resources(page, filters=streamed))
+
+        with self.ctx.tracer.subsegment('filter'):
+            resources = self.filter_resources(resources, filters=remainder)
+
+        if self.data == self.ctx.policy.data:
+            self.check_resource_limit(len(resources), resource_count)
+        return resources
+
+    def _iter_source(self, query):
+        iter_resources = getattr(self.source, 'iter_resources', None)
+        if iter_resources is None:
+            yield self.source.resources(query)
+            return
+        yield from iter_resources(query)
+
     def check_resource_limit(self, selection_count, population_count):
         """Check if policy's execution affects more resources then its limit.
 
@@ -580,6 +832,8 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
         if cache:
             resources = self._get_cached_resources(ids)
             if resources is not None:
+                if augment:
+                    self._augment_incomplete(resources)
                 return resources
         try:
             resources = self.source.get_resources(ids)
@@ -590,6 +844,19 @@ class QueryResourceManager(ResourceManager, metaclass=QueryMeta):
             self.log.warning("event ids not resolved: %s error:%s" % (ids, e))
             return []
 
+    def _augment_incomplete(self, resources):
+        """Fill in cached resources for sources that augment on demand.
+
+        Returns True if any resources were augmented.
+        """
+        if not hasattr(self.source, 'get_incomplete'):
+            return False
+        incomplete = self.source.get_incomplete(resources)
+        if incomplete:
+            with self.ctx.tracer.subsegment('resource-augment'):
+                self.augment(incomplete)
+        return bool(incomplete)
+
     def augment(self, resources):
         """subclasses may want to augment resources with additional information.
 
@@ -704,6 +971,14 @@ class MaxResourceLimit:
                     "max-percent", self.percent, self.selection_count, self.population_count)
 
 
+def split_streamable(filters):
+    """Split filters at the first filter that needs the whole resource set."""
+    for idx, f in enumerate(filters):
+        if not f.is_streamable():
+            return filters[:idx], filters[idx:]
+    return filters, []
+
+
 class ChildResourceManager(QueryResourceManager):
 
     child_source = 'describe-child'
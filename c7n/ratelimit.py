@@ -0,0 +1,218 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Adaptive client side rate limiting of aws api calls.
+
+Calls are metered by a token bucket per (account, region, service,
+operation), shared across the threads of a process via botocore event
+hooks registered on sessions (see c7n.credentials.SessionFactory).
+
+Buckets start unlimited. On a throttling error a bucket's rate is set to
+a fraction of the observed call rate (multiplicative decrease), and each
+successful call raises the rate (additive increase), so calls converge on
+the highest rate a service allows instead of retrying in backoff. A
+limited bucket's rate and call latency also bound the number of workers
+used to make concurrent calls, see get_workers.
+"""
+import math
+import threading
+import time
+
+
+# Throttling error codes, per botocore's retry classification less quota
+# (LimitExceededException) and state conflict (TransactionInProgressException)
+# errors, which don't indicate a call rate to back off from.
+THROTTLE_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'BandwidthLimitExceeded',
+    'RequestThrottled',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException',
+}
+
+# Minimum calls per second of a limited bucket
+MIN_RATE = 0.5
+
+# Limited buckets whose rate recovers past this are unlimited
+MAX_RATE = 100.0
+
+# Fraction of the current rate on throttling
+DECREASE = 0.5
+
+# Rate increase per second of successful calls
+INCREASE = 1.0
+
+# Throttles within this many seconds of a decrease are attributed to it
+DECREASE_INTERVAL = 1.0
+
+
+def is_throttle(code):
+    return code in THROTTLE_CODES or (code or '').startswith('Throttl')
+
+
+class TokenBucket:
+    """Token bucket with additive increase, multiplicative decrease rate."""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = clock()
+        self.last_decrease = None
+        self.window_start = self.updated
+        self.window_count = 0
+        self.measured = 0.0
+        self.latency = None
+
+    @property
+    def limited(self):
+        return self.rate is not None
+
+    def measure(self, now):
+        self.window_count += 1
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.measured = self.window_count / elapsed
+            self.window_start = now
+            self.window_count = 0
+
+    def acquire(self):
+        """Take a token, sleeping until one is available.
+
+        Returns the time slept.
+        """
+        with self.lock:
+            now = self.clock()
+            self.measure(now)
+            if self.rate is None:
+                return 0
+            self.tokens = min(
+                max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            # callers queue for tokens by taking them in advance
+            delay = -self.tokens / self.rate
+        self.sleep(delay)
+        return delay
+
+    def throttled(self):
+        with self.lock:
+            now = self.clock()
+            if (self.last_decrease is not None and
+                    now - self.last_decrease < DECREASE_INTERVAL):
+                return
+            current = self.rate
+            if current is None:
+                current = max(self.measured, self.window_count / max(
+                    now - self.window_start, 1.0))
+            self.rate = max(MIN_RATE, current * DECREASE)
+            self.tokens = min(self.tokens, 0)
+            self.updated = now
+            self.last_decrease = now
+
+    def succeeded(self, latency=None):
+        with self.lock:
+            if latency is not None:
+                self.latency = latency if self.latency is None else (
+                    self.latency * 0.9 + latency * 0.1)
+            if self.rate is None:
+                return
+            self.rate += INCREASE / self.rate
+            if self.rate > MAX_RATE:
+                self.rate = None
+
+
+class RateLimiter:
+    """Token buckets keyed by (account, region, service, operation)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def get_bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.setdefault(key, TokenBucket())
+        return bucket
+
+    def get_workers(self, default, service, region=None):
+        """Return a worker count for concurrent calls to a service.
+
+        Workers are bounded by the rate and latency of the service's most
+        limited operation (ie. to keep rate * latency calls in flight).
+        """
+        workers = default
+        for (_, bregion, bservice, _), bucket in list(self.buckets.items()):
+            if (bservice != service or not bucket.limited or
+                    region is not None and bregion != region):
+                continue
+            rate, latency = bucket.rate, bucket.latency or 1.0
+            workers = min(workers, max(1, int(math.ceil(rate * latency))))
+        return workers
+
+    def register(self, session, account=''):
+        """Register rate limiting hooks on a boto3 session."""
+        hooks = SessionHooks(self, account)
+        session.events.register(
+            'before-call.*.*', hooks.before_call, unique_id='c7n-rate-limit-before')
+        session.events.register(
+            'after-call.*.*', hooks.after_call, unique_id='c7n-rate-limit-after')
+        session.events.register(
+            'needs-retry.*.*', hooks.needs_retry, unique_id='c7n-rate-limit-retry')
+
+
+class SessionHooks:
+
+    def __init__(self, limiter, account):
+        self.limiter = limiter
+        self.account = account
+
+    def get_bucket(self, model, region):
+        return self.limiter.get_bucket((
+            self.account, region or '', model.service_model.service_name, model.name))
+
+    def before_call(self, model, context, **kwargs):
+        self.get_bucket(model, context.get('client_region')).acquire()
+        context['c7n_call_start'] = time.monotonic()
+
+    def after_call(self, http_response, model, context, **kwargs):
+        start = context.get('c7n_call_start')
+        if start is None or http_response.status_code >= 300:
+            return
+        self.get_bucket(model, context.get('client_region')).succeeded(
+            time.monotonic() - start)
+
+    def needs_retry(self, response=None, operation=None, request_dict=None, **kwargs):
+        if not response or operation is None:
+            return
+        code = response[1].get('Error', {}).get('Code')
+        if is_throttle(code):
+            region = (request_dict or {}).get('context', {}).get('client_region')
+            self.get_bucket(operation, region).throttled()
+
+
+# Process wide limiter, shared by all sessions
+LIMITER = RateLimiter()
+
+
+def get_account(session_factory):
+    """Return the account identity of a session factory's credentials."""
+    role = getattr(session_factory, 'assume_role', None)
+    if role and role.startswith('arn:') and role.count(':') >= 5:
+        return role.split(':')[4]
+    return role or getattr(session_factory, 'profile', None) or ''
+
+
+def get_workers(default, service, region=None):
+    return LIMITER.get_workers(default, service, region)
@@ -45,8 +45,23 @@ from dateutil.parser import parse as date_parse
 from c7n.executor import ThreadPoolExecutor
 from c7n.utils import local_session, dumps, jmespath_search, jmespath_compile, get_path
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 log = logging.getLogger('custodian.reports')
 
+# resources output file names, by format and compression
+RESOURCE_FILES = (
+    'resources.json',
+    'resources.json.gz',
+    'resources.json.zst',
+    'resources.ndjson',
+    'resources.ndjson.gz',
+    'resources.ndjson.zst',
+)
+
 
 def strip_output_path(path, policy_name):
     """Remove the date portion from an object storage output path.
@@ -87,13 +102,14 @@ def report(policies, start_date, options, output_fh, raw_output_fh=None):
         else:
             policy_records = fs_record_set(policy.ctx.log_dir, policy.name)
 
-        log.debug("Found %d records for region %s", len(policy_records), policy.options.region)
-
+        count = len(records)
         for record in policy_records:
             record['policy'] = policy.name
             record['region'] = policy.options.region
+            records.append(record)
 
-        records += policy_records
+        log.debug(
+            "Found %d records for region %s", len(records) - count, policy.options.region)
 
     rows = formatter.to_csv(records, unique=not options.all_findings)
 
@@ -235,30 +251,54 @@ class Formatter:
         return rows
 
 
-def fs_record_set(output_path, policy_name):
-    record_path = os.path.join(output_path, 'resources.json')
+def iter_records(fh, name):
+    """Stream records from a resources file object.
+
+    The format and compression are given by the file name, see
+    RESOURCE_FILES. Newline delimited files are decoded a record at a
+    time.
+    """
+    if name.endswith('.gz'):
+        fh, name = gzip.GzipFile(fileobj=fh), name[:-3]
+    elif name.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("zstandard package required to read %s" % name)
+        fh, name = zstandard.ZstdDecompressor().stream_reader(fh), name[:-4]
+    if not name.endswith('.ndjson'):
+        yield from json.load(fh)
+        return
+    for line in io.TextIOWrapper(io.BufferedReader(fh), encoding='utf8'):
+        if line.strip():
+            yield json.loads(line)
 
-    if not os.path.exists(record_path):
-        return []
+
+def fs_record_set(output_path, policy_name):
+    """Yield the records of a policy's resources file in a directory."""
+    for f in RESOURCE_FILES:
+        record_path = os.path.join(output_path, f)
+        if os.path.exists(record_path):
+            break
+    else:
+        return
 
     mdate = datetime.fromtimestamp(
         os.stat(record_path).st_ctime)
 
-    with open(record_path) as fh:
-        records = json.load(fh)
-        [r.__setitem__('CustodianDate', mdate) for r in records]
-        return records
+    with open(record_path, 'rb') as fh:
+        for r in iter_records(fh, record_path):
+            r['CustodianDate'] = mdate
+            yield r
 
 
 def record_set(session_factory, bucket, key_prefix, start_date, specify_hour=False):
-    """Retrieve all s3 records for the given policy output url
+    """Yield all s3 records for the given policy output url
 
     From the given start date.
     """
 
     s3 = local_session(session_factory).client('s3')
 
-    records = []
+    record_count = 0
     key_count = 0
 
     date = start_date.strftime('%Y/%m/%d')
@@ -280,35 +320,40 @@ def record_set(session_factory, bucket, key_prefix, start_date, specify_hour=Fal
             if 'Contents' not in key_set:
                 continue
             keys = [k for k in key_set['Contents']
-                    if k['Key'].endswith('resources.json.gz')]
+                    if k['Key'].rsplit('/', 1)[-1] in RESOURCE_FILES]
             key_count += len(keys)
+            # objects are requested concurrently, their bodies are
+            # decoded a record at a time as they're consumed.
             futures = map(lambda k: w.submit(
                 get_records, bucket, k, session_factory), keys)
 
             for f in as_completed(futures):
-                records.extend(f.result())
+                for r in f.result():
+                    record_count += 1
+                    yield r
 
     log.info("Fetched %d records across %d files" % (
-        len(records), key_count))
-    return records
+        record_count, key_count))
 
 
 def get_records(bucket, key, session_factory):
-    # we're doing a lot of this in memory, worst case
-    # though we're talking about a 10k objects, else
-    # we should spool to temp files
+    """Return an iterator over the records of a resources file in s3.
 
+    The object is requested on call, its records are streamed from the
+    response body.
+    """
     # key ends with 'YYYY/mm/dd/HH/resources.json.gz'
     # so take the date parts only
     date_str = '-'.join(key['Key'].rsplit('/', 5)[-5:-1])
     custodian_date = date_parse(date_str)
     s3 = local_session(session_factory).client('s3')
     result = s3.get_object(Bucket=bucket, Key=key['Key'])
-    blob = io.BytesIO(result['Body'].read())
+    log.debug("bucket: %s key: %s", bucket, key['Key'])
+    return _dated_records(
+        iter_records(result['Body'], key['Key']), custodian_date)
+
 
-    records = json.load(gzip.GzipFile(fileobj=blob))
-    log.debug("bucket: %s key: %s records: %d",
-              bucket, key['Key'], len(records))
+def _dated_records(records, custodian_date):
     for r in records:
         r['CustodianDate'] = custodian_date
-    return records
+        yield r
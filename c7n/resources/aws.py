@@ -28,6 +28,7 @@ from boto3.s3.transfer import S3Transfer
 from c7n.credentials import SessionFactory
 from c7n.config import Bag
 from c7n.exceptions import InvalidOutputConfig, PolicyValidationError
+from c7n.executor import ThreadPoolExecutor
 from c7n.log import CloudWatchLogHandler
 from c7n.utils import parse_url_config, backoff_delays
 
@@ -382,13 +383,59 @@ class ArnResolver:
                 return type_name
 
 
+# Distinct values of an aggregated datum, beyond which it's sent as a statistic set
+MAX_METRIC_VALUES = 150
+
+
+def aggregate_metric_data(metrics):
+    """Aggregate datums with the same metric, unit, dimensions and minute.
+
+    Aggregates are sent as value and count arrays, or as statistic sets
+    when they have too many distinct values.
+    """
+    groups = {}
+    for m in metrics:
+        ts = m.get('Timestamp')
+        key = (m.get('MetricName'), m.get('Unit'),
+               ts and ts.replace(second=0, microsecond=0),
+               tuple(sorted((d['Name'], d['Value']) for d in m.get('Dimensions', ()))))
+        groups.setdefault(key, []).append(m)
+
+    results = []
+    for group in groups.values():
+        if len(group) == 1 or not all('Value' in m for m in group):
+            results.extend(group)
+            continue
+        datum = {k: v for k, v in group[0].items() if k != 'Value'}
+        counts = Counter(m['Value'] for m in group)
+        if len(counts) <= MAX_METRIC_VALUES:
+            datum['Values'] = list(counts)
+            datum['Counts'] = list(counts.values())
+        else:
+            values = [m['Value'] for m in group]
+            datum['StatisticValues'] = {
+                'SampleCount': len(values), 'Sum': sum(values),
+                'Minimum': min(values), 'Maximum': max(values)}
+        results.append(datum)
+    return results
+
+
 @metrics_outputs.register('aws')
 class MetricsOutput(Metrics):
     """Send metrics data to cloudwatch
+
+    Metrics are buffered and sent on a background thread, when the
+    buffer is full or on an interval, with a final flush on exit.
+    Identical metrics are aggregated before sending.
     """
 
     permissions = ("cloudWatch:PutMetricData",)
     retry = staticmethod(utils.get_retry(('Throttling',)))
+    # Max metrics in a single request
+    BUFFER_SIZE = 1000
+    # Seconds between background sends
+    FLUSH_INTERVAL = 60
+    executor_factory = ThreadPoolExecutor
 
     def __init__(self, ctx, config=None):
         super(MetricsOutput, self).__init__(ctx, config)
@@ -400,6 +447,46 @@ class MetricsOutput(Metrics):
         self.destination = (
             self.config.scheme == 'aws' and
             self.config.get('netloc') == 'master') and 'master' or None
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+        self.publisher = None
+        self.publishing = []
+
+    def put_metric(self, key, value, unit, buffer=True, **dimensions):
+        point = self._format_metric(key, value, unit, dimensions)
+        with self.lock:
+            self.buf.append(point)
+        if not buffer:
+            self.flush()
+        elif (len(self.buf) >= self.BUFFER_SIZE or
+                time.time() - self.last_flush >= self.FLUSH_INTERVAL):
+            self.publish()
+
+    def publish(self):
+        """Send buffered metrics on a background thread."""
+        with self.lock:
+            buf, self.buf = self.buf, []
+            self.last_flush = time.time()
+            if not buf:
+                return
+            if self.publisher is None:
+                self.publisher = self.executor_factory(max_workers=1)
+            self.publishing.append(
+                self.publisher.submit(self._put_metrics, self.namespace, buf))
+
+    def flush(self):
+        """Send buffered metrics, and wait for background sends."""
+        with self.lock:
+            buf, self.buf = self.buf, []
+            publisher, self.publisher = self.publisher, None
+            publishing, self.publishing = self.publishing, []
+            self.last_flush = time.time()
+        if publisher is not None:
+            publisher.shutdown(wait=True)
+        if buf:
+            self._put_metrics(self.namespace, buf)
+        for f in publishing:
+            f.result()
 
     def _format_metric(self, key, value, unit, dimensions):
         d = {
@@ -439,8 +526,8 @@ class MetricsOutput(Metrics):
             metrics = [m for m in metrics if m["MetricName"] in self.active_metrics]
         if not metrics:
             return
-        return self.retry(
-            watch.put_metric_data, Namespace=ns, MetricData=metrics)
+        for batch in utils.chunks(aggregate_metric_data(metrics), self.BUFFER_SIZE):
+            self.retry(watch.put_metric_data, Namespace=ns, MetricData=batch)
 
 
 @log_outputs.register('aws')
@@ -664,6 +751,8 @@ class ApiStats(DeltaStats):
     def __init__(self, ctx, config=None):
         super(ApiStats, self).__init__(ctx, config)
         self.api_calls = Counter()
+        # Tracers which attribute api calls to their subsegments
+        self.trace_call = None
 
     def get_snapshot(self):
         return dict(self.api_calls)
@@ -672,30 +761,55 @@ class ApiStats(DeltaStats):
         return self.get_snapshot()
 
     def __enter__(self):
+        self.trace_call = getattr(self.ctx.tracer, 'record_api_call', None)
         if isinstance(self.ctx.session_factory, credentials.SessionFactory):
             self.ctx.session_factory.set_subscribers((self,))
         self.push_snapshot()
 
     def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
+        self.ctx.metrics.put_metric(
+            "ApiCalls", sum(self.api_calls.values()), "Count")
+        self.pop_snapshot()
+        # When tracing, calls made while the execution's output closes are
+        # still recorded, until the trace is written (see detach).
+        if self.trace_call is None:
+            self.detach()
+
+    def detach(self):
+        """Stop recording api calls."""
         if isinstance(self.ctx.session_factory, credentials.SessionFactory):
             self.ctx.session_factory.set_subscribers(())
 
         # With cached sessions, we need to unregister any events subscribers
         # on extant sessions to allow for the next registration.
-        utils.local_session(self.ctx.session_factory).events.unregister(
-            'after-call.*.*', self._record, unique_id='c7n-api-stats')
-
-        self.ctx.metrics.put_metric(
-            "ApiCalls", sum(self.api_calls.values()), "Count")
-        self.pop_snapshot()
+        events = utils.local_session(self.ctx.session_factory).events
+        events.unregister('after-call.*.*', self._record, unique_id='c7n-api-stats')
+        events.unregister('before-call.*.*', self._start, unique_id='c7n-api-stats-start')
+        self.trace_call = None
 
     def __call__(self, s):
         s.events.register(
             'after-call.*.*', self._record, unique_id='c7n-api-stats')
+        if self.trace_call is not None:
+            s.events.register(
+                'before-call.*.*', self._start, unique_id='c7n-api-stats-start')
+
+    def _start(self, context, **kwargs):
+        context['c7n_api_stats_start'] = time.perf_counter()
 
     def _record(self, http_response, parsed, model, **kwargs):
         self.api_calls["%s.%s" % (
             model.service_model.endpoint_prefix, model.name)] += 1
+        if self.trace_call is None:
+            return
+        start = (kwargs.get('context') or {}).get('c7n_api_stats_start')
+        metadata = (parsed or {}).get('ResponseMetadata', {})
+        self.trace_call(
+            model.service_model.endpoint_prefix,
+            model.name,
+            start is not None and time.perf_counter() - start or 0.0,
+            metadata.get('RetryAttempts', 0),
+            int(metadata.get('HTTPHeaders', {}).get('content-length') or 0))
 
 
 @blob_outputs.register('s3')
@@ -711,19 +825,24 @@ class S3Output(BlobOutput):
     """
 
     permissions = ('S3:PutObject',)
+    # upload outputs while the policy executes, large files are
+    # additionally uploaded as concurrent multipart transfers.
+    upload_workers = 4
 
     def __init__(self, ctx, config):
         super().__init__(ctx, config)
         self._transfer = None
+        self._transfer_lock = threading.Lock()
 
     @property
     def transfer(self):
-        if self._transfer:
+        with self._transfer_lock:
+            if self._transfer:
+                return self._transfer
+            bucket_region = self.config.region or None
+            self._transfer = S3Transfer(
+                self.ctx.session_factory(region=bucket_region, assume=False).client('s3'))
             return self._transfer
-        bucket_region = self.config.region or None
-        self._transfer = S3Transfer(
-            self.ctx.session_factory(region=bucket_region, assume=False).client('s3'))
-        return self._transfer
 
     def upload_file(self, path, key):
         self.transfer.upload_file(
@@ -539,6 +539,9 @@ class SetRuleState(BaseAction):
 
 class EventRuleTargetQuery(query.ChildResourceQuery):
 
+    def iter_filter(self, resource_manager, parent_ids=None, **params):
+        yield self.filter(resource_manager, parent_ids, **params)
+
     # This function provides custom functionality to query event-rule-targets
     # using both event-rule and event-bus information.
     def filter(self, resource_manager, parent_ids=None, **params):
@@ -23,6 +23,7 @@ from c7n.filters import (
     FilterRegistry, AgeFilter, ValueFilter, Filter
 )
 from c7n.filters.offhours import OffHour, OnHour
+from c7n.filters.related import get_related_index
 from c7n.filters.costhub import CostHubRecommendation
 import c7n.filters.vpc as net_filters
 
@@ -402,8 +403,10 @@ class InstanceImageBase:
         self.image_map = self.get_local_image_mapping(image_ids)
 
     def get_base_image_mapping(self):
-        return {i['ImageId']: i for i in
-                self.manager.get_resource_manager('ami').resources()}
+        return dict(self.get_image_index().load())
+
+    def get_image_index(self):
+        return get_related_index(self.manager, self.manager.get_resource_manager('ami'))
 
     def get_instance_image(self, instance):
         image = instance.get('c7n:instance-image', None)
@@ -412,13 +415,11 @@ class InstanceImageBase:
         return image
 
     def get_local_image_mapping(self, image_ids):
-        base_image_map = self.get_base_image_mapping()
-        resources = {i: base_image_map[i] for i in image_ids if i in base_image_map}
-        missing = list(set(image_ids) - set(resources.keys()))
-        if missing:
-            loaded = self.manager.get_resource_manager('ami').get_resources(missing, False)
-            resources.update({image['ImageId']: image for image in loaded})
-        return resources
+        index = self.get_image_index()
+        index.load()
+        # images not in the account's population, ie. shared or public
+        index.fetch([i for i in image_ids if i not in index.resources], False)
+        return {i: index.resources[i] for i in image_ids if i in index.resources}
 
 
 @filters.register('image-age')
@@ -25,8 +25,10 @@ from c7n.exceptions import PolicyValidationError
 from c7n.filters import ValueFilter, Filter
 from c7n.filters.multiattr import MultiAttrFilter
 from c7n.filters.iamaccess import CrossAccountAccessFilter
+from c7n.filters.iameval import PolicyEvaluator, Unsupported
 from c7n.manager import resources
-from c7n.query import ConfigSource, QueryResourceManager, DescribeSource, TypeInfo
+from c7n.query import (
+    ConfigSource, QueryResourceManager, DescribeSource, TypeInfo, RetryPageIterator)
 from c7n.resolver import ValuesFrom
 from c7n.tags import TagActionFilter, TagDelayedAction, Tag, RemoveTag, universal_augment
 from c7n.utils import (
@@ -500,6 +502,149 @@ class CertificateDelete(BaseAction):
             )
 
 
+# Minimum number of principals a filter evaluates for it to use the
+# account's iam inventory rather than per principal api calls.
+INVENTORY_THRESHOLD = 50
+
+
+class IamInventory:
+    """An account's iam users, groups, roles and policies.
+
+    Loaded with paginated GetAccountAuthorizationDetails calls, and
+    indexed by principal for the attached and inline policies, group
+    memberships and permission boundaries the iam filters evaluate.
+    """
+
+    permissions = ('iam:GetAccountAuthorizationDetails',)
+
+    def __init__(self):
+        self.users = {}
+        self.groups = {}
+        self.roles = {}
+        self.policy_documents = {}
+        self.group_users = {}
+        self.policy_attachments = {}
+
+    @classmethod
+    def load(cls, client):
+        inventory = cls()
+        paginator = client.get_paginator('get_account_authorization_details')
+        paginator.PAGE_ITERATOR_CLS = RetryPageIterator
+        for page in paginator.paginate(
+                Filter=['User', 'Role', 'Group', 'LocalManagedPolicy', 'AWSManagedPolicy']):
+            inventory.add(page)
+        return inventory
+
+    def add(self, details):
+        for kind, index, name_key in (
+                ('UserDetailList', self.users, 'UserName'),
+                ('GroupDetailList', self.groups, 'GroupName'),
+                ('RoleDetailList', self.roles, 'RoleName')):
+            for entity in details.get(kind, ()):
+                index[entity[name_key]] = entity
+                for ap in entity.get('AttachedManagedPolicies', ()):
+                    self.policy_attachments.setdefault(ap['PolicyArn'], []).append(
+                        (name_key[:-4], entity[name_key]))
+        for u in details.get('UserDetailList', ()):
+            for g in u.get('GroupList', ()):
+                self.group_users.setdefault(g, []).append(u['UserName'])
+        for p in details.get('Policies', ()):
+            for v in p.get('PolicyVersionList', ()):
+                if v.get('IsDefaultVersion'):
+                    self.policy_documents[p['Arn']] = v['Document']
+
+    def get_principal(self, kind, name):
+        return {'User': self.users, 'Group': self.groups, 'Role': self.roles}[kind].get(name)
+
+    def get_inline_policies(self, kind, name):
+        """Return a principal's inline policy names, or None if unknown."""
+        principal = self.get_principal(kind, name)
+        if principal is None:
+            return None
+        return [p['PolicyName'] for p in principal.get('%sPolicyList' % kind, ())]
+
+    def get_attached_policies(self, kind, name):
+        """Return a principal's attached managed policies, or None if unknown."""
+        principal = self.get_principal(kind, name)
+        if principal is None:
+            return None
+        return list(principal.get('AttachedManagedPolicies', ()))
+
+    def get_user_groups(self, name):
+        """Return a user's groups in ListGroupsForUser form, or None if unknown."""
+        user = self.users.get(name)
+        if user is None or not all(g in self.groups for g in user.get('GroupList', ())):
+            return None
+        return [select_keys(self.groups[g], ('Path', 'GroupName', 'GroupId', 'Arn', 'CreateDate'))
+                for g in user.get('GroupList', ())]
+
+    def get_group_users(self, name):
+        """Return the names of a group's users, or None if unknown."""
+        if name not in self.groups:
+            return None
+        return self.group_users.get(name, [])
+
+    def get_principal_documents(self, arn):
+        """Return a principal's identity policy documents and permission boundary.
+
+        None is returned if the principal or any of its policy documents
+        aren't in the inventory.
+        """
+        kind, _, name = arn.split(':', 5)[-1].partition('/')
+        kind = kind.capitalize()
+        if kind not in ('User', 'Group', 'Role'):
+            return None
+        principal = self.get_principal(kind, name.rsplit('/', 1)[-1])
+        if principal is None or principal['Arn'] != arn:
+            return None
+        documents = [p['PolicyDocument'] for p in principal.get('%sPolicyList' % kind, ())]
+        attached = list(principal.get('AttachedManagedPolicies', ()))
+        for group_name in principal.get('GroupList', ()):
+            group = self.groups.get(group_name)
+            if group is None:
+                return None
+            documents.extend(p['PolicyDocument'] for p in group.get('GroupPolicyList', ()))
+            attached.extend(group.get('AttachedManagedPolicies', ()))
+        for ap in attached:
+            if ap['PolicyArn'] not in self.policy_documents:
+                return None
+            documents.append(self.policy_documents[ap['PolicyArn']])
+        boundary = principal.get('PermissionsBoundary', {}).get('PermissionsBoundaryArn')
+        if boundary and boundary not in self.policy_documents:
+            return None
+        return documents, boundary and self.policy_documents[boundary] or None
+
+
+def get_iam_inventory(manager, resources):
+    """Return the account's iam inventory for evaluating the given resources.
+
+    None is returned if there are too few resources to warrant loading
+    the inventory, or if it can't be loaded, in which case callers
+    should fall back to per principal calls. The inventory is held in
+    the resource cache, so it's loaded once per run and cache period.
+    """
+    if len(resources) < INVENTORY_THRESHOLD:
+        return None
+    key = {'account': manager.config.account_id,
+           'region': None,
+           'resource': IamInventory.__name__}
+    with manager._cache:
+        inventory = manager._cache.get(key)
+        if inventory is not None:
+            return inventory
+        client = local_session(manager.session_factory).client('iam')
+        try:
+            inventory = IamInventory.load(client)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'AccessDenied':
+                raise
+            manager.log.warning(
+                "Unable to load iam inventory, using per principal calls: %s", e)
+            return None
+        manager._cache.save(key, inventory)
+    return inventory
+
+
 @User.filter_registry.register('usage')
 @Role.filter_registry.register('usage')
 @Group.filter_registry.register('usage')
@@ -660,6 +805,12 @@ class CheckPermissions(Filter):
                   - '*:*'
 
     By default permission boundaries are checked.
+
+    Permissions are checked with the IAM policy simulator. With
+    ``evaluation: local``, principals whose policies are in the account's
+    IAM inventory are instead evaluated locally from IAM's documented
+    evaluation logic, falling back to the simulator for policies it
+    doesn't model.
     """
 
     schema = type_schema(
@@ -669,12 +820,18 @@ class CheckPermissions(Filter):
                 {'$ref': '#/definitions/filters/valuekv'},
                 {'$ref': '#/definitions/filters/value'}]},
             'boundaries': {'type': 'boolean'},
+            'evaluation': {'enum': ['simulator', 'local']},
             'match-operator': {'enum': ['and', 'or']},
             'actions': {'type': 'array', 'items': {'type': 'string'}},
             'required': ('actions', 'match')})
     schema_alias = True
     policy_annotation = 'c7n:policy'
-    eval_annotation = 'c7n:perm-matches'
+    eval_annotation = annotation_key = 'c7n:perm-matches'
+    # evaluation result keys provided by local evaluation
+    offline_keys = ('EvalActionName', 'EvalResourceName', 'EvalDecision')
+
+    def is_commutative(self):
+        return True
 
     def validate(self):
         # This filter relies on IAM policy simulator APIs. From the docs concerning action names:
@@ -698,6 +855,8 @@ class CheckPermissions(Filter):
         if self.manager.type not in ('iam-user', 'iam-role',):
             # for simulating w/ permission boundaries
             perms += ('iam:GetRole',)
+        if self.data.get('evaluation') == 'local':
+            perms += IamInventory.permissions
         return perms
 
     def process(self, resources, event=None):
@@ -718,6 +877,8 @@ class CheckPermissions(Filter):
                 }]
             }
         ''' if not self.data.get('boundaries', True) else None
+        inventory = self.supports_offline() and get_iam_inventory(
+            self.manager, [r for arn, r in arn_resources if arn]) or None
         results = []
         eval_cache = {}
         for arn, r in arn_resources:
@@ -726,7 +887,10 @@ class CheckPermissions(Filter):
             if arn in eval_cache:
                 evaluations = eval_cache[arn]
             else:
-                evaluations = self.get_evaluations(client, arn, r, actions)
+                evaluations = inventory and self.get_offline_evaluations(
+                    inventory, arn, r, actions)
+                if evaluations is None:
+                    evaluations = self.get_evaluations(client, arn, r, actions)
                 eval_cache[arn] = evaluations
             if not evaluations:
                 continue
@@ -745,6 +909,39 @@ class CheckPermissions(Filter):
     def get_iam_arns(self, resources):
         return self.manager.get_arns(resources)
 
+    def supports_offline(self):
+        if self.data.get('evaluation') != 'local':
+            return False
+        match = self.data['match']
+        if isinstance(match, str):
+            return True
+        keys = 'key' in match and {match['key']} or set(match) - {'type'}
+        return keys.issubset(self.offline_keys)
+
+    def get_offline_evaluations(self, inventory, arn, r, actions):
+        """Evaluate actions locally against the inventory's policy documents.
+
+        Returns None if the documents aren't in the inventory, or use
+        constructs the local evaluator doesn't support.
+        """
+        if self.manager.type == 'iam-policy':
+            if r['Arn'] not in inventory.policy_documents:
+                return None
+            documents, boundary = [inventory.policy_documents[r['Arn']]], None
+        else:
+            principal = inventory.get_principal_documents(arn)
+            if principal is None:
+                return None
+            documents, boundary = principal
+        if not self.data.get('boundaries', True):
+            boundary = None
+        try:
+            return PolicyEvaluator(
+                documents, boundary and [boundary] or ()).simulate(actions)
+        except Unsupported as e:
+            self.log.debug("Simulating %s, unsupported by local evaluation: %s", arn, e)
+            return None
+
     def get_evaluations(self, client, arn, r, actions):
         if self.manager.type == 'iam-policy':
             policy = r.get(self.policy_annotation)
@@ -967,20 +1164,23 @@ class IamRoleInlinePolicy(Filter):
     """
 
     schema = type_schema('has-inline-policy', value={'type': 'boolean'})
-    permissions = ('iam:ListRolePolicies',)
+    permissions = ('iam:ListRolePolicies', 'iam:GetAccountAuthorizationDetails')
 
-    def _inline_policies(self, client, resource):
-        policies = client.list_role_policies(
-            RoleName=resource['RoleName'])['PolicyNames']
+    def _inline_policies(self, client, resource, inventory=None):
+        policies = inventory and inventory.get_inline_policies('Role', resource['RoleName'])
+        if policies is None:
+            policies = client.list_role_policies(
+                RoleName=resource['RoleName'])['PolicyNames']
         resource['c7n:InlinePolicies'] = policies
         return resource
 
     def process(self, resources, event=None):
         c = local_session(self.manager.session_factory).client('iam')
+        inventory = get_iam_inventory(self.manager, resources)
         res = []
         value = self.data.get('value', True)
         for r in resources:
-            r = self._inline_policies(c, r)
+            r = self._inline_policies(c, r, inventory)
             if len(r['c7n:InlinePolicies']) > 0 and value:
                 res.append(r)
             if len(r['c7n:InlinePolicies']) == 0 and not value:
@@ -1051,7 +1251,7 @@ class SpecificIamRoleManagedPolicy(ValueFilter):
     """
 
     schema = type_schema('has-specific-managed-policy', rinherit=ValueFilter.schema)
-    permissions = ('iam:ListAttachedRolePolicies',)
+    permissions = ('iam:ListAttachedRolePolicies', 'iam:GetAccountAuthorizationDetails')
     annotation_key = 'c7n:AttachedPolicies'
     matched_annotation_key = 'c7n:MatchedPolicies'
     schema_alias = False
@@ -1073,8 +1273,15 @@ class SpecificIamRoleManagedPolicy(ValueFilter):
 
     def process(self, resources, event=None):
         client = local_session(self.manager.session_factory).client('iam')
+        augment_set = [r for r in resources if self.annotation_key not in r]
+        inventory = get_iam_inventory(self.manager, augment_set)
+        if inventory:
+            for r in augment_set:
+                policies = inventory.get_attached_policies('Role', r['RoleName'])
+                if policies is not None:
+                    r[self.annotation_key] = policies
+            augment_set = [r for r in augment_set if self.annotation_key not in r]
         with self.executor_factory(max_workers=2) as w:
-            augment_set = [r for r in resources if self.annotation_key not in r]
             self.log.debug(
                 "Querying %d roles' attached policies" % len(augment_set))
             list(w.map(
@@ -1109,17 +1316,21 @@ class NoSpecificIamRoleManagedPolicy(Filter):
     """
 
     schema = type_schema('no-specific-managed-policy', value={'type': 'string'})
-    permissions = ('iam:ListAttachedRolePolicies',)
+    permissions = ('iam:ListAttachedRolePolicies', 'iam:GetAccountAuthorizationDetails')
 
-    def _managed_policies(self, client, resource):
-        return [r['PolicyName'] for r in client.list_attached_role_policies(
-            RoleName=resource['RoleName'])['AttachedPolicies']]
+    def _managed_policies(self, client, resource, inventory=None):
+        policies = inventory and inventory.get_attached_policies('Role', resource['RoleName'])
+        if policies is None:
+            policies = client.list_attached_role_policies(
+                RoleName=resource['RoleName'])['AttachedPolicies']
+        return [r['PolicyName'] for r in policies]
 
     def process(self, resources, event=None):
         c = local_session(self.manager.session_factory).client('iam')
         if self.data.get('value'):
+            inventory = get_iam_inventory(self.manager, resources)
             return [r for r in resources if self.data.get('value') not in
-            self._managed_policies(c, r)]
+            self._managed_policies(c, r, inventory)]
         return []
 
 
@@ -1975,19 +2186,23 @@ class IamUserInlinePolicy(Filter):
     """
 
     schema = type_schema('has-inline-policy', value={'type': 'boolean'})
-    permissions = ('iam:ListUserPolicies',)
+    permissions = ('iam:ListUserPolicies', 'iam:GetAccountAuthorizationDetails')
 
-    def _inline_policies(self, client, resource):
-        resource['c7n:InlinePolicies'] = client.list_user_policies(
-            UserName=resource['UserName'])['PolicyNames']
+    def _inline_policies(self, client, resource, inventory=None):
+        policies = inventory and inventory.get_inline_policies('User', resource['UserName'])
+        if policies is None:
+            policies = client.list_user_policies(
+                UserName=resource['UserName'])['PolicyNames']
+        resource['c7n:InlinePolicies'] = policies
         return resource
 
     def process(self, resources, event=None):
         c = local_session(self.manager.session_factory).client('iam')
+        inventory = get_iam_inventory(self.manager, resources)
         value = self.data.get('value', True)
         res = []
         for r in resources:
-            r = self._inline_policies(c, r)
+            r = self._inline_policies(c, r, inventory)
             if len(r['c7n:InlinePolicies']) > 0 and value:
                 res.append(r)
             if len(r['c7n:InlinePolicies']) == 0 and not value:
@@ -2020,6 +2235,8 @@ class UserPolicy(ValueFilter):
         'iam:ListAttachedUserPolicies',
         'iam:ListGroupsForUser',
         'iam:ListAttachedGroupPolicies',
+        'iam:GetAccountAuthorizationDetails',
+        'iam:GetPolicy',
     )
 
     def find_in_user_set(self, user_set, search_key, arn_key, arn):
@@ -2031,13 +2248,26 @@ class UserPolicy(ValueFilter):
 
         return None
 
-    def user_groups_policies(self, client, user_set, u):
-        u['c7n:Groups'] = client.list_groups_for_user(
-            UserName=u['UserName'])['Groups']
+    def get_policy(self, client, arn, policies):
+        # The inventory's policy details lack tags, so policies are
+        # always described, once per policy across the filtered users.
+        if arn not in policies:
+            policies[arn] = client.get_policy(PolicyArn=arn)['Policy']
+        return dict(policies[arn])
+
+    def user_groups_policies(self, client, user_set, u, inventory=None, policies=None):
+        groups = inventory and inventory.get_user_groups(u['UserName'])
+        if groups is None:
+            groups = client.list_groups_for_user(UserName=u['UserName'])['Groups']
+        u['c7n:Groups'] = groups
 
         for ug in u['c7n:Groups']:
             ug_searched = self.find_in_user_set(user_set, 'c7n:Groups', 'Arn', ug['Arn'])
-            if ug_searched and ug_searched.get('AttachedPolicies'):
+            group_policies = inventory and inventory.get_attached_policies(
+                'Group', ug['GroupName'])
+            if group_policies is not None:
+                ug['AttachedPolicies'] = group_policies
+            elif ug_searched and ug_searched.get('AttachedPolicies'):
                 ug['AttachedPolicies'] = ug_searched['AttachedPolicies']
             else:
                 ug['AttachedPolicies'] = client.list_attached_group_policies(
@@ -2053,29 +2283,33 @@ class UserPolicy(ValueFilter):
                         u['c7n:Policies'].append(p_searched)
                     else:
                         u['c7n:Policies'].append(
-                            client.get_policy(PolicyArn=ap['PolicyArn'])['Policy'])
+                            self.get_policy(client, ap['PolicyArn'], policies))
 
         return u
 
-    def user_policies(self, user_set):
+    def user_policies(self, user_set, inventory=None, policies=None):
         client = local_session(self.manager.session_factory).client('iam')
         for u in user_set:
             if 'c7n:Policies' not in u:
                 u['c7n:Policies'] = []
-            aps = client.list_attached_user_policies(
-                UserName=u['UserName'])['AttachedPolicies']
+            aps = inventory and inventory.get_attached_policies('User', u['UserName'])
+            if aps is None:
+                aps = client.list_attached_user_policies(
+                    UserName=u['UserName'])['AttachedPolicies']
             for ap in aps:
                 u['c7n:Policies'].append(
-                    client.get_policy(PolicyArn=ap['PolicyArn'])['Policy'])
+                    self.get_policy(client, ap['PolicyArn'], policies))
             if self.data.get('include-via'):
-                u = self.user_groups_policies(client, user_set, u)
+                u = self.user_groups_policies(client, user_set, u, inventory, policies)
 
     def process(self, resources, event=None):
+        inventory = get_iam_inventory(self.manager, resources)
         user_set = chunks(resources, size=50)
         with self.executor_factory(max_workers=2) as w:
             self.log.debug(
                 "Querying %d users policies" % len(resources))
-            list(w.map(self.user_policies, user_set))
+            list(w.map(functools.partial(
+                self.user_policies, inventory=inventory, policies={}), user_set))
 
         matched = []
         for r in resources:
@@ -2104,7 +2338,7 @@ class GroupMembership(ValueFilter):
 
     schema = type_schema('group', rinherit=ValueFilter.schema)
     schema_alias = False
-    permissions = ('iam:ListGroupsForUser',)
+    permissions = ('iam:ListGroupsForUser', 'iam:GetAccountAuthorizationDetails')
 
     def get_user_groups(self, client, user_set):
         for u in user_set:
@@ -2113,10 +2347,17 @@ class GroupMembership(ValueFilter):
 
     def process(self, resources, event=None):
         client = local_session(self.manager.session_factory).client('iam')
+        augment_set = [r for r in resources if 'c7n:Groups' not in r]
+        inventory = get_iam_inventory(self.manager, augment_set)
+        if inventory:
+            for r in augment_set:
+                groups = inventory.get_user_groups(r['UserName'])
+                if groups is not None:
+                    r['c7n:Groups'] = groups
+            augment_set = [r for r in augment_set if 'c7n:Groups' not in r]
         with self.executor_factory(max_workers=2) as w:
             futures = []
-            for user_set in chunks(
-                    [r for r in resources if 'c7n:Groups' not in r], size=50):
+            for user_set in chunks(augment_set, size=50):
                 futures.append(
                     w.submit(self.get_user_groups, client, user_set))
             for f in as_completed(futures):
@@ -2784,18 +3025,22 @@ class SpecificIamGroupManagedPolicy(Filter):
     """
 
     schema = type_schema('has-specific-managed-policy', value={'type': 'string'})
-    permissions = ('iam:ListAttachedGroupPolicies',)
+    permissions = ('iam:ListAttachedGroupPolicies', 'iam:GetAccountAuthorizationDetails')
 
-    def _managed_policies(self, client, resource):
-        return [r['PolicyName'] for r in client.list_attached_group_policies(
-            GroupName=resource['GroupName'])['AttachedPolicies']]
+    def _managed_policies(self, client, resource, inventory=None):
+        policies = inventory and inventory.get_attached_policies('Group', resource['GroupName'])
+        if policies is None:
+            policies = client.list_attached_group_policies(
+                GroupName=resource['GroupName'])['AttachedPolicies']
+        return [r['PolicyName'] for r in policies]
 
     def process(self, resources, event=None):
         c = local_session(self.manager.session_factory).client('iam')
         if self.data.get('value'):
+            inventory = get_iam_inventory(self.manager, resources)
             results = []
             for r in resources:
-                r["ManagedPolicies"] = self._managed_policies(c, r)
+                r["ManagedPolicies"] = self._managed_policies(c, r, inventory)
                 if self.data.get('value') in r["ManagedPolicies"]:
                     results.append(r)
             return results
@@ -2819,16 +3064,20 @@ class IamGroupUsers(Filter):
             value: False
     """
     schema = type_schema('has-users', value={'type': 'boolean'})
-    permissions = ('iam:GetGroup',)
+    permissions = ('iam:GetGroup', 'iam:GetAccountAuthorizationDetails')
 
-    def _user_count(self, client, resource):
-        return len(client.get_group(GroupName=resource['GroupName'])['Users'])
+    def _user_count(self, client, resource, inventory=None):
+        users = inventory and inventory.get_group_users(resource['GroupName'])
+        if users is None:
+            users = client.get_group(GroupName=resource['GroupName'])['Users']
+        return len(users)
 
     def process(self, resources, events=None):
         c = local_session(self.manager.session_factory).client('iam')
+        inventory = get_iam_inventory(self.manager, resources)
         if self.data.get('value', True):
-            return [r for r in resources if self._user_count(c, r) > 0]
-        return [r for r in resources if self._user_count(c, r) == 0]
+            return [r for r in resources if self._user_count(c, r, inventory) > 0]
+        return [r for r in resources if self._user_count(c, r, inventory) == 0]
 
 
 @Group.filter_registry.register('has-inline-policy')
@@ -2848,19 +3097,23 @@ class IamGroupInlinePolicy(Filter):
             value: True
     """
     schema = type_schema('has-inline-policy', value={'type': 'boolean'})
-    permissions = ('iam:ListGroupPolicies',)
+    permissions = ('iam:ListGroupPolicies', 'iam:GetAccountAuthorizationDetails')
 
-    def _inline_policies(self, client, resource):
-        resource['c7n:InlinePolicies'] = client.list_group_policies(
-            GroupName=resource['GroupName'])['PolicyNames']
+    def _inline_policies(self, client, resource, inventory=None):
+        policies = inventory and inventory.get_inline_policies('Group', resource['GroupName'])
+        if policies is None:
+            policies = client.list_group_policies(
+                GroupName=resource['GroupName'])['PolicyNames']
+        resource['c7n:InlinePolicies'] = policies
         return resource
 
     def process(self, resources, events=None):
         c = local_session(self.manager.session_factory).client('iam')
+        inventory = get_iam_inventory(self.manager, resources)
         value = self.data.get('value', True)
         res = []
         for r in resources:
-            r = self._inline_policies(c, r)
+            r = self._inline_policies(c, r, inventory)
             if len(r['c7n:InlinePolicies']) > 0 and value:
                 res.append(r)
             if len(r['c7n:InlinePolicies']) == 0 and not value:
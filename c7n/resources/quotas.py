@@ -158,7 +158,7 @@ class UsageFilter(MetricsFilter):
     # We systematically use a start time of 24h ago. This means the min period is always 60 seconds.
     cloudwatch_min_period = 60
 
-    permisisons = ('cloudwatch:GetMetricStatistics',)
+    permissions = ('cloudwatch:GetMetricStatistics',)
 
     annotation_key = 'c7n:UsageMetric'
 
@@ -33,8 +33,10 @@ import itertools
 import logging
 import math
 import os
+import re
 import time
 import ssl
+import threading
 
 from botocore.client import Config
 from botocore.exceptions import ClientError
@@ -54,11 +56,12 @@ from c7n.exceptions import PolicyValidationError, PolicyExecutionError
 from c7n.filters import (
     FilterRegistry, Filter, CrossAccountAccessFilter, MetricsFilter,
     ValueFilter, ListItemFilter)
+from c7n.filters.core import BooleanGroupFilter, EventFilter, ReduceFilter
 from .aws import shape_validate
 from c7n.filters.policystatement import HasStatementFilter
 from c7n.manager import resources
 from c7n.output import NullBlobOutput
-from c7n import query
+from c7n import query, ratelimit
 from c7n.resources.securityhub import PostFinding
 from c7n.tags import RemoveTag, Tag, TagActionFilter, TagDelayedAction
 from c7n.utils import (
@@ -79,15 +82,46 @@ MAX_COPY_SIZE = 1024 * 1024 * 1024 * 2
 
 class DescribeS3(query.DescribeSource):
 
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.clients = None
+
     def augment(self, buckets):
-        with self.manager.executor_factory(
-                max_workers=min((10, len(buckets) + 1))) as w:
+        return self.assemble(buckets, self.manager.get_augment_keys())
+
+    def assemble(self, buckets, keys=None):
+        for b in buckets:
+            seed_bucket_location(b)
+        assemble = functools.partial(
+            assemble_bucket,
+            keys=keys,
+            clients=BucketClientPool(self.manager.session_factory))
+        max_workers = ratelimit.get_workers(min((10, len(buckets) + 1)), 's3')
+        with self.manager.executor_factory(max_workers=max_workers) as w:
             results = w.map(
-                assemble_bucket,
+                assemble,
                 zip(itertools.repeat(self.manager.session_factory), buckets))
             results = list(filter(None, results))
             return results
 
+    def get_incomplete(self, buckets):
+        """Return buckets lacking augments needed by the current policy."""
+        keys = self.manager.get_augment_keys()
+        return [b for b in buckets if get_missing_augments(b, keys)]
+
+    def wrap(self, buckets):
+        """Return buckets which fetch augments on first read."""
+        return [b if isinstance(b, LazyBucket) else LazyBucket(b, self.fetch_augment)
+                for b in buckets]
+
+    def fetch_augment(self, bucket, key):
+        log.debug("Bucket:%s fetching undeclared augment:%s", bucket['Name'], key)
+        if self.clients is None:
+            self.clients = BucketClientPool(self.manager.session_factory)
+        assemble_bucket(
+            (self.manager.session_factory, bucket), keys={key}, clients=self.clients)
+        return key in bucket
+
 
 class ConfigS3(query.ConfigSource):
 
@@ -399,6 +433,52 @@ class S3(query.QueryResourceManager):
         perms.extend([n[-1] for n in S3_AUGMENT_TABLE])
         return perms
 
+    def get_augment_keys(self):
+        """Return the bucket augments the policy's filters and actions reference.
+
+        None is returned when all augments are needed, ie. when this
+        manager is serving another resource's related lookup, or the
+        policy uses a filter or action without declared augment usage.
+        """
+        policy_data = getattr(getattr(self.ctx, 'policy', None), 'data', None)
+        if self.data != policy_data:
+            return None
+        return get_bucket_augment_keys(self)
+
+    def filter_resources(self, resources, event=None, filters=None):
+        # augments a filter reads without declaring are fetched lazily
+        wrap = getattr(self.source, 'wrap', None)
+        if wrap is not None and self.get_augment_keys() is not None:
+            resources = wrap(resources)
+        return super().filter_resources(resources, event, filters)
+
+    def resources(self, query=None, augment=True):
+        resources = super().resources(query, augment)
+        if augment:
+            self.complete_augments(resources)
+        return resources
+
+    def get_resources(self, ids, cache=True, augment=True):
+        resources = super().get_resources(ids, cache, augment)
+        if augment:
+            self.complete_augments(resources)
+        return resources
+
+    def complete_augments(self, buckets):
+        """Fetch the augments the policy didn't need for the buckets it returns.
+
+        Only the augments a policy references are fetched for filtering, the
+        buckets it matches are completed so their records are the same as
+        with a full augment.
+        """
+        assemble = getattr(self.source, 'assemble', None)
+        if assemble is None or self.get_augment_keys() is None:
+            return
+        incomplete = [b for b in buckets if get_missing_augments(b)]
+        if incomplete:
+            with self.ctx.tracer.subsegment('resource-augment'):
+                assemble(incomplete)
+
 
 S3_CONFIG_SUPPLEMENT_NULL_MAP = {
     'BucketLoggingConfiguration': u'{"destinationBucketName":null,"logFilePrefix":null}',
@@ -431,17 +511,144 @@ S3_AUGMENT_TABLE = (
 )
 
 
-def assemble_bucket(item):
-    """Assemble a document representing all the config state around a bucket.
+S3_AUGMENT_KEYS = frozenset(m[1] for m in S3_AUGMENT_TABLE)
+
+# Augments read implicitly by filters shared with other resources.
+S3_SHARED_AUGMENT_KEYS = {
+    TagActionFilter: ('Tags',),
+}
+
+# Filters and actions whose augment usage is determined by their keys.
+S3_KEYED_ELEMENTS = (
+    ValueFilter, EventFilter, ReduceFilter, ListItemFilter, PutMetric)
+
+
+def get_bucket_augment_keys(manager):
+    """Determine which bucket augments a policy needs.
+
+    Filters and actions declare their usage via an `augment_keys`
+    attribute, value style filters are inspected for augment key
+    references, anything else conservatively requires all augments
+    and None is returned. Policies without filters or actions are
+    inventory exports and also get all augments.
+    """
+    if not manager.filters and not manager.actions:
+        return None
+    keys = {'Location'}
+    for el in itertools.chain(manager.iter_filters(), manager.actions):
+        if isinstance(el, BooleanGroupFilter):
+            continue
+        if getattr(el, 'augment_keys', None) is not None:
+            keys.update(el.augment_keys)
+        elif type(el) in S3_SHARED_AUGMENT_KEYS:
+            keys.update(S3_SHARED_AUGMENT_KEYS[type(el)])
+        elif type(el) in S3_KEYED_ELEMENTS:
+            keys.update(get_referenced_augment_keys(el.data))
+        else:
+            return None
+    return keys
+
+
+def get_referenced_augment_keys(data):
+    text = json.dumps(data, default=str)
+    keys = {k for k in S3_AUGMENT_KEYS if re.search(r'\b%s\b' % k, text)}
+    if 'tag:' in text:
+        keys.add('Tags')
+    return keys
+
 
-    TODO: Refactor this, the logic here feels quite muddled.
+class LazyBucket(dict):
+    """A bucket which fetches augments that weren't assembled on first read.
+
+    Filters and actions declare the augments they read, this is the
+    fallback for reads that weren't declared. Copies and pickles as a
+    plain dict.
+    """
+
+    def __init__(self, bucket, fetch):
+        super().__init__(bucket)
+        self._fetch = fetch
+
+    def __missing__(self, key):
+        if key in S3_AUGMENT_KEYS and self._fetch(self, key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in S3_AUGMENT_KEYS and key not in self:
+            self._fetch(self, key)
+        return dict.get(self, key, default)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def get_missing_augments(b, keys=None):
+    """Return augment table entries not yet fetched for a bucket."""
+    denied = b.get('c7n:DeniedMethods', ())
+    return [m for m in S3_AUGMENT_TABLE
+            if (keys is None or m[1] in keys) and m[1] not in b and m[0] not in denied]
+
+
+class BucketClientPool:
+    """Regional s3 clients shared across a bucket augment pass.
+
+    A single session is constructed on first use, and clients are created
+    once per region and reused by all buckets in that region.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.session = None
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, region=None):
+        """Return a client for a region, or the session's default region."""
+        client = self.clients.get(region)
+        if client is not None:
+            return client
+        # session client construction isn't thread safe
+        with self.lock:
+            if region not in self.clients:
+                if self.session is None:
+                    self.session = self.session_factory()
+                self.clients[region] = self.session.client(
+                    's3', region_name=region, config=get_bucket_client_config())
+            return self.clients[region]
+
+
+def seed_bucket_location(b):
+    """Set a bucket's location from its list buckets region if available.
+
+    ListBuckets returns each bucket's region, which saves a location
+    lookup per bucket and lets augments go straight to a regional client.
+    """
+    if 'Location' in b or not b.get('BucketRegion'):
+        return
+    # Location == region for all cases but us-east-1
+    # https://docs.aws.amazon.com/AmazonS3/latest/API/RESTBucketGETlocation.html
+    region = b['BucketRegion']
+    b['Location'] = {
+        'LocationConstraint': region if region != 'us-east-1' else None}
+
+
+def assemble_bucket(item, keys=None, clients=None):
+    """Assemble a document representing the config state around a bucket.
+
+    Only augments named in `keys` (default all) which the bucket doesn't
+    already have are fetched, using regional clients from the `clients`
+    pool if given.
     """
     factory, b = item
-    s = factory()
-    c = s.client('s3')
-    # Bucket Location, Current Client Location, Default Location
-    b_location = c_location = location = "us-east-1"
-    methods = list(S3_AUGMENT_TABLE)
+    methods = get_missing_augments(b, keys)
+    if not methods:
+        return b
+    if clients is None:
+        clients = BucketClientPool(factory)
+    # Until we know the bucket location use the default region's client,
+    # bucket location requests are served from any region.
+    c = clients.get('Location' in b and get_region(b) or None)
     for minfo in methods:
         m, k, default, select = minfo[:4]
         try:
@@ -458,12 +665,14 @@ def assemble_bucket(item):
             continue
         except ClientError as e:
             code = e.response['Error']['Code']
+            # Redirects without a region header go to the bucket's location
+            # constraint region, as with bucket_client.
+            region = get_redirect_region(e) or get_region(b)
             if code.startswith("NoSuch") or "NotFound" in code:
                 v = default
-            elif code == 'PermanentRedirect':
-                s = factory()
-                c = bucket_client(s, b)
-                # Requeue with the correct region given location constraint
+            elif code == 'PermanentRedirect' and clients.get(region) is not c:
+                c = clients.get(region)
+                # Requeue with the region the bucket was redirected to
                 methods.append((m, k, default, select))
                 continue
             else:
@@ -484,36 +693,36 @@ def assemble_bucket(item):
                     b.setdefault('c7n:DeniedMethods', []).append(m)
                     continue
                 raise
-        # As soon as we learn location (which generally works)
+        b[k] = v
+        # As soon as we learn location (which generally works) switch to
+        # the bucket's regional client.
         if k == 'Location' and v is not None:
-            b_location = v.get('LocationConstraint')
             # Location == region for all cases but EU
-            # https://docs.aws.amazon.com/AmazonS3/latest/API/RESTBucketGETlocation.html
-            if b_location is None:
-                b_location = "us-east-1"
-            elif b_location == 'EU':
-                b_location = "eu-west-1"
+            if v.get('LocationConstraint') == 'EU':
                 v['LocationConstraint'] = 'eu-west-1'
-            if v and v != c_location:
-                c = s.client('s3', region_name=b_location)
-            elif c_location != location:
-                c = s.client('s3', region_name=location)
-        b[k] = v
+            c = clients.get(get_region(b))
     return b
 
 
-def bucket_client(session, b, kms=False):
-    region = get_region(b)
+def get_redirect_region(e):
+    return e.response.get(
+        'ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
 
+
+def get_bucket_client_config(kms=False):
     if kms:
         # Need v4 signature for aws:kms crypto, else let the sdk decide
         # based on region support.
-        config = Config(
+        return Config(
             signature_version='s3v4',
             read_timeout=200, connect_timeout=120)
-    else:
-        config = Config(read_timeout=200, connect_timeout=120)
-    return session.client('s3', region_name=region, config=config)
+    return Config(read_timeout=200, connect_timeout=120)
+
+
+def bucket_client(session, b, kms=False):
+    region = get_region(b)
+    return session.client(
+        's3', region_name=region, config=get_bucket_client_config(kms))
 
 
 def modify_bucket_tags(session_factory, buckets, add_tags=(), remove_tags=()):
@@ -581,6 +790,8 @@ class S3Metrics(MetricsFilter):
     mismatch, and additional required dimension.
     """
 
+    augment_keys = ()
+
     def get_dimensions(self, resource):
         dims = [{'Name': 'BucketName', 'Value': resource['Name']}]
         if (self.data['name'] == 'NumberOfObjects' and
@@ -605,6 +816,9 @@ class S3CrossAccountFilter(CrossAccountAccessFilter):
                 filters:
                   - type: cross-account
     """
+
+    augment_keys = ('Policy',)
+
     permissions = ('s3:GetBucketPolicy',)
 
     def get_accounts(self):
@@ -715,6 +929,8 @@ class GlobalGrantsFilter(Filter):
 
     """
 
+    augment_keys = ('Acl', 'Website')
+
     schema = type_schema(
         'global-grants',
         allow_website={'type': 'boolean'},
@@ -776,6 +992,7 @@ class BucketActionBase(BaseAction):
     def _process_with_futures(self, buckets, *args, max_workers=3, **kwargs):
         errors = 0
         results = []
+        max_workers = ratelimit.get_workers(max_workers, 's3')
         with self.executor_factory(max_workers=max_workers) as w:
             futures = {}
             for b in buckets:
@@ -808,6 +1025,7 @@ class BucketFilterBase(Filter):
 
 @S3.action_registry.register("post-finding")
 class BucketFinding(PostFinding):
+    augment_keys = ('Acl', 'Tags')
 
     resource_type = 'AwsS3Bucket'
 
@@ -830,6 +1048,8 @@ class BucketFinding(PostFinding):
 
 @S3.filter_registry.register('has-statement')
 class S3HasStatementFilter(HasStatementFilter):
+    augment_keys = ('Policy',)
+
     def get_std_format_args(self, bucket):
         return {
             'account_id': self.manager.config.account_id,
@@ -859,6 +1079,9 @@ class S3LockConfigurationFilter(ValueFilter):
                         value: COMPLIANCE
 
     """
+
+    augment_keys = ()
+
     schema = type_schema('lock-configuration', rinherit=ValueFilter.schema)
     permissions = ('s3:GetBucketObjectLockConfiguration',)
     annotate = True
@@ -919,6 +1142,9 @@ class EncryptionEnabledFilter(Filter):
                 filters:
                   - type: no-encryption-statement
     """
+
+    augment_keys = ('Policy',)
+
     schema = type_schema(
         'no-encryption-statement')
 
@@ -970,6 +1196,8 @@ class MissingPolicyStatementFilter(Filter):
                       - RequiredEncryptedPutObject
     """
 
+    augment_keys = ('Policy',)
+
     schema = type_schema(
         'missing-policy-statement',
         aliases=('missing-statement',),
@@ -1014,6 +1242,8 @@ class BucketNotificationFilter(ValueFilter):
                     statement_ids: matched
     """
 
+    augment_keys = ('Notification',)
+
     schema = type_schema(
         'bucket-notification',
         required=['kind'],
@@ -1080,6 +1310,8 @@ class BucketLoggingFilter(BucketFilterBase):
                     target_prefix: "{account}/{source_bucket_name}/"
     """
 
+    augment_keys = ('Logging',)
+
     schema = type_schema(
         'bucket-logging',
         op={'enum': ['enabled', 'disabled', 'equal', 'not-equal', 'eq', 'ne']},
@@ -1138,6 +1370,8 @@ class BucketLoggingFilter(BucketFilterBase):
 class DeleteBucketNotification(BucketActionBase):
     """Action to delete S3 bucket notification configurations"""
 
+    augment_keys = ('Notification',)
+
     schema = type_schema(
         'delete-bucket-notification',
         required=['statement_ids'],
@@ -1173,6 +1407,7 @@ class DeleteBucketNotification(BucketActionBase):
 
 @actions.register('no-op')
 class NoOp(BucketActionBase):
+    augment_keys = ()
 
     schema = type_schema('no-op')
     permissions = ('s3:ListAllMyBuckets',)
@@ -1206,6 +1441,8 @@ class SetPolicyStatement(BucketActionBase):
                             "aws:SecureTransport": false
     """
 
+    augment_keys = ('Policy',)
+
     permissions = ('s3:PutBucketPolicy',)
 
     schema = type_schema(
@@ -1291,6 +1528,8 @@ class RemovePolicyStatement(RemovePolicyBase):
                       - RequiredEncryptedPutObject
     """
 
+    augment_keys = ('Policy',)
+
     permissions = ("s3:PutBucketPolicy", "s3:DeleteBucketPolicy")
 
     def process(self, buckets):
@@ -1355,6 +1594,9 @@ class SetBucketReplicationConfig(BucketActionBase):
                   - type: set-replication
                     state: enable
     """
+
+    augment_keys = ()
+
     schema = type_schema(
         'set-replication',
         state={'type': 'string', 'enum': ['enable', 'disable', 'remove']})
@@ -1413,6 +1655,8 @@ class FilterPublicBlock(Filter):
                     BlockPublicPolicy: true
     """
 
+    augment_keys = ()
+
     schema = type_schema(
         'check-public-block',
         BlockPublicAcls={'type': 'boolean'},
@@ -1511,6 +1755,8 @@ class SetPublicBlock(BucketActionBase):
 
     """
 
+    augment_keys = ()
+
     schema = type_schema(
         'set-public-block',
         state={'type': 'boolean', 'default': True},
@@ -1576,6 +1822,8 @@ class ToggleVersioning(BucketActionBase):
                     enabled: true
     """
 
+    augment_keys = ('Versioning',)
+
     schema = type_schema(
         'toggle-versioning',
         enabled={'type': 'boolean'})
@@ -1645,6 +1893,9 @@ class ToggleLogging(BucketActionBase):
                     target_bucket: "{account_id}-{region}-s3-logs"
                     target_prefix: "{account}/{source_bucket_name}/"
     """
+
+    augment_keys = ('Logging',)
+
     schema = type_schema(
         'toggle-logging',
         enabled={'type': 'boolean'},
@@ -1725,6 +1976,9 @@ class AttachLambdaEncrypt(BucketActionBase):
                         role: arn:aws:iam::123456789012:role/my-role
 
     """
+
+    augment_keys = ('Notification',)
+
     schema = type_schema(
         'attach-encrypt',
         role={'type': 'string'},
@@ -1830,6 +2084,8 @@ class EncryptionRequiredPolicy(BucketActionBase):
                   - encryption-policy
     """
 
+    augment_keys = ('Policy',)
+
     permissions = ("s3:GetBucketPolicy", "s3:PutBucketPolicy")
     schema = type_schema('encryption-policy')
 
@@ -2120,6 +2376,8 @@ class EncryptExtantKeys(ScanBucket):
                     key-id: 9c3983be-c6cf-11e6-9d9d-cec0c932ce01
     """
 
+    augment_keys = ('Versioning',)
+
     permissions = (
         "s3:GetObject",
         "s3:PutObject",
@@ -2372,6 +2630,8 @@ class LogTarget(Filter):
                   - type: is-log-target
     """
 
+    augment_keys = ('Logging',)
+
     schema = type_schema(
         'is-log-target',
         services={'type': 'array', 'items': {'enum': [
@@ -2478,6 +2738,8 @@ def _query_elb_attrs(session_factory, elb_set):
 class RemoveWebsiteHosting(BucketActionBase):
     """Action that removes website hosting configuration."""
 
+    augment_keys = ()
+
     schema = type_schema('remove-website-hosting')
 
     permissions = ('s3:DeleteBucketWebsite',)
@@ -2506,6 +2768,8 @@ class DeleteGlobalGrants(BucketActionBase):
                   - delete-global-grants
     """
 
+    augment_keys = ('Acl', 'Website')
+
     schema = type_schema(
         'delete-global-grants',
         grantees={'type': 'array', 'items': {'type': 'string'}})
@@ -2578,6 +2842,8 @@ class BucketTag(Tag):
                     value: us-east-1
     """
 
+    augment_keys = ('Tags',)
+
     def process_resource_set(self, client, resource_set, tags):
         modify_bucket_tags(self.manager.session_factory, resource_set, tags)
 
@@ -2603,6 +2869,8 @@ class MarkBucketForOp(TagDelayedAction):
                     days: 7
     """
 
+    augment_keys = ('Tags',)
+
     schema = type_schema(
         'mark-for-op', rinherit=TagDelayedAction.schema)
 
@@ -2626,6 +2894,8 @@ class RemoveBucketTag(RemoveTag):
                     tags: ['BucketOwner']
     """
 
+    augment_keys = ('Tags',)
+
     def process_resource_set(self, client, resource_set, tags):
         modify_bucket_tags(
             self.manager.session_factory, resource_set, remove_tags=tags)
@@ -2639,6 +2909,8 @@ class DataEvents(Filter):
     current account.
     """
 
+    augment_keys = ()
+
     schema = type_schema('data-events', state={'enum': ['present', 'absent']})
     permissions = (
         'cloudtrail:DescribeTrails',
@@ -2693,6 +2965,9 @@ class DataEvents(Filter):
 @filters.register('inventory')
 class Inventory(ValueFilter):
     """Filter inventories for a bucket"""
+
+    augment_keys = ()
+
     schema = type_schema('inventory', rinherit=ValueFilter.schema)
     schema_alias = False
     permissions = ('s3:GetInventoryConfiguration',)
@@ -2732,6 +3007,9 @@ class Inventory(ValueFilter):
 class SetInventory(BucketActionBase):
     """Configure bucket inventories for an s3 bucket.
     """
+
+    augment_keys = ()
+
     schema = type_schema(
         'set-inventory',
         required=['name', 'destination'],
@@ -2872,6 +3150,9 @@ class IntelligentTiering(ListItemFilter):
                           - AccessTier: ARCHIVE_ACCESS
 
     """
+
+    augment_keys = ()
+
     schema = type_schema(
         'intelligent-tiering',
         attrs={'$ref': '#/definitions/filters_common/list_item_attrs'},
@@ -2980,6 +3261,8 @@ class ConfigureIntelligentTiering(BucketActionBase):
 
     """
 
+    augment_keys = ()
+
     annotation_key = 'c7n:ListItemMatches'
     shape = 'PutBucketIntelligentTieringConfigurationRequest'
     schema = {
@@ -3094,6 +3377,8 @@ class DeleteBucket(ScanBucket):
                     remove-contents: true
     """
 
+    augment_keys = ('Replication', 'Versioning')
+
     schema = type_schema('delete', **{'remove-contents': {'type': 'boolean'}})
 
     permissions = ('s3:*',)
@@ -3229,6 +3514,8 @@ class Lifecycle(BucketActionBase):
 
     """
 
+    augment_keys = ('Lifecycle',)
+
     schema = type_schema(
         'configure-lifecycle',
         **{
@@ -3488,6 +3775,9 @@ class BucketEncryption(KMSKeyResolverMixin, Filter):
                   - type: bucket-encryption
                     bucket_key_enabled: True
     """
+
+    augment_keys = ()
+
     schema = type_schema('bucket-encryption',
                          state={'type': 'boolean'},
                          crypto={'type': 'string', 'enum': ['AES256', 'aws:kms']},
@@ -3651,6 +3941,8 @@ class SetBucketEncryption(KMSKeyResolverMixin, BucketActionBase):
                     enabled: false
     """
 
+    augment_keys = ()
+
     schema = {
         'type': 'object',
         'additionalProperties': False,
@@ -3774,6 +4066,9 @@ class BucketOwnershipControls(BucketFilterBase, ValueFilter):
                   - type: ownership
                     value: empty
     """
+
+    augment_keys = ()
+
     schema = type_schema('ownership', rinherit=ValueFilter.schema, value={'oneOf': [
         {'type': 'string', 'enum': OWNERSHIP_CONTROLS + VALUE_FILTER_MAGIC_VALUES},
         {'type': 'array', 'items': {
@@ -3841,6 +4136,9 @@ class BucketReplication(ListItemFilter):
                       - ExistingObjectReplication: Enabled
 
     """
+
+    augment_keys = ('Replication',)
+
     schema = type_schema(
         'bucket-replication',
         attrs={'$ref': '#/definitions/filters_common/list_item_attrs'},
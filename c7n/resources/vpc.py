@@ -941,9 +941,33 @@ class SecurityGroupPatch:
                        IpPermissions=[r for r in delta['added']])
 
 
+class SGUsageGraph:
+    """Security groups of an account and region with their referencing resources.
+
+    References are recorded by kind (scanner) as the ids of the
+    referencing resources. Groups checked for references across peered
+    vpcs are recorded with whether they had any.
+    """
+
+    def __init__(self):
+        self.refs = {}
+        self.nic_attributes = {}
+        self.peered = {}
+
+    def add(self, kind, refs):
+        for group_id, resource_ids in refs.items():
+            self.refs.setdefault(group_id, {}).setdefault(kind, []).extend(
+                sorted(resource_ids))
+
+    @property
+    def used(self):
+        return set(self.refs)
+
+
 class SGUsage(Filter):
 
     nics = ()
+    references_key = 'c7n:UsedBy'
 
     def get_permissions(self):
         return list(itertools.chain(
@@ -952,17 +976,21 @@ class SGUsage(Filter):
              ['lambda', 'eni', 'launch-config', 'security-group', 'event-rule-target',
               'aws.batch-compute']]))
 
-    def filter_peered_refs(self, resources):
+    def filter_peered_refs(self, resources, graph=None):
         if not resources:
             return resources
-        # Check that groups are not referenced across accounts
-        client = local_session(self.manager.session_factory).client('ec2')
-        peered_ids = set()
-        for resource_set in chunks(resources, 200):
-            for sg_ref in client.describe_security_group_references(
-                    GroupId=[r['GroupId'] for r in resource_set]
-            )['SecurityGroupReferenceSet']:
-                peered_ids.add(sg_ref['GroupId'])
+        graph = graph or SGUsageGraph()
+        unchecked = [r['GroupId'] for r in resources if r['GroupId'] not in graph.peered]
+        if unchecked:
+            # Check that groups are not referenced across accounts
+            client = local_session(self.manager.session_factory).client('ec2')
+            graph.peered.update({gid: False for gid in unchecked})
+            for group_ids in chunks(unchecked, 200):
+                for sg_ref in client.describe_security_group_references(
+                        GroupId=group_ids)['SecurityGroupReferenceSet']:
+                    graph.peered[sg_ref['GroupId']] = True
+            self.save_usage_graph(graph)
+        peered_ids = {r['GroupId'] for r in resources if graph.peered[r['GroupId']]}
         self.log.debug(
             "%d of %d groups w/ peered refs", len(peered_ids), len(resources))
         return [r for r in resources if r['GroupId'] not in peered_ids]
@@ -978,78 +1006,131 @@ class SGUsage(Filter):
             ("batch", self.get_batch_sgs),
         )
 
-    def scan_groups(self):
-        used = set()
-        for kind, scanner in self.get_scanners():
-            sg_ids = scanner()
-            new_refs = sg_ids.difference(used)
-            used = used.union(sg_ids)
+    def get_usage_graph_key(self):
+        return {
+            'account': self.manager.config.account_id,
+            'region': self.manager.config.region,
+            'resource': SGUsageGraph.__name__,
+            'source': self.manager.source_type,
+            'q': [kind for kind, _ in self.get_scanners()],
+        }
+
+    def get_usage_graph(self):
+        """Return the usage graph, built once per cache period.
+
+        The graph is held in the resource cache so it's shared by the
+        usage filters of every policy in a run.
+        """
+        key = self.get_usage_graph_key()
+        with self.manager._cache:
+            graph = self.manager._cache.get(key)
+            if graph is None:
+                graph = self.scan_usage_graph()
+                self.manager._cache.save(key, graph)
+        return graph
+
+    def save_usage_graph(self, graph):
+        with self.manager._cache:
+            self.manager._cache.save(self.get_usage_graph_key(), graph)
+
+    def scan_usage_graph(self):
+        graph = SGUsageGraph()
+        scanners = self.get_scanners()
+        with self.manager.executor_factory(max_workers=len(scanners)) as w:
+            results = list(w.map(lambda scanner: scanner[1](), scanners))
+        for (kind, _), refs in zip(scanners, results):
+            new_refs = set(refs).difference(graph.refs)
+            graph.add(kind, refs)
             self.log.debug(
                 "%s using %d sgs, new refs %s total %s",
-                kind, len(sg_ids), len(new_refs), len(used))
+                kind, len(refs), len(new_refs), len(graph.refs))
+        graph.nic_attributes = self._get_eni_attributes()
+        return graph
+
+    def scan_groups(self):
+        return self.get_usage_graph().used
+
+    def _get_eni_attributes(self):
+        group_enis = {}
+        for nic in self.nics:
+            instance_owner_id, interface_resource_type = '', ''
+            if nic['Status'] == 'in-use':
+                if nic.get('Attachment') and 'InstanceOwnerId' in nic['Attachment']:
+                    instance_owner_id = nic['Attachment']['InstanceOwnerId']
+                interface_resource_type = get_eni_resource_type(nic)
+            interface_type = nic.get('InterfaceType')
+            for g in nic['Groups']:
+                group_enis.setdefault(g['GroupId'], []).append({
+                    'InstanceOwnerId': instance_owner_id,
+                    'InterfaceType': interface_type,
+                    'InterfaceResourceType': interface_resource_type
+                })
+        return group_enis
 
-        return used
+    # Scanners return a map of group id to the ids of resources referencing it.
 
     def get_launch_config_sgs(self):
         # Note assuming we also have launch config garbage collection
         # enabled.
-        sg_ids = set()
+        sg_ids = {}
         for cfg in self.manager.get_resource_manager('launch-config').resources():
-            for g in cfg['SecurityGroups']:
-                sg_ids.add(g)
-            for g in cfg['ClassicLinkVPCSecurityGroups']:
-                sg_ids.add(g)
+            for g in cfg['SecurityGroups'] + cfg['ClassicLinkVPCSecurityGroups']:
+                sg_ids.setdefault(g, set()).add(cfg['LaunchConfigurationName'])
         return sg_ids
 
     def get_lambda_sgs(self):
-        sg_ids = set()
+        sg_ids = {}
         for func in self.manager.get_resource_manager('lambda').resources(augment=False):
             if 'VpcConfig' not in func:
                 continue
             for g in func['VpcConfig']['SecurityGroupIds']:
-                sg_ids.add(g)
+                sg_ids.setdefault(g, set()).add(func['FunctionName'])
         return sg_ids
 
     def get_eni_sgs(self):
-        sg_ids = set()
+        sg_ids = {}
         self.nics = self.manager.get_resource_manager('eni').resources()
         for nic in self.nics:
             for g in nic['Groups']:
-                sg_ids.add(g['GroupId'])
+                sg_ids.setdefault(g['GroupId'], set()).add(nic['NetworkInterfaceId'])
         return sg_ids
 
     def get_codebuild_sgs(self):
-        sg_ids = set()
+        sg_ids = {}
         for cb in self.manager.get_resource_manager('codebuild').resources():
-            sg_ids |= set(cb.get('vpcConfig', {}).get('securityGroupIds', []))
+            for g in cb.get('vpcConfig', {}).get('securityGroupIds', []):
+                sg_ids.setdefault(g, set()).add(cb['name'])
         return sg_ids
 
     def get_sg_refs(self):
-        sg_ids = set()
+        sg_ids = {}
         for sg in self.manager.get_resource_manager('security-group').resources():
             for perm_type in ('IpPermissions', 'IpPermissionsEgress'):
                 for p in sg.get(perm_type, []):
                     for g in p.get('UserIdGroupPairs', ()):
                         # self references aren't usage.
                         if g['GroupId'] != sg['GroupId']:
-                            sg_ids.add(g['GroupId'])
+                            sg_ids.setdefault(g['GroupId'], set()).add(sg['GroupId'])
         return sg_ids
 
     def get_ecs_cwe_sgs(self):
-        sg_ids = set()
+        sg_ids = {}
         expr = jmespath_compile(
             'EcsParameters.NetworkConfiguration.awsvpcConfiguration.SecurityGroups[]')
         for rule in self.manager.get_resource_manager(
                 'event-rule-target').resources(augment=False):
-            ids = expr.search(rule)
-            if ids:
-                sg_ids.update(ids)
+            for g in expr.search(rule) or ():
+                sg_ids.setdefault(g, set()).add(rule['Id'])
         return sg_ids
 
     def get_batch_sgs(self):
-        expr = jmespath_compile('[].computeResources.securityGroupIds[]')
-        resources = self.manager.get_resource_manager('aws.batch-compute').resources(augment=False)
-        return set(expr.search(resources) or [])
+        sg_ids = {}
+        expr = jmespath_compile('computeResources.securityGroupIds[]')
+        for env in self.manager.get_resource_manager(
+                'aws.batch-compute').resources(augment=False):
+            for g in expr.search(env) or ():
+                sg_ids.setdefault(g, set()).add(env['computeEnvironmentName'])
+        return sg_ids
 
 
 @SecurityGroup.filter_registry.register('unused')
@@ -1082,11 +1163,11 @@ class UnusedSecurityGroup(SGUsage):
     schema = type_schema('unused')
 
     def process(self, resources, event=None):
-        used = self.scan_groups()
+        graph = self.get_usage_graph()
         unused = [
             r for r in resources
-            if r['GroupId'] not in used and 'VpcId' in r]
-        return unused and self.filter_peered_refs(unused) or []
+            if r['GroupId'] not in graph.refs and 'VpcId' in r]
+        return unused and self.filter_peered_refs(unused, graph) or []
 
 
 @SecurityGroup.filter_registry.register('used')
@@ -1095,6 +1176,9 @@ class UsedSecurityGroup(SGUsage):
     This operates as a complement to the unused filter for multi-step
     workflows.
 
+    Groups are annotated with the resources referencing them by kind
+    under ``c7n:UsedBy``.
+
     :example:
 
     .. code-block:: yaml
@@ -1144,30 +1228,13 @@ class UsedSecurityGroup(SGUsage):
     interface_type_key = 'c7n:InterfaceTypes'
     interface_resource_type_key = 'c7n:InterfaceResourceTypes'
 
-    def _get_eni_attributes(self):
-        group_enis = {}
-        for nic in self.nics:
-            instance_owner_id, interface_resource_type = '', ''
-            if nic['Status'] == 'in-use':
-                if nic.get('Attachment') and 'InstanceOwnerId' in nic['Attachment']:
-                    instance_owner_id = nic['Attachment']['InstanceOwnerId']
-                interface_resource_type = get_eni_resource_type(nic)
-            interface_type = nic.get('InterfaceType')
-            for g in nic['Groups']:
-                group_enis.setdefault(g['GroupId'], []).append({
-                    'InstanceOwnerId': instance_owner_id,
-                    'InterfaceType': interface_type,
-                    'InterfaceResourceType': interface_resource_type
-                })
-        return group_enis
-
     def process(self, resources, event=None):
-        used = self.scan_groups()
+        graph = self.get_usage_graph()
         unused = [
             r for r in resources
-            if r['GroupId'] not in used and 'VpcId' in r]
-        unused = {g['GroupId'] for g in self.filter_peered_refs(unused)}
-        group_enis = self._get_eni_attributes()
+            if r['GroupId'] not in graph.refs and 'VpcId' in r]
+        unused = {g['GroupId'] for g in self.filter_peered_refs(unused, graph)}
+        group_enis = graph.nic_attributes
         for r in resources:
             enis = group_enis.get(r['GroupId'], ())
             r[self.instance_owner_id_key] = list({
@@ -1176,6 +1243,9 @@ class UsedSecurityGroup(SGUsage):
                 i['InterfaceType'] for i in enis if i['InterfaceType']})
             r[self.interface_resource_type_key] = list({
                 i['InterfaceResourceType'] for i in enis if i['InterfaceResourceType']})
+            # the graph may be shared with other policies, annotate a copy.
+            r[self.references_key] = {
+                kind: list(ids) for kind, ids in graph.refs.get(r['GroupId'], {}).items()}
         return [r for r in resources if r['GroupId'] not in unused]
 
 
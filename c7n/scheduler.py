@@ -0,0 +1,145 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+"""Concurrent policy execution.
+
+The unit of scheduling is a fetch planner group, the policies sharing a
+resource population (and so a region) execute serially on one worker,
+and groups execute concurrently. Workers prefer groups in the region
+they last executed in, so their thread local sessions and clients are
+reused.
+
+Log output of each group is buffered and emitted in plan order as groups
+complete, so the output of concurrent policies isn't interleaved.
+"""
+from collections import Counter, OrderedDict, deque
+import contextvars
+import logging
+import threading
+
+from c7n.executor import ThreadPoolExecutor
+
+
+log = logging.getLogger('custodian.scheduler')
+
+# Log records of the group executing in the current context
+LOG_BUFFER = contextvars.ContextVar('c7n_log_buffer', default=None)
+
+
+class OrderedLogHandler(logging.Handler):
+    """Buffer log records by the policy group which emitted them.
+
+    The buffer propagates to the group's executor threads along with the
+    context, records emitted outside of a group are passed through to the
+    target handlers.
+    """
+
+    def __init__(self, targets):
+        super().__init__()
+        self.targets = targets
+
+    def capture(self):
+        LOG_BUFFER.set([])
+
+    def release(self):
+        records = LOG_BUFFER.get() or []
+        LOG_BUFFER.set(None)
+        return records
+
+    def handle(self, record):
+        records = LOG_BUFFER.get()
+        if records is not None:
+            records.append(record)
+        else:
+            self.forward([record])
+        return True
+
+    def forward(self, records):
+        for r in records:
+            for h in self.targets:
+                if r.levelno >= h.level:
+                    h.handle(r)
+
+
+class PolicyScheduler:
+    """Execute a fetch planner's policy groups on a pool of workers."""
+
+    executor_factory = ThreadPoolExecutor
+
+    def __init__(self, planner, workers):
+        self.planner = planner
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.units = []
+        self.queues = OrderedDict()
+        self.active = Counter()
+        self.completed = {}
+        self.next_flush = 0
+        self.log_handler = None
+
+    @staticmethod
+    def get_region(policy):
+        return policy.options.get('region') or ''
+
+    def next_unit(self, region):
+        """Return the (region, unit index) to execute next, or (None, None)."""
+        with self.lock:
+            if not self.queues.get(region):
+                if region is not None:
+                    self.active[region] -= 1
+                pending = [r for r, q in self.queues.items() if q]
+                if not pending:
+                    return None, None
+                # spread workers across regions, favoring regions with the
+                # most remaining work.
+                region = min(pending, key=lambda r: (self.active[r], -len(self.queues[r])))
+                self.active[region] += 1
+            return region, self.queues[region].popleft()
+
+    def complete(self, idx, records):
+        with self.lock:
+            self.completed[idx] = records
+            while self.next_flush in self.completed:
+                self.log_handler.forward(self.completed.pop(self.next_flush))
+                self.next_flush += 1
+
+    def work(self, execute):
+        region = None
+        while True:
+            region, idx = self.next_unit(region)
+            if idx is None:
+                return
+            key, policies = self.units[idx]
+            self.log_handler.capture()
+            try:
+                for p in policies:
+                    execute(p)
+            finally:
+                self.planner.release(key)
+                self.complete(idx, self.log_handler.release())
+
+    def run(self, execute):
+        """Execute each policy with the given callable."""
+        self.units = self.planner.plan()
+        if not self.units:
+            return
+        for idx, (key, policies) in enumerate(self.units):
+            self.queues.setdefault(self.get_region(policies[0]), deque()).append(idx)
+        workers = min(self.workers, len(self.units))
+        log.debug(
+            "scheduling policies:%d groups:%d regions:%d workers:%d",
+            len(self.planner.policies), len(self.units), len(self.queues), workers)
+
+        root = logging.getLogger()
+        targets = list(root.handlers)
+        self.log_handler = OrderedLogHandler(targets)
+        root.handlers = [self.log_handler]
+        try:
+            with self.executor_factory(max_workers=workers) as w:
+                futures = [w.submit(self.work, execute) for i in range(workers)]
+                for f in futures:
+                    f.result()
+        finally:
+            root.handlers = targets
+            # emit the output of any groups which didn't complete in order
+            for idx in sorted(self.completed):
+                self.log_handler.forward(self.completed.pop(idx))
@@ -323,6 +323,7 @@ def get_default_definitions(resource_defs):
                 'metadata': {'type': 'object'},
                 'mode': {'$ref': '#/definitions/policy-mode'},
                 'source': {'enum': list(sources.keys())},
+                'stream': {'type': 'boolean'},
                 'actions': {
                     'type': 'array',
                 },
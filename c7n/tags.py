@@ -15,18 +15,25 @@ from datetime import datetime, timedelta
 from dateutil import tz as tzutil
 from dateutil.parser import parse
 
+import re
 import time
 
+from botocore.exceptions import ClientError
+
 from c7n.manager import resources as aws_resources
 from c7n.actions import BaseAction as Action, AutoTagUser
 from c7n.exceptions import PolicyValidationError, PolicyExecutionError
 from c7n.resources import load_resources
 from c7n.filters import Filter, OPERATORS
 from c7n.filters.offhours import Time
-from c7n import deprecated, utils
+from c7n import deprecated, ratelimit, utils
 
 DEFAULT_TAG = "maid_status"
 
+# Minimum number of resources whose tags are fetched with a sweep of
+# their resource type, see universal_augment.
+TAG_SWEEP_THRESHOLD = 500
+
 
 def register_ec2_tags(filters, actions):
     filters.register('marked-for-op', TagActionFilter)
@@ -77,25 +84,81 @@ def universal_augment(self, resources):
     client = utils.local_session(
         self.session_factory).client('resourcegroupstaggingapi', region_name=region)
 
+    rfetch = [r for r in resources if 'Tags' not in r]
+    if not rfetch:
+        return resources
+
+    arn_resource_map = dict(zip(self.get_arns(rfetch), rfetch))
+    resource_tag_map = None
+    # large populations are typically most of the resource type, sweep the
+    # type's tags instead of looking up each resource's.
+    if len(arn_resource_map) >= TAG_SWEEP_THRESHOLD:
+        try:
+            resource_tag_map = sweep_resource_tags(client, arn_resource_map)
+        except ClientError as e:
+            self.log.warning("Unable to sweep resource tags, error:%s", e)
+    if not resource_tag_map:
+        resource_tag_map = get_resource_tags(self, client, list(arn_resource_map))
+
+    for arn, r in arn_resource_map.items():
+        r['Tags'] = resource_tag_map.get(arn, [])
+    return resources
+
+
+def get_resource_type_filters(arns):
+    """Return tagging api resource type filters matching the given arns."""
+    filters = set()
+    for arn in arns:
+        parts = arn.split(':', 5)
+        if len(parts) < 6:
+            return None
+        rtype = re.split('[/:]', parts[5], 1)
+        if len(rtype) > 1 and not rtype[0]:
+            # path style arns (ie. apigateway) don't name their resource type
+            return None
+        filters.add(len(rtype) > 1 and '%s:%s' % (parts[2], rtype[0]) or parts[2])
+    if len(filters) > 100:
+        return None
+    return sorted(filters)
+
+
+def sweep_resource_tags(client, arns):
+    """Return a map of arn to tags for arns from a sweep of their types.
+
+    An empty map is returned if the sweep matched none of the arns,
+    as the resource types filtered may not correspond to the arns.
+    """
+    filters = get_resource_type_filters(arns)
+    if not filters:
+        return {}
+
     # Lazy for non circular :-(
     from c7n.query import RetryPageIterator
     paginator = client.get_paginator('get_resources')
     paginator.PAGE_ITERATOR_CLS = RetryPageIterator
 
-    rfetch = [r for r in resources if 'Tags' not in r]
+    resource_tag_map = {}
+    for page in paginator.paginate(ResourceTypeFilters=filters, ResourcesPerPage=100):
+        for r in page.get('ResourceTagMappingList', ()):
+            if r['ResourceARN'] in arns:
+                resource_tag_map[r['ResourceARN']] = r['Tags']
+    return resource_tag_map
 
-    for arn_resource_set in utils.chunks(
-            zip(self.get_arns(rfetch), rfetch), 100):
-        arn_resource_map = dict(arn_resource_set)
-        resource_tag_results = client.get_resources(
-            ResourceARNList=list(arn_resource_map.keys())).get(
-                'ResourceTagMappingList', ())
-        resource_tag_map = {
-            r['ResourceARN']: r['Tags'] for r in resource_tag_results}
-        for arn, r in arn_resource_map.items():
-            r['Tags'] = resource_tag_map.get(arn, [])
 
-    return resources
+def get_resource_tags(manager, client, arns):
+    """Return a map of arn to tags, looking up arns concurrently."""
+
+    def get_tags(arn_set):
+        return client.get_resources(ResourceARNList=arn_set).get(
+            'ResourceTagMappingList', ())
+
+    resource_tag_map = {}
+    max_workers = ratelimit.get_workers(
+        3, 'resourcegroupstaggingapi', client.meta.region_name)
+    with manager.executor_factory(max_workers=max_workers) as w:
+        for results in w.map(get_tags, utils.chunks(arns, 100)):
+            resource_tag_map.update({r['ResourceARN']: r['Tags'] for r in results})
+    return resource_tag_map
 
 
 def _common_tag_processer(executor_factory, batch_size, concurrency, client,
@@ -103,6 +166,8 @@ def _common_tag_processer(executor_factory, batch_size, concurrency, client,
                           log):
 
     error = None
+    concurrency = ratelimit.get_workers(
+        concurrency, client.meta.service_model.service_name, client.meta.region_name)
     with executor_factory(max_workers=concurrency) as w:
         futures = []
         for resource_set in utils.chunks(resources, size=batch_size):
@@ -282,6 +347,9 @@ class TagActionFilter(Filter):
                     self.data.get('tz'), self.manager.data))
         return self
 
+    def is_streamable(self):
+        return True
+
     def __call__(self, i):
         tag = self.data.get('tag', DEFAULT_TAG)
         op = self.data.get('op', 'stop')
@@ -346,6 +414,9 @@ class TagCountFilter(Filter):
         op={'enum': list(OPERATORS.keys())})
     schema_alias = True
 
+    def is_streamable(self):
+        return True
+
     def __call__(self, i):
         count = self.data.get('count', 10)
         op_name = self.data.get('op', 'gte')
@@ -9,6 +9,9 @@ import sys
 from urllib.error import URLError, HTTPError
 from unittest.mock import Mock, patch
 
+from boto3 import Session
+from botocore.stub import Stubber
+
 from c7n.config import Bag, Config
 from c7n.exceptions import PolicyValidationError, InvalidOutputConfig
 from c7n.resources import aws, load_resources
@@ -294,6 +297,30 @@ class TracerTest(BaseTest):
             self.assertNotEqual(w.cause, {})
 
 
+class ApiStatsTest(BaseTest):
+
+    def test_api_stats_trace_calls(self):
+        tracer = output.LocalTracer(Bag(), {})
+        stats = aws.ApiStats(Bag(tracer=tracer, session_factory=None))
+        stats.trace_call = tracer.record_api_call
+        session = Session(region_name='us-east-1')
+        stats(session)
+        client = session.client(
+            'sqs', aws_access_key_id='foo', aws_secret_access_key='bar')
+        stubber = Stubber(client)
+        stubber.add_response('list_queues', {
+            'QueueUrls': [],
+            'ResponseMetadata': {
+                'RetryAttempts': 2, 'HTTPHeaders': {'content-length': '42'}}})
+        with stubber:
+            with tracer.subsegment('resource-fetch') as segment:
+                client.list_queues()
+        self.assertEqual(stats.api_calls, {'sqs.ListQueues': 1})
+        calls, latency, retries, size = segment.api_calls['sqs.ListQueues']
+        self.assertEqual((calls, retries, size), (1, 2, 42))
+        self.assertGreater(latency, 0)
+
+
 class OutputMetricsTest(BaseTest):
 
     def test_metrics_destination_dims(self):
@@ -324,6 +351,44 @@ class OutputMetricsTest(BaseTest):
             'Unit': 'Count',
             'Value': 400}])
 
+    def test_metrics_aggregated(self):
+        tmetrics = []
+
+        class Metrics(aws.MetricsOutput):
+
+            def _put_metrics(self, ns, metrics):
+                tmetrics.append(aws.aggregate_metric_data(metrics))
+
+        ctx = Bag(session_factory=None,
+                  options=Bag(account_id='001100', region='us-east-1'),
+                  policy=Bag(name='test', resource_type='ec2'))
+        moutput = Metrics(ctx, Bag({'scheme': 'aws'}))
+        moutput.BUFFER_SIZE = 5
+        for i in range(6):
+            moutput.put_metric('ActionTime', i % 2, 'Seconds', Action='tag')
+        # a full buffer is sent in the background
+        self.assertEqual(len(moutput.buf), 1)
+        moutput.put_metric('ResourceCount', 3, 'Count')
+        moutput.flush()
+        self.assertIsNone(moutput.publisher)
+
+        self.assertEqual(len(tmetrics), 2)
+        self.assertEqual(
+            [(m['MetricName'], m.get('Values'), m.get('Counts'), m.get('Value'))
+             for m in tmetrics[0]],
+            [('ActionTime', [0, 1], [3, 2], None)])
+        self.assertEqual(
+            [(m['MetricName'], m.get('Value')) for m in tmetrics[1]],
+            [('ActionTime', 1), ('ResourceCount', 3)])
+
+        self.patch(aws, 'MAX_METRIC_VALUES', 2)
+        ts = tmetrics[0][0]['Timestamp']
+        datums = aws.aggregate_metric_data([
+            {'MetricName': 'Size', 'Unit': 'Bytes', 'Value': v, 'Timestamp': ts,
+             'Dimensions': []} for v in (5, 1, 3)])
+        self.assertEqual(datums[0]['StatisticValues'], {
+            'SampleCount': 3, 'Sum': 9, 'Minimum': 1, 'Maximum': 5})
+
     def test_metrics(self):
         session_factory = self.replay_flight_data('output-aws-metrics')
         policy = Bag(name='test', resource_type='ec2')
@@ -99,3 +99,91 @@ def test_sqlkv_convert(tmp_path):
     kv.close()
     with open(cache_path, 'rb') as fh:
         assert fh.read(15) == b"SQLite format 3"
+
+
+def test_sqlkv_compressed_stats(tmp_path):
+    kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    k1 = {"account": "123456789012", "region": "us-east-1", "resource": "ec2"}
+    v1 = [{'InstanceId': 'i-%d' % i, 'State': {'Name': 'running'}} for i in range(100)]
+    assert kv.get(k1) is None
+    kv.save(k1, v1)
+    assert kv.get(k1) == v1
+    assert kv.size() < len(pickle.dumps(v1)) / 5
+    stats = kv.get_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['bytes_read'] == stats['bytes_written'] == kv.size()
+    assert kv.conn.execute('pragma journal_mode').fetchone()[0] == 'wal'
+    kv.close()
+
+
+def test_sqlkv_invalidate(tmp_path):
+    kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    keys = [{"account": account, "region": region, "resource": "ec2"}
+            for account in ("111", "222") for region in ("us-east-1", "us-west-2")]
+    for k in keys:
+        kv.save(k, [k])
+    assert kv.invalidate(account="111", region="us-west-2") == 1
+    assert kv.invalidate(account="222") == 2
+    assert [kv.get(k) for k in keys] == [[keys[0]], None, None, None]
+    kv.close()
+
+
+def test_sqlkv_evict_lru(tmp_path):
+    kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    keys = [{"resource": str(i)} for i in range(3)]
+    values = [os.urandom(1024) for k in keys]
+    kv.save(keys[0], values[0], datetime.utcnow())
+    kv.save(keys[1], values[1], datetime.utcnow())
+    # reading marks the first entry as recently used
+    assert kv.get(keys[0]) == values[0]
+    kv.cache_size = kv.size() + 100
+    kv.save(keys[2], values[2])
+    assert [kv.get(k) is not None for k in keys] == [True, False, True]
+    kv.close()
+
+
+def test_sqlkv_evict_checks(tmp_path):
+    kv = cache.SqlKvCache(config.Bag(cache=tmp_path / "cache.db", cache_period=60))
+    kv.load()
+    checks = []
+    kv.conn.set_trace_callback(
+        lambda statement: 'sum(size)' in statement and checks.append(statement))
+    for i in range(5):
+        kv.save({"resource": str(i)}, os.urandom(1024))
+    # the total is only summed once, and again when saves could exceed it
+    assert len(checks) == 1
+    kv.cache_size = kv.size() + 1536
+    checks.clear()
+    kv.save({"resource": "5"}, os.urandom(1024))
+    assert checks == []
+    kv.save({"resource": "6"}, os.urandom(1024))
+    assert len(checks) == 1
+    assert kv.size() <= kv.cache_size
+    kv.close()
+
+
+def test_sqlkv_migrate(tmp_path):
+    cache_path = tmp_path / "cache.db"
+    conn = sqlite3.connect(cache_path)
+    conn.execute("create table c7n_cache (key blob primary key, value blob, "
+                 "create_date timestamp)")
+    conn.execute("insert into c7n_cache values (?, ?, ?)",
+                 (b'k', b'v', datetime.utcnow()))
+    conn.commit()
+    conn.close()
+
+    kv = cache.SqlKvCache(config.Bag(cache=cache_path, cache_period=60, cache_size=1))
+    assert kv.cache_size == 1024 * 1024
+    kv.load()
+    assert kv.conn.execute('pragma user_version').fetchone()[0] == kv.version
+    assert kv.size() == 0
+    kv.save({"resource": "ec2"}, [])
+    kv.close()
+
+    # reopening an up to date cache keeps its entries
+    kv.load()
+    assert kv.get({"resource": "ec2"}) == []
+    kv.close()
@@ -591,6 +591,30 @@ class RunTest(CliTest):
             ["custodian", "run", "-s", temp_dir, "--debug", yaml_file], CustomError
         )
 
+    def test_parallel_error(self):
+        from c7n.policy import Policy
+
+        called = []
+
+        def execute(p):
+            called.append(p.name)
+            if p.name == "error":
+                raise Exception("foobar")
+
+        self.patch(Policy, "__call__", execute)
+        temp_dir = self.get_temp_dir()
+        yaml_file = self.write_policy_file(
+            {
+                "policies": [
+                    {"name": "error", "resource": "ec2"},
+                    {"name": "ok", "resource": "sqs"},
+                ]
+            }
+        )
+        self.run_and_expect_failure(
+            ["custodian", "run", "-s", temp_dir, "--parallel", "2", yaml_file], 2)
+        self.assertEqual(sorted(called), ["error", "ok"])
+
     def test_session_policy(self):
         parser = argparse.ArgumentParser()
         parser.add_argument('--session-policy', action=LoadSessionPolicyJson)
@@ -156,3 +156,58 @@ def test_load_dir_rglob(tmpdir, test):
         }
     )
     assert sorted(p.run()) == ["a", "b", "c", "d", "e", "f"]
+
+
+def test_columnar_filters(test):
+    np = pytest.importorskip("numpy")
+    from c7n.filters import columnar
+
+    records = []
+    for idx in range(1200):
+        records.append({
+            "name": "app-%d" % idx,
+            "size": idx % 7 or None,
+            "env": ("prod", "dev", None, ["qa"])[idx % 4],
+            "created": "2020-%02d-01T00:00:00+00:00" % (idx % 12 + 1),
+            "big": 2 ** 60 if idx % 100 == 0 else idx,
+            "Tags": [{"Key": "team", "Value": "a" if idx % 3 else "b"}]})
+
+    policy_filters = [
+        {"type": "value", "key": "size", "value": 3, "op": "gte"},
+        {"or": [
+            {"env": "prod"},
+            {"type": "value", "key": "env", "value": ["dev", "qa"], "op": "not-in"},
+            {"not": [{"type": "value", "key": "name", "value": "app-1.*", "op": "regex"}]}]},
+        {"type": "value", "key": "created", "value": 30, "op": "gt", "value_type": "age"},
+        {"type": "value", "key": "big", "value": 100, "op": "gt"},
+        {"tag:team": "a"}]
+
+    def run(min_resources):
+        test.patch(columnar, "MIN_RESOURCES", min_resources)
+        p = test.load_policy({
+            "name": "columnar",
+            "resource": "c7n.data",
+            "source": "static",
+            "query": [{"records": json.loads(json.dumps(records))}],
+            "filters": policy_filters})
+        return p.run()
+
+    expected = run(len(records) + 1)
+    resources = run(len(records))
+    assert len(resources) == len(expected) > 0
+    assert resources == expected
+    assert np is columnar.np
+
+
+def test_columnar_evaluator_fallback(test):
+    pytest.importorskip("numpy")
+    from c7n.filters import columnar
+    from c7n.resources.ec2 import filters
+
+    resources = [{"Size": 10}, {"Size": "10"}, {"Size": [1]}, {}]
+    f = filters.factory({"type": "value", "key": "Size", "value": 5, "op": "gt"})
+    f.compile()
+    evaluator = columnar.ColumnarEvaluator(resources)
+    values, valid = evaluator.get_column(f, "number")
+    assert list(valid) == [True, False, False, True]
+    assert list(evaluator.value_mask(f)) == [f.match_resource(r) for r in resources]
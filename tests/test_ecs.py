@@ -574,6 +574,7 @@ class TestEcsTaskDefinition(BaseTest):
         )
         resources = p.run()
         self.assertEqual(len(resources), 1)
+        assert resources[0]['Tags'] == [{'Key': 'test', 'Value': 'name'}]
         assert resources[0]['containerDefinitions'] == [
             {'command': ['/bin/sh -c "echo \'<html> <head> '
                          '<title>Amazon ECS Sample App</title> '
@@ -18,7 +18,8 @@ from c7n.resources.elb import ELB
 from c7n.testing import mock_datetime_now
 from c7n.utils import annotation
 from .common import instance, event_data, Bag, BaseTest
-from c7n.filters.core import AnnotationSweeper, ValueRegex, parse_date as core_parse_date
+from c7n.filters.core import (
+    AnnotationSweeper, BooleanGroupFilter, ValueRegex, parse_date as core_parse_date)
 
 
 class BaseFilterTest(unittest.TestCase):
@@ -1040,6 +1041,89 @@ class TestNotInList(unittest.TestCase):
         self.assertEqual(f(instance(Thing="Foo")), False)
 
 
+class TestCompiledFilter(unittest.TestCase):
+
+    def outcome(self, fn, r):
+        try:
+            return fn(r)
+        except Exception as e:
+            return type(e)
+
+    def test_compiled_match(self):
+        resources = [
+            instance(Thing="Foo", Tags=[{"Key": "Env", "Value": " Prod "}]),
+            instance(Thing=["Foo"], Size="12", Cidr="10.0.0.0/16"),
+            instance(Thing=None, Version="1.10.2", Created="2020-01-01"),
+            instance(Nested={"Thing": "qux-1"})]
+        for data in (
+                {"Thing": "Foo"},
+                {"Thing": "absent"},
+                {"tag:Env": "present"},
+                {"type": "value", "key": "Thing", "value": ["Foo", "Bar"], "op": "in"},
+                {"type": "value", "key": "Thing", "value": ["Foo", "Bar"], "op": "not-in"},
+                {"type": "value", "key": "Nested.Thing", "value": "QUX-.*", "op": "regex"},
+                {"type": "value", "key": "Nested.Thing", "value": "QUX-.*",
+                 "op": "regex-case"},
+                {"type": "value", "key": "Nested.Thing", "value": "1",
+                 "value_regex": "qux-(\\d)"},
+                {"type": "value", "key": "tag:Env", "value": "prod",
+                 "value_type": "normalize"},
+                {"type": "value", "key": "Size", "value": 10, "op": "gt",
+                 "value_type": "integer"},
+                {"type": "value", "key": "Cidr", "value": 16, "value_type": "cidr_size"},
+                {"type": "value", "key": "Version", "value": "1.9", "op": "gt",
+                 "value_type": "version"},
+                {"type": "value", "key": "Created", "value": "2021-01-01", "op": "lt",
+                 "value_type": "date"},
+                {"type": "value", "key": "Created", "value": 30, "op": "gt",
+                 "value_type": "age"}):
+            f = filters.factory(data)
+            matcher = f.compile()
+            self.assertIsNotNone(matcher)
+            self.assertEqual(
+                [self.outcome(matcher, r) for r in resources],
+                [self.outcome(f.match_resource, r) for r in resources], data)
+
+    def test_compiled_group_annotations(self):
+        class Manager:
+
+            class resource_type:
+                id = 'InstanceId'
+
+            @classmethod
+            def get_model(cls):
+                return cls.resource_type
+
+        resources = [
+            instance(InstanceId="i-1", Color="green"),
+            instance(InstanceId="i-2", Color="blue", Shape="square"),
+            instance(InstanceId="i-3", Color="red")]
+        f = filters.factory({"or": [
+            {"Color": "green"},
+            {"and": [{"Color": "blue"}, {"Shape": "square"}]},
+            {"not": [{"Color": "red"}]}]})
+        f.manager = Manager()
+        self.assertTrue(f.get_matcher())
+        self.assertEqual(
+            [(r["InstanceId"], r.get(base_filters.ANNOTATION_KEY)) for r in f.process(resources)],
+            [("i-1", ["Color"]), ("i-2", ["Color", "Shape"])])
+
+    def test_not_compiled(self):
+        f = filters.factory({"type": "value", "key": "Color", "value_type": "resource_count",
+                             "op": "eq", "value": 1})
+        self.assertIsNone(f.compile())
+        f = filters.factory({"or": [{"Color": "green"}, f.data]})
+        self.assertIsNone(f.compile())
+
+    def test_group_not_compiled(self):
+        class Group(BooleanGroupFilter):
+            pass
+
+        f = Group({"group": [{"Color": "green"}]}, filters, None)
+        self.assertIsNone(f.compile())
+        self.assertFalse(f.get_matcher())
+
+
 class TestContains(unittest.TestCase):
 
     def test_contains(self):
@@ -1218,6 +1302,49 @@ class TestMetricsFilter(BaseTest):
             })
         self.assertIn('cannot exceed 455', str(err.exception))
 
+    def test_metric_data_shared_queries(self):
+        query_sets = []
+
+        def process_query_set(self, client, query_set):
+            query_sets.append(list(query_set))
+            return {q: [{'Timestamp': self.start + timedelta(days=i), q.statistic: i}
+                        for i in range(14)] for q in query_set}
+
+        self.patch(base_filters.metrics.MetricsFilter, 'process_query_set', process_query_set)
+        self.patch(base_filters.metrics, 'METRIC_DATA', {})
+
+        def load_filter(days):
+            p = self.load_policy({
+                "name": "sqs-metrics",
+                "resource": "sqs",
+                "filters": [{
+                    "type": "metrics",
+                    "name": "NumberOfMessagesSent",
+                    "statistics": "Sum",
+                    "days": days,
+                    "period": 86400,
+                    "value": 20,
+                    "op": "lt"}]})
+            return p.resource_manager.filters[0]
+
+        with mock_datetime_now(parse_date("2020-12-03T04:47:15+00:00"), base_filters.metrics):
+            resources = [{'QueueUrl': 'a'}, {'QueueUrl': 'b'}, {'QueueUrl': 'a'}]
+            self.assertEqual(len(load_filter(14).process(resources)), 3)
+            self.assertEqual(len(query_sets), 1)
+            self.assertEqual(len(query_sets[0]), 2)
+
+            # the same window from another policy is served from the cache
+            resources = [{'QueueUrl': 'a'}, {'QueueUrl': 'b'}]
+            self.assertEqual(len(load_filter(14).process(resources)), 2)
+            self.assertEqual(len(query_sets), 1)
+            self.assertNotIn('Unit', resources[0]['c7n.metrics'][
+                'AWS/SQS.NumberOfMessagesSent.Sum.14'][0])
+
+            # a different window is fetched
+            resources = [{'QueueUrl': 'a'}]
+            self.assertEqual(len(load_filter(7).process(resources)), 1)
+            self.assertEqual(len(query_sets), 2)
+
 
 class TestReduceFilter(BaseFilterTest):
 
@@ -20,6 +20,7 @@ from c7n.filters.iamaccess import CrossAccountAccessFilter, PolicyChecker
 from c7n.mu import LambdaManager, LambdaFunction, PythonPackageArchive
 from botocore.exceptions import ClientError
 from c7n.resources.aws import shape_validate
+from c7n.resources import iam
 from c7n.resources.sns import SNS
 from c7n.resources.iam import (
     UserMfaDevice,
@@ -2019,6 +2020,72 @@ class IamInlinePolicyUsage(BaseTest):
         self.assertEqual(len(inline_policies_after["PolicyNames"]), 0)
 
 
+class IamInventoryTest(BaseTest):
+
+    def get_filter(self, factory, resource, data):
+        p = self.load_policy(
+            {'name': 'iam-inventory', 'resource': resource, 'filters': [data]},
+            session_factory=factory)
+        return p.resource_manager.filters[0]
+
+    def test_inventory_filters(self):
+        self.patch(iam, 'INVENTORY_THRESHOLD', 1)
+        factory = self.replay_flight_data('test_iam_inventory')
+
+        roles = [{'RoleName': 'app'}, {'RoleName': 'other'}]
+        f = self.get_filter(factory, 'iam-role', {'type': 'has-inline-policy'})
+        self.assertEqual(f.process(roles), roles)
+        self.assertEqual(
+            [r['c7n:InlinePolicies'] for r in roles], [['app-inline'], ['other-inline']])
+
+        f = self.get_filter(factory, 'iam-role', {
+            'type': 'has-specific-managed-policy', 'value': 'AdministratorAccess'})
+        self.assertEqual(f.process([{'RoleName': 'app'}])[0]['c7n:MatchedPolicies'], [
+            {'PolicyName': 'AdministratorAccess',
+             'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}])
+
+        f = self.get_filter(factory, 'iam-group', {'type': 'has-users', 'value': False})
+        self.assertEqual(
+            f.process([{'GroupName': 'admins'}, {'GroupName': 'empty'}]),
+            [{'GroupName': 'empty'}])
+
+        f = self.get_filter(factory, 'iam-user', {
+            'type': 'policy', 'key': 'AttachmentCount', 'value': 2, 'include-via': True})
+        users = f.process([{'UserName': 'alice'}])
+        self.assertEqual(users[0]['c7n:Groups'][0]['GroupName'], 'admins')
+        self.assertNotIn('PolicyVersionList', users[0]['c7n:Policies'][0])
+
+    def test_inventory_user_policy_annotation(self):
+        factory = self.replay_flight_data('test_iam_user_policy_inventory')
+        data = {'type': 'policy', 'key': 'PolicyName',
+                'value': 'AdministratorAccess', 'include-via': True}
+
+        users = self.get_filter(factory, 'iam-user', data).process([{'UserName': 'alice'}])
+        self.patch(iam, 'INVENTORY_THRESHOLD', 1)
+        inventory_users = self.get_filter(factory, 'iam-user', data).process(
+            [{'UserName': 'alice'}])
+        self.assertEqual(users[0]['c7n:Policies'], inventory_users[0]['c7n:Policies'])
+        self.assertEqual(
+            inventory_users[0]['c7n:Policies'][0]['Tags'],
+            [{'Key': 'Owner', 'Value': 'security'}])
+
+    def test_inventory_threshold(self):
+        p = self.load_policy({'name': 'iam-inventory', 'resource': 'iam-role'})
+        self.assertIsNone(iam.get_iam_inventory(p.resource_manager, [{'RoleName': 'app'}]))
+
+    def test_inventory_index(self):
+        inventory = iam.IamInventory()
+        inventory.add(load_data('placebo/test_iam_inventory/'
+                                'iam.GetAccountAuthorizationDetails_1.json')['data'])
+        self.assertEqual(inventory.get_group_users('admins'), ['alice'])
+        self.assertEqual(inventory.get_group_users('missing'), None)
+        self.assertEqual(inventory.get_inline_policies('User', 'alice'), ['alice-inline'])
+        self.assertEqual(inventory.get_attached_policies('Role', 'app'), None)
+        self.assertEqual(
+            inventory.policy_attachments,
+            {'arn:aws:iam::aws:policy/AdministratorAccess': [('Group', 'admins')]})
+
+
 class GlacierCrossAccount(BaseTest):
 
     def test_glacier_cross_account(self):
@@ -2331,6 +2398,28 @@ class CrossAccountChecker(TestCase):
             violations = checker.check(p)
             self.assertEqual(bool(violations), expected)
 
+    def test_checker_memoized(self):
+        policies = load_data("iam/sqs-policies.json")
+        checker = PolicyChecker({"allowed_accounts": {"221800032964"}})
+        handled = []
+        handle_statement = checker.handle_statement
+
+        def record(s):
+            handled.append(s)
+            return handle_statement(s)
+
+        checker.handle_statement = record
+        violations = checker.check(policies[1])
+        self.assertTrue(violations)
+        statements = len(handled)
+        # equivalent documents, as text or with keys in a different order,
+        # are evaluated once.
+        self.assertEqual(checker.check(json.dumps(policies[1], sort_keys=True)), violations)
+        self.assertEqual(
+            checker.check(dict(reversed(list(policies[1].items())))), violations)
+        self.assertEqual(len(handled), statements)
+        self.assertIsNot(checker.check(policies[1]), checker.check(policies[1]))
+
     def test_iam_policies(self):
         policies = load_data("iam/iam-policies.json")
 
@@ -0,0 +1,85 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+from c7n.filters.iameval import PolicyEvaluator, Unsupported, match_pattern
+from c7n.resources import iam
+
+from .common import BaseTest, load_data
+
+
+class PolicyEvaluatorTest(BaseTest):
+
+    def test_documented_evaluations(self):
+        cases = load_data('iam/policy-evaluations.json')
+        for case in cases['evaluations']:
+            evaluator = PolicyEvaluator(case['policies'], case['guardrails'])
+            self.assertEqual(
+                evaluator.evaluate(case['action'], case['resource'], case['context']),
+                case['decision'], case['description'])
+
+    def test_unsupported(self):
+        cases = load_data('iam/policy-evaluations.json')
+        for case in cases['unsupported']:
+            evaluator = PolicyEvaluator(case['policies'])
+            with self.assertRaises(Unsupported, msg=case['description']):
+                evaluator.evaluate(case['action'], case['resource'])
+        self.assertRaises(Unsupported, PolicyEvaluator, [{'Statement': [
+            {'Effect': 'Allow', 'Principal': '*', 'Action': '*', 'Resource': '*'}]}])
+
+    def test_match_pattern(self):
+        self.assertTrue(match_pattern('arn:aws:s3:::[bucket]', 'arn:aws:s3:::[bucket]'))
+        self.assertFalse(match_pattern('arn:aws:s3:::[bucket]', 'arn:aws:s3:::b'))
+        self.assertFalse(match_pattern('s3:get*', 's3:GetObject'))
+        self.assertTrue(match_pattern('s3:get*', 's3:GetObject', False))
+
+    def test_simulate(self):
+        evaluator = PolicyEvaluator([
+            '{"Statement": {"Effect": "Allow", "Action": "s3:Get*", "Resource": "*"}}'])
+        self.assertEqual(
+            evaluator.simulate(['s3:GetObject', 's3:PutObject']),
+            [{'EvalActionName': 's3:GetObject', 'EvalResourceName': '*',
+              'EvalDecision': 'allowed'},
+             {'EvalActionName': 's3:PutObject', 'EvalResourceName': '*',
+              'EvalDecision': 'implicitDeny'}])
+
+
+class OfflineCheckPermissionsTest(BaseTest):
+
+    def get_filter(self, factory, resource, data):
+        p = self.load_policy(
+            {'name': 'check-permissions', 'resource': resource,
+             'filters': [dict(data, type='check-permissions')]},
+            session_factory=factory)
+        return p.resource_manager.filters[0]
+
+    def test_offline_evaluation(self):
+        self.patch(iam, 'INVENTORY_THRESHOLD', 1)
+        factory = self.replay_flight_data('test_iam_inventory')
+        f = self.get_filter(factory, 'iam-role', {
+            'actions': ['iam:CreateUser'], 'match': 'allowed', 'evaluation': 'local'})
+        roles = [{'RoleName': 'app', 'Arn': 'arn:aws:iam::123456789012:role/app'}]
+        self.assertEqual(f.process(roles), roles)
+        self.assertEqual(roles[0]['c7n:perm-matches'], [
+            {'EvalActionName': 'iam:CreateUser', 'EvalResourceName': '*',
+             'EvalDecision': 'allowed'}])
+
+        # users are evaluated with their groups' policies
+        f = self.get_filter(factory, 'iam-user', {
+            'actions': ['iam:CreateUser'], 'match': 'allowed', 'evaluation': 'local'})
+        users = [{'UserName': 'alice', 'Arn': 'arn:aws:iam::123456789012:user/alice'}]
+        self.assertEqual(f.process(users), users)
+
+    def test_offline_match_keys(self):
+        # the simulator is used unless local evaluation is requested
+        f = self.get_filter(None, 'iam-role', {
+            'actions': ['iam:CreateUser'], 'match': 'allowed'})
+        self.assertFalse(f.supports_offline())
+        self.assertNotIn('iam:GetAccountAuthorizationDetails', f.get_permissions())
+        f = self.get_filter(None, 'iam-role', {
+            'actions': ['iam:CreateUser'], 'evaluation': 'local',
+            'match': {'type': 'value', 'key': 'EvalDecision', 'value': 'allowed'}})
+        self.assertTrue(f.supports_offline())
+        f = self.get_filter(None, 'iam-role', {
+            'actions': ['iam:CreateUser'], 'evaluation': 'local',
+            'match': {'type': 'value', 'key': 'MatchedStatements', 'value': 'present'}})
+        self.assertFalse(f.supports_offline())
+        self.assertIn('iam:GetAccountAuthorizationDetails', f.get_permissions())
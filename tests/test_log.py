@@ -3,8 +3,10 @@
 import time
 import unittest
 import logging
+from queue import Queue
+from unittest import mock
 
-from c7n.log import CloudWatchLogHandler
+from c7n.log import CloudWatchLogHandler, MAX_BATCH_SPAN, get_batches
 from .common import BaseTest
 
 
@@ -61,9 +63,60 @@ class LogTest(BaseTest):
         for i in range(10):
             log.info("knock, knock %d" % i)
 
+        # flush doesn't wait on delivery, close does.
         handler.flush()
+        handler.close()
         self.assertFalse(handler.transport.buffers)
 
+    def test_batches(self):
+        events = [{"timestamp": i, "message": "x" * 74} for i in range(10)]
+        self.assertEqual(
+            [len(b) for b in get_batches(events, max_bytes=400)], [4, 4, 2])
+        self.assertEqual(
+            [len(b) for b in get_batches(events, max_events=3)], [3, 3, 3, 1])
+        events[-1]["timestamp"] = MAX_BATCH_SPAN + 1
+        self.assertEqual([len(b) for b in get_batches(events)], [9, 1])
+
+    def test_token_free_batched_puts(self):
+        session_factory = self.replay_flight_data("test_transport_buffer_flush")
+        handler = CloudWatchLogHandler(
+            "test-c7n-5", "alpha", session_factory=session_factory)
+        handler.batch_size = 4
+        puts = []
+        handler.start_transports()
+        handler.shutdown = False
+        handler.transport.client.put_log_events = lambda **params: puts.append(params)
+        log = logging.getLogger("test-c7n")
+        log.addHandler(handler)
+        self.addCleanup(log.removeHandler, handler)
+        log.setLevel(logging.DEBUG)
+
+        for i in range(10):
+            log.info("knock, knock %d" % i)
+        handler.close()
+        self.assertEqual([len(p["logEvents"]) for p in puts], [4, 4, 2])
+        self.assertNotIn("sequenceToken", puts[0])
+
+    def test_queue_full_dropped(self):
+        session_factory = self.replay_flight_data("test_transport_buffer_flush")
+        handler = CloudWatchLogHandler(
+            "test-c7n-5", "alpha", session_factory=session_factory)
+        handler.queue = Queue(1)
+        handler.queue_timeout = 0.01
+        handler.shutdown = False
+        # no transport thread to drain the queue on close
+        self.addCleanup(setattr, handler, "shutdown", True)
+        handler.transport = mock.MagicMock(error=None)
+        handler.buf = [{"message": "a"}]
+        handler.flush_buffers(force=True)
+        self.assertEqual(handler.dropped, 0)
+        handler.buf = [{"message": "b"}, {"message": "c"}]
+        handler.flush_buffers(force=True)
+        self.assertEqual(handler.dropped, 2)
+        # flushing doesn't block on a full queue
+        handler.flush()
+        self.assertEqual(handler.queue.qsize(), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
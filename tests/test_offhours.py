@@ -9,6 +9,7 @@ from dateutil import tz as tzutil
 from .common import BaseTest, instance
 
 from c7n.exceptions import PolicyValidationError
+from c7n.filters import offhours
 from c7n.filters.offhours import OffHour, OnHour, ScheduleParser, Time
 from c7n.testing import mock_datetime_now
 
@@ -674,3 +675,38 @@ class ScheduleParserTest(BaseTest):
                 OnHour({"skip-days": ["2017-01-01", "2015-12-01"]})(i), False
             )
             self.assertEqual(OnHour({"skip-days": ["2015-12-02"]})(i), True)
+
+    def test_schedule_cache(self):
+        self.patch(offhours, 'SCHEDULE_CACHE_SIZE', 2)
+        f = OffHour({"default_tz": "et", "skip-days-from": {"url": "file:///skip.txt"}})
+        resolved = []
+
+        class ValuesFrom:
+            def __init__(self, data, manager):
+                resolved.append(data)
+
+            def get_values(self):
+                return ["2015-12-02"]
+
+        self.patch(offhours, "ValuesFrom", ValuesFrom)
+        instances = [
+            instance(Tags=[{"Key": "maid_offhours", "Value": value}])
+            for value in ("tz=est", "tz=est;", "off=(m-f,20);tz=pt", "tz=est",
+                          "off=(m-f,19);tz=bad", "tz=est")]
+        t = datetime.datetime(
+            year=2015, month=12, day=1, hour=19, minute=5,
+            tzinfo=tzutil.gettz("America/New_York"))
+        with mock_datetime_now(t, datetime):
+            self.assertEqual(f.process(instances), [instances[i] for i in (0, 1, 3, 5)])
+        self.assertEqual(len(resolved), 1)
+        self.assertIsNone(f.clocks)
+        # invalid schedules are reported per resource
+        self.assertEqual(
+            [value for rid, value in f.parse_errors],
+            ["off=(m-f,19);tz=bad"])
+        self.assertEqual(list(f.schedules), ["off=(m-f,19);tz=bad", "tz=est"])
+
+        # skip days are resolved once per run
+        with mock_datetime_now(t + datetime.timedelta(days=1), datetime):
+            self.assertEqual(f.process(instances), [])
+        self.assertEqual(len(resolved), 2)
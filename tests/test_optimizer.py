@@ -0,0 +1,207 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+import json
+import os
+
+from c7n import optimizer
+
+from .common import BaseTest
+
+
+class FilterOptimizerTest(BaseTest):
+
+    def get_stats(self, policy, costs):
+        stats = optimizer.FilterStats()
+        filters = list(policy.resource_manager.iter_filters())
+        for key, (seconds, matched) in costs.items():
+            for f in filters:
+                if f.data.get('key') == key:
+                    stats.record('sqs', f, 100, matched, seconds)
+        return stats
+
+    def test_plan_orders_commutative_runs(self):
+        p = self.load_policy({
+            'name': 'sqs-plan',
+            'resource': 'sqs',
+            'filters': [
+                {'type': 'value', 'key': 'Slow', 'value': 1},
+                {'type': 'value', 'key': 'Fast', 'value': 1},
+                {'type': 'value', 'key': '"c7n:matched"', 'value': 'present'},
+                {'type': 'value', 'key': 'Broad', 'value': 1},
+                {'type': 'value', 'key': 'Narrow', 'value': 1}]})
+        stats = self.get_stats(p, {
+            'Slow': (1.0, 10), 'Fast': (0.001, 10),
+            'Broad': (0.001, 90), 'Narrow': (0.001, 10)})
+        plan = optimizer.plan_filters(
+            p.resource_manager, p.resource_manager.filters, stats)
+        self.assertEqual(
+            [f.data['key'] for f in plan],
+            ['Fast', 'Slow', '"c7n:matched"', 'Narrow', 'Broad'])
+        self.assertFalse(plan[2].is_commutative())
+
+    def test_plan_nested_blocks(self):
+        p = self.load_policy({
+            'name': 'sqs-plan',
+            'resource': 'sqs',
+            'filters': [
+                {'or': [
+                    {'type': 'value', 'key': 'Slow', 'value': 1},
+                    {'type': 'value', 'key': 'Fast', 'value': 1},
+                    {'and': [
+                        {'type': 'value', 'key': 'Broad', 'value': 1},
+                        {'type': 'value', 'key': 'Narrow', 'value': 1}]}]}]})
+        stats = self.get_stats(p, {
+            'Slow': (1.0, 10), 'Fast': (0.001, 10),
+            'Broad': (0.001, 90), 'Narrow': (0.001, 10)})
+        block = optimizer.plan_filters(
+            p.resource_manager, p.resource_manager.filters, stats)[0]
+        self.assertEqual(
+            [f.data.get('key') for f in block.filters], ['Slow', 'Fast', None])
+        self.assertEqual(
+            [f.data['key'] for f in block.filters[2].filters], ['Narrow', 'Broad'])
+        # the policy's filters are left as written
+        original = p.resource_manager.filters[0]
+        self.assertIsNot(block, original)
+        self.assertEqual(
+            [f.data['key'] for f in original.filters[2].filters], ['Broad', 'Narrow'])
+
+    def test_set_filters_are_barriers(self):
+        p = self.load_policy({
+            'name': 'sqs-plan',
+            'resource': 'sqs',
+            'filters': [
+                {'type': 'value', 'key': 'Slow', 'value': 1},
+                {'type': 'value', 'value_type': 'resource_count', 'op': 'gt', 'value': 1},
+                {'type': 'value', 'key': 'Fast', 'value': 1}]})
+        stats = self.get_stats(p, {'Slow': (1.0, 10), 'Fast': (0.001, 10)})
+        plan = optimizer.plan_filters(
+            p.resource_manager, p.resource_manager.filters, stats)
+        self.assertEqual(plan, p.resource_manager.filters)
+        self.assertIn(
+            '2. {"op": "gt", "type": "value", "value": 1, '
+            '"value_type": "resource_count"} cost:0.010000s '
+            'selectivity:0.50 (estimated) barrier',
+            optimizer.explain_filters(
+                p.resource_manager, p.resource_manager.filters, stats))
+
+    def test_annotation_dependencies(self):
+        p = self.load_policy({
+            'name': 'sqs-plan',
+            'resource': 'sqs',
+            'filters': [
+                {'type': 'value', 'key': 'Slow', 'value': 1},
+                {'type': 'cross-account'},
+                {'CrossAccountViolations': 'present'},
+                {'type': 'value', 'key': 'Fast', 'value': 1},
+                {'not': [{'CrossAccountViolations': 'present'}]},
+                {'type': 'cross-account', 'everyone_only': True}]})
+        stats = self.get_stats(p, {'Slow': (10.0, 10), 'Fast': (0.001, 10)})
+        plan = optimizer.plan_filters(
+            p.resource_manager, p.resource_manager.filters, stats)
+        # value filters on the annotation stay behind the filter producing
+        # it, and ahead of the one overwriting it.
+        self.assertEqual(
+            [f.type for f in plan],
+            ['cross-account', 'value', 'value', 'value', 'not', 'cross-account'])
+        self.assertEqual(
+            [f.data.get('key') for f in plan[1:3]], ['Slow', 'Fast'])
+        self.assertEqual(plan[3].data, {'CrossAccountViolations': 'present'})
+
+        p = self.load_policy({
+            'name': 'sqs-plan',
+            'resource': 'sqs',
+            'filters': [
+                {'type': 'cross-account'},
+                {'CrossAccountViolations': 'present'}]})
+        self.assertEqual(
+            [f.type for f in optimizer.plan_filters(
+                p.resource_manager, p.resource_manager.filters)],
+            ['cross-account', 'value'])
+
+    def test_check_permissions_plan(self):
+        p = self.load_policy({
+            'name': 'iam-plan',
+            'resource': 'iam-role',
+            'filters': [
+                {'type': 'check-permissions', 'match': 'allowed',
+                 'actions': ['iam:CreateUser']},
+                {'tag:Owner': 'absent'},
+                {'type': 'value', 'key': '"c7n:perm-matches"', 'value': 'present'}]})
+        plan = optimizer.plan_filters(
+            p.resource_manager, p.resource_manager.filters, optimizer.FilterStats())
+        # the tag filter moves ahead of the simulator calls, the filter
+        # reading their annotation stays behind them.
+        self.assertEqual(
+            [f.type for f in plan], ['value', 'check-permissions', 'value'])
+        self.assertEqual(plan[0].data, {'tag:Owner': 'absent'})
+        self.assertEqual(plan[2].data.get('key'), '"c7n:perm-matches"')
+
+    def test_recording_run(self):
+        path = os.path.join(self.get_temp_dir(), 'stats.json')
+        p = self.load_policy({
+            'name': 'sqs-record',
+            'resource': 'sqs',
+            'filters': [
+                {'type': 'value', 'key': 'Slow', 'value': 1},
+                {'and': [
+                    {'type': 'value', 'key': 'Fast', 'value': 1},
+                    {'type': 'value', 'key': 'Other', 'value': 2}]}]},
+            config={'optimize_filters': True, 'explain': True})
+        resources = [{'QueueUrl': 'a', 'Slow': 1, 'Fast': 1},
+                     {'QueueUrl': 'b', 'Slow': 1, 'Fast': 2},
+                     {'QueueUrl': 'c', 'Slow': 2}]
+        output = self.capture_logging('custodian.resources.sqs')
+        with optimizer.Recording(path) as stats:
+            self.assertIs(optimizer.STATS, stats)
+            self.assertEqual(p.resource_manager.filter_resources(resources), [])
+        self.assertIsNone(optimizer.STATS)
+        self.assertIn('filter plan', output.getvalue())
+
+        with open(path) as fh:
+            data = json.load(fh)
+        self.assertEqual(
+            sorted((e['resources'], e['matched']) for e in data['sqs'].values()),
+            [(2, 0), (3, 2)])
+
+        # with equal costs the more selective and block is moved first
+        stats = optimizer.FilterStats(path)
+        self.assertEqual(
+            [f.type for f in optimizer.plan_filters(
+                p.resource_manager, p.resource_manager.filters, stats)],
+            ['value', 'and'])
+        stats.load()
+        for entry in stats.data['sqs'].values():
+            entry['seconds'] = entry['resources'] * 0.001
+        self.assertEqual(
+            [f.type for f in optimizer.plan_filters(
+                p.resource_manager, p.resource_manager.filters, stats)],
+            ['and', 'value'])
+
+    def test_save_merges_concurrent_runs(self):
+        path = os.path.join(self.get_temp_dir(), 'stats.json')
+        p = self.load_policy({
+            'name': 'sqs-record',
+            'resource': 'sqs',
+            'filters': [{'type': 'value', 'key': 'Slow', 'value': 1}]})
+        f = p.resource_manager.filters[0]
+        runs = [optimizer.FilterStats(path) for i in range(2)]
+        for stats in runs:
+            stats.load()
+            stats.record('sqs', f, 10, 5, 1.0)
+        for stats in runs:
+            stats.save()
+        stats = optimizer.FilterStats(path)
+        stats.load()
+        self.assertEqual(
+            stats.get('sqs', f),
+            {'runs': 2, 'resources': 20, 'matched': 10, 'seconds': 2.0, 'api_calls': 0})
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(path))), ['stats.json', 'stats.json.lock'])
+
+    def test_stats_path(self):
+        self.assertEqual(
+            optimizer.get_stats_path({'cache': '/tmp/c7n/cloud-custodian.cache'}),
+            '/tmp/c7n/cloud-custodian-filter-stats.json')
+        self.assertEqual(
+            optimizer.get_stats_path({'cache': 'memory'}),
+            os.path.expanduser('~/.cache/cloud-custodian-filter-stats.json'))
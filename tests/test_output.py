@@ -2,16 +2,26 @@
 # SPDX-License-Identifier: Apache-2.0
 import datetime
 import gzip
+import json
 import logging
 import shutil
+import threading
+import time
 from unittest import mock
 import os
 
+from botocore.stub import Stubber
 from dateutil.parser import parse as date_parse
 
 from c7n.ctx import ExecutionContext
 from c7n.config import Config
-from c7n.output import DirectoryOutput, BlobOutput, LogFile, metrics_outputs
+from c7n.credentials import SessionFactory
+from c7n.exceptions import InvalidOutputConfig
+from c7n.output import (
+    DirectoryOutput, BlobOutput, LogFile, LocalTracer, OpenMetricsOutput,
+    metrics_outputs, tracer_outputs)
+from c7n.reports.csvout import fs_record_set, zstandard
+from c7n.utils import local_session, parse_url_config
 from c7n.resources.aws import S3Output, MetricsOutput, inspect_bucket_region
 from c7n.testing import mock_datetime_now, TestUtils
 
@@ -28,16 +38,149 @@ class MetricsTest(BaseTest):
             isinstance(metrics_outputs.select(True, {}), MetricsOutput))
 
 
+class OpenMetricsTest(BaseTest):
+
+    def test_openmetrics_textfile(self):
+        temp_dir = self.get_temp_dir()
+        ctx = Bag(options=Bag(region="us-east-1"),
+                  policy=Bag(name="xyz", resource_type="ec2"))
+        sink = metrics_outputs.select("openmetrics://%s" % temp_dir, ctx)
+        self.assertIsInstance(sink, OpenMetricsOutput)
+        sink.put_metric("ResourceCount", 3, "Count", Scope="Policy")
+        sink.put_metric("ActionTime", 1.5, "Seconds", Action='tag "a"')
+        sink.put_metric("ActionTime", 2.5, "Seconds", Action='tag "a"')
+        sink.flush()
+        with open(os.path.join(temp_dir, "custodian-xyz-us-east-1.prom")) as fh:
+            self.assertEqual(fh.read().splitlines(), [
+                '# TYPE custodian_action_time_seconds summary',
+                'custodian_action_time_seconds_count'
+                '{policy="xyz",restype="ec2",action="tag \\"a\\""} 2',
+                'custodian_action_time_seconds_sum'
+                '{policy="xyz",restype="ec2",action="tag \\"a\\""} 4.0',
+                '# TYPE custodian_resource_count summary',
+                'custodian_resource_count_count{policy="xyz",restype="ec2",scope="Policy"} 1',
+                'custodian_resource_count_sum{policy="xyz",restype="ec2",scope="Policy"} 3.0',
+                '# EOF'])
+        self.assertEqual(os.listdir(temp_dir), ["custodian-xyz-us-east-1.prom"])
+
+
+class LocalTracerTest(BaseTest):
+
+    def test_local_tracer(self):
+        written = {}
+        ctx = Bag(policy=Bag(name="xyz", resource_type="ec2"),
+                  output=Bag(write_file=written.__setitem__),
+                  execution_id="abc", log_dir=".")
+        tracer = tracer_outputs.select("local", ctx)
+        self.assertIsInstance(tracer, LocalTracer)
+
+        with tracer:
+            with tracer.subsegment("resource-fetch"):
+                tracer.record_api_call("ec2", "DescribeInstances", 0.5, 1, 100)
+                tracer.record_api_call("ec2", "DescribeInstances", 0.25, 0, 50)
+                with tracer.subsegment("resource-augment"):
+                    # worker thread calls attribute to the policy thread's segment
+                    worker = threading.Thread(
+                        target=tracer.record_api_call,
+                        args=("ec2", "DescribeTags", 0.1))
+                    worker.start()
+                    worker.join()
+            with self.assertRaises(ValueError):
+                with tracer.subsegment("action:tag"):
+                    raise ValueError("denied")
+            tracer.record_api_call("sts", "GetCallerIdentity", 0.1)
+            with tracer.subsegment("output"):
+                tracer.write()
+
+        self.assertEqual(tracer.root, None)
+        trace = json.loads(written["trace.json"])
+        self.assertEqual(trace["otherData"]["execution_id"], "abc")
+        events = {e["name"]: e for e in trace["traceEvents"]}
+        # the open policy and output segments are written as of writing
+        self.assertEqual(
+            [e["name"] for e in trace["traceEvents"]],
+            ["xyz", "resource-fetch", "resource-augment", "action:tag", "output"])
+        self.assertEqual(events["xyz"]["ts"], 0)
+        self.assertEqual(events["resource-fetch"]["args"]["api"], {
+            "ec2.DescribeInstances": {
+                "calls": 2, "ms": 750.0, "retries": 1, "bytes": 150}})
+        self.assertEqual(events["resource-augment"]["args"]["api_calls"], 1)
+        self.assertEqual(events["action:tag"]["args"]["error"], "ValueError: denied")
+        self.assertEqual(events["xyz"]["args"]["api_calls"], 1)
+
+        summary = written["trace-summary.txt"].splitlines()
+        self.assertEqual(summary[0].split(), [
+            "Segment", "Count", "Wall(s)", "CPU(s)", "Api", "Calls",
+            "Api", "Time(s)", "Retries", "Bytes"])
+        # segments are ordered by wall time
+        self.assertEqual(summary[1].split()[0], "xyz")
+        self.assertIn("", summary)
+        operations = summary[summary.index("") + 1:]
+        self.assertEqual(operations[1].split(), [
+            "ec2.DescribeInstances", "resource-fetch", "2", "0.750", "1", "150"])
+        self.assertEqual(len(operations), 4)
+
+    def test_local_tracer_policy_output(self):
+        output_dir = self.get_temp_dir()
+        p = self.load_policy(
+            {'name': 'traced', 'resource': 'sqs'},
+            config={'tracer': 'local'}, output_dir=output_dir)
+        with p.ctx:
+            pass
+        with open(os.path.join(output_dir, 'traced', 'trace.json')) as fh:
+            trace = json.load(fh)
+        # output is traced, including its close/upload
+        self.assertEqual(
+            [e["name"] for e in trace["traceEvents"]], ["traced", "output"])
+
+    def test_local_tracer_output_api_calls(self):
+        output_dir = self.get_temp_dir()
+        p = self.load_policy(
+            {'name': 'traced', 'resource': 'sqs'},
+            config={'tracer': 'local'}, output_dir=output_dir,
+            session_factory=SessionFactory('us-east-1'))
+        write = LocalTracer.write
+
+        def write_trace(tracer):
+            # ie. metrics and log flushes made as the output closes
+            client = local_session(p.session_factory).client(
+                'sqs', aws_access_key_id='foo', aws_secret_access_key='bar')
+            stubber = Stubber(client)
+            stubber.add_response('list_queues', {'QueueUrls': []})
+            with stubber:
+                client.list_queues()
+            write(tracer)
+
+        self.patch(LocalTracer, 'write', write_trace)
+        with p.ctx:
+            pass
+        with open(os.path.join(output_dir, 'traced', 'trace.json')) as fh:
+            events = {e["name"]: e for e in json.load(fh)["traceEvents"]}
+        self.assertEqual(list(events["output"]["args"]["api"]), ["sqs.ListQueues"])
+        self.assertIsNone(p.ctx.api_stats.trace_call)
+
+    def test_local_tracer_sans_policy_segment(self):
+        tracer = LocalTracer(Bag(), {})
+        with tracer.subsegment("filter"):
+            tracer.record_api_call("ec2", "DescribeInstances", 0.5)
+        tracer.__exit__()
+        self.assertEqual(tracer.segments[0].api_calls, {
+            "ec2.DescribeInstances": [1, 0.5, 0, 0]})
+        # calls outside of any segment aren't recorded
+        self.assertEqual(tracer.get_active(), None)
+        tracer.record_api_call("ec2", "DescribeInstances", 0.5)
+
+
 class DirOutputTest(BaseTest):
 
-    def get_dir_output(self, location):
+    def get_dir_output(self, location, config=None):
         work_dir = self.change_cwd()
         return work_dir, DirectoryOutput(
             ExecutionContext(
                 None,
                 Bag(name="xyz", provider_name="ostack"),
                 Config.empty(output_dir=location)),
-            {'url': location},
+            config or {'url': location},
         )
 
     def test_dir_output(self):
@@ -45,6 +188,48 @@ class DirOutputTest(BaseTest):
         self.assertEqual(os.listdir(work_dir), ["myoutput"])
         self.assertTrue(os.path.isdir(os.path.join(work_dir, "myoutput")))
 
+    def test_write_resources(self):
+        resources = [{"InstanceId": "i-1", "LaunchTime": datetime.datetime(2020, 1, 1)},
+                     {"InstanceId": "i-2", "Tags": []}]
+        for query, path in (
+                ("", "resources.json"),
+                ("?compress=gzip", "resources.json.gz"),
+                ("?format=ndjson", "resources.ndjson"),
+                ("?format=ndjson&compress=gzip", "resources.ndjson.gz")):
+            location = "file://myoutput" + query
+            work_dir, output = self.get_dir_output(location, parse_url_config(location))
+            output.write_resources(resources)
+            self.assertEqual(os.listdir(output.root_dir), [path])
+            records = list(fs_record_set(output.root_dir, "xyz"))
+            self.assertEqual([r["InstanceId"] for r in records], ["i-1", "i-2"])
+            self.assertEqual(records[0]["LaunchTime"], "2020-01-01T00:00:00")
+            self.assertIn("CustodianDate", records[1])
+
+        with open(os.path.join(output.root_dir, path), "rb") as fh:
+            self.assertEqual(len(gzip.decompress(fh.read()).splitlines()), 2)
+
+    def test_write_resources_zstd(self):
+        if zstandard is None:
+            self.skipTest("zstandard not installed")
+        resources = [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}]
+        for query, path in (
+                ("?compress=zstd", "resources.json.zst"),
+                ("?format=ndjson&compress=zstd", "resources.ndjson.zst")):
+            location = "file://myoutput" + query
+            work_dir, output = self.get_dir_output(location, parse_url_config(location))
+            output.write_resources(resources)
+            self.assertEqual(os.listdir(output.root_dir), [path])
+            records = fs_record_set(output.root_dir, "xyz")
+            # records are read lazily
+            self.assertEqual(next(records)["InstanceId"], "i-1")
+            self.assertEqual([r["InstanceId"] for r in records], ["i-2"])
+
+    def test_invalid_resources_format(self):
+        for query in ("?format=csv", "?compress=bz2"):
+            location = "file://myoutput" + query
+            with self.assertRaises(InvalidOutputConfig):
+                self.get_dir_output(location, parse_url_config(location))
+
 
 class S3OutputTest(TestUtils):
 
@@ -121,6 +306,14 @@ class S3OutputTest(TestUtils):
             content = fh.read().strip()
             self.assertTrue(content.endswith("hello world"))
 
+    def test_write_resources_compressed(self):
+        output = self.get_s3_output()
+        output.write_resources([{"BucketName": "abc"}])
+        output.compress()
+        self.assertEqual(os.listdir(output.root_dir), ["resources.json.gz"])
+        with gzip.open(os.path.join(output.root_dir, "resources.json.gz")) as fh:
+            self.assertEqual(json.load(fh), [{"BucketName": "abc"}])
+
     def test_compress(self):
         output = self.get_s3_output()
 
@@ -160,6 +353,64 @@ class S3OutputTest(TestUtils):
             extra_args={"ACL": "bucket-owner-full-control", "ServerSideEncryption": "AES256"},
         )
 
+    def test_background_upload(self):
+        output = self.get_s3_output(cleanup=False)
+        output._transfer = mock.MagicMock()
+        uploaded = []
+        output._transfer.upload_file = lambda path, bucket, key, extra_args: (
+            uploaded.append(key))
+
+        with output:
+            output.write_resources([{"BucketName": "abc"}])
+            output.write_file("action-notify", "[]")
+            output.flush()
+            # written files are uploaded while the policy executes
+            self.assertEqual(
+                sorted(uploaded),
+                ["%s/%s" % (output.key_prefix, f) for f in (
+                    "action-notify.gz", "resources.json.gz")])
+            with open(os.path.join(output.root_dir, "custodian-run.log"), "w") as fh:
+                fh.write("abc")
+        self.assertEqual(len(uploaded), 3)
+        self.assertEqual(uploaded[-1], "%s/custodian-run.log.gz" % output.key_prefix)
+        self.assertFalse(os.path.exists(output.root_dir))
+
+    def test_background_upload_error(self):
+        output = self.get_s3_output(cleanup=False)
+        output._transfer = mock.MagicMock()
+        output._transfer.upload_file.side_effect = ValueError("denied")
+        with self.assertRaises(ValueError):
+            with output:
+                output.write_file("action-notify", "[]")
+        self.assertFalse(os.path.exists(output.root_dir))
+
+        # upload errors raised while exiting on another error
+        output = self.get_s3_output(cleanup=False)
+        output._transfer = mock.MagicMock()
+        output._transfer.upload_file.side_effect = ValueError("denied")
+        output.compress = mock.MagicMock(side_effect=OSError("disk"))
+        with self.assertRaises(ValueError):
+            with output:
+                output.write_file("action-notify", "[]")
+        self.assertFalse(os.path.exists(output.root_dir))
+
+    def test_background_upload_rewrite(self):
+        output = self.get_s3_output(cleanup=False)
+        output._transfer = mock.MagicMock()
+        uploaded = []
+
+        def upload_file(path, bucket, key, extra_args):
+            time.sleep(0.05)
+            with gzip.open(path) as fh:
+                uploaded.append(fh.read())
+
+        output._transfer.upload_file = upload_file
+        with output:
+            output.write_file("action-notify", "[1]")
+            # a rewritten file waits for its pending upload
+            output.write_file("action-notify", "[2]")
+        self.assertEqual(uploaded, [b"[1]", b"[2]"])
+
     def test_sans_prefix(self):
         output = self.get_s3_output()
 
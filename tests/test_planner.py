@@ -0,0 +1,188 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+from c7n import cache
+from c7n.filters import related
+from c7n.planner import FetchPlanner
+
+from .common import BaseTest
+
+
+class FetchPlannerTest(BaseTest):
+
+    def load_counted(self, data, calls, cache=True):
+        p = self.load_policy(data, cache=cache)
+
+        def resources(query):
+            calls.append(p.name)
+            return [{'QueueUrl': 'https://sqs/a', 'Tags': []},
+                    {'QueueUrl': 'https://sqs/b', 'Tags': []}]
+
+        p.resource_manager.source.resources = resources
+        p.resource_manager.augment = lambda resources: resources
+        return p
+
+    def test_plan_groups_by_population(self):
+        p1 = self.load_policy({'name': 'sqs-1', 'resource': 'sqs'}, cache=True)
+        p2 = self.load_policy({'name': 'ec2-1', 'resource': 'ec2'}, cache=True)
+        p3 = self.load_policy({'name': 'sqs-2', 'resource': 'sqs'}, cache=True)
+        p4 = self.load_policy({
+            'name': 'ec2-2', 'resource': 'ec2',
+            'query': [{'instance-state-name': 'running'}]}, cache=True)
+        plan = FetchPlanner([p1, p2, p3, p4]).plan()
+        self.assertEqual(
+            [[p.name for p in group] for _, group in plan],
+            [['sqs-1', 'sqs-2'], ['ec2-1'], ['ec2-2']])
+
+    def test_file_order(self):
+        calls = []
+        policies = [self.load_counted({'name': name, 'resource': 'sqs'}, calls)
+                    for name in ('sqs-1', 'sqs-2')]
+        policies.insert(1, self.load_policy({'name': 'ec2-1', 'resource': 'ec2'}, cache=True))
+        planner = FetchPlanner(policies)
+        executed = []
+        with planner:
+            for p in planner:
+                executed.append(p.name)
+                if p.resource_type == 'sqs':
+                    p.resource_manager.resources()
+                    # the population is retained until its last policy executes
+                    self.assertEqual(len(planner.store), 1)
+            self.assertEqual(planner.store, {})
+        self.assertEqual(executed, ['sqs-1', 'ec2-1', 'sqs-2'])
+        self.assertEqual(calls, ['sqs-1'])
+
+    def test_grouped_order(self):
+        policies = [self.load_policy({'name': name, 'resource': resource}, cache=True)
+                    for name, resource in (
+                        ('sqs-1', 'sqs'), ('ec2-1', 'ec2'), ('sqs-2', 'sqs'))]
+        self.assertEqual(
+            [p.name for p in FetchPlanner(policies, group=True)],
+            ['sqs-1', 'sqs-2', 'ec2-1'])
+
+    def test_plan_serverless_not_shared(self):
+        p1 = self.load_policy({'name': 'sqs-1', 'resource': 'sqs'}, cache=True)
+        p2 = self.load_policy({
+            'name': 'sqs-2', 'resource': 'sqs',
+            'mode': {'type': 'periodic', 'schedule': 'rate(1 day)',
+                     'role': 'arn:aws:iam::123456789012:role/custodian'}}, cache=True)
+        self.assertEqual(FetchPlanner.get_fetch_key(p2), None)
+        self.assertEqual(len(FetchPlanner([p1, p2]).plan()), 2)
+
+    def test_shared_fetch_isolated(self):
+        calls = []
+        p1 = self.load_counted({'name': 'sqs-1', 'resource': 'sqs'}, calls)
+        p2 = self.load_counted({'name': 'sqs-2', 'resource': 'sqs'}, calls)
+
+        results = []
+        planner = FetchPlanner([p1, p2])
+        with planner:
+            for p in planner:
+                resources = p.resource_manager.resources()
+                resources[0]['c7n:annotation'] = p.name
+                results.append(resources)
+        self.assertEqual(calls, ['sqs-1'])
+        self.assertEqual(results[1][0].get('c7n:annotation'), 'sqs-2')
+        self.assertNotIn('c7n:annotation', results[1][1])
+        self.assertIsNone(cache.SHARED_STORE)
+        self.assertIsInstance(p1.resource_manager._cache, cache.SqlKvCache)
+
+    def test_shared_fetch_cache_disabled(self):
+        calls = []
+        p1 = self.load_counted({'name': 'sqs-1', 'resource': 'sqs'}, calls, cache=False)
+        p2 = self.load_counted({'name': 'sqs-2', 'resource': 'sqs'}, calls, cache=False)
+        with FetchPlanner([p1, p2]) as planner:
+            for p in planner:
+                self.assertIsInstance(p.resource_manager._cache, cache.NullCache)
+                p.resource_manager.resources()
+        self.assertEqual(calls, ['sqs-1', 'sqs-2'])
+
+    def test_replaced_caches_closed(self):
+        p = self.load_policy({'name': 'sqs-1', 'resource': 'sqs'}, cache=True)
+        caches = [p.resource_manager._cache]
+        caches[0].load()
+        with FetchPlanner([p]):
+            self.assertIsNone(caches[0].conn)
+            caches.append(p.resource_manager._cache)
+            caches[1].load()
+            self.assertIsNotNone(caches[1].backend.conn)
+        self.assertIsNone(caches[1].backend.conn)
+
+    def test_population_released_after_group(self):
+        calls = []
+        p1 = self.load_counted({'name': 'sqs-1', 'resource': 'sqs'}, calls)
+        p2 = self.load_counted({'name': 'sqs-2', 'resource': 'sqs'}, calls)
+        planner = FetchPlanner([p1])
+        with planner:
+            for p in planner:
+                p.resource_manager.resources()
+            self.assertEqual(planner.store, {})
+            p2.resource_manager._cache = cache.factory(p2.options)
+            p2.resource_manager.resources()
+        self.assertEqual(calls, ['sqs-1', 'sqs-2'])
+
+    def test_related_index_shared(self):
+        policies = [self.load_policy({
+            'name': 'ec2-%d' % i, 'resource': 'ec2',
+            'filters': [{'type': 'security-group', 'key': 'GroupName', 'value': 'web'}]})
+            for i in range(2)]
+        calls = []
+
+        def get_resources(ids, *args):
+            calls.append(sorted(ids))
+            return [{'GroupId': i, 'GroupName': 'web'} for i in ids if i != 'sg-3']
+
+        instances = [
+            {'InstanceId': 'i-1', 'NetworkInterfaces': [{'Groups': [{'GroupId': 'sg-1'}]}]},
+            {'InstanceId': 'i-2', 'NetworkInterfaces': [{'Groups': [{'GroupId': 'sg-3'}]}]}]
+        with FetchPlanner(policies):
+            for p in policies:
+                f = p.resource_manager.filters[0]
+                f.get_resource_manager().get_resources = get_resources
+                self.assertEqual(
+                    [i['InstanceId'] for i in f.process(instances)], ['i-1'])
+            index = f.get_related_index()
+            self.assertEqual(list(index.resources), ['sg-1'])
+            # fetches are made with the filter's own manager
+            self.assertIs(index.manager, f.get_resource_manager())
+        # the second policy's filter used the first's resources
+        self.assertEqual(calls, [['sg-1', 'sg-3']])
+        self.assertIsNone(related.RELATED_INDEXES)
+
+    def test_related_index_annotation_copy(self):
+        p = self.load_policy({
+            'name': 'sqs-kms', 'resource': 'sqs',
+            'filters': [{'type': 'kms-key', 'key': 'c7n:AliasName', 'value': 'alias/q'}]})
+        f = p.resource_manager.filters[0]
+        f.get_resource_manager().get_resources = lambda ids, *args: [
+            {'KeyId': i, 'AliasNames': ['alias/q']} for i in ids]
+        with FetchPlanner([p]):
+            related_keys = f.get_related([{'KmsMasterKeyId': 'k-1'}])
+            self.assertEqual(related_keys['k-1']['c7n:AliasName'], 'alias/q')
+            self.assertEqual(
+                f.get_related_index().resources,
+                {'k-1': {'KeyId': 'k-1', 'AliasNames': ['alias/q']}})
+
+    def test_related_index_returns_copies(self):
+        p = self.load_policy({
+            'name': 'ec2-sg', 'resource': 'ec2',
+            'filters': [{'type': 'security-group', 'key': 'GroupName', 'value': 'web'}]})
+        f = p.resource_manager.filters[0]
+        f.get_resource_manager().get_resources = lambda ids, *args: [
+            {'GroupId': i, 'GroupName': 'web'} for i in ids]
+        instances = [
+            {'InstanceId': 'i-1', 'NetworkInterfaces': [{'Groups': [{'GroupId': 'sg-1'}]}]}]
+        with FetchPlanner([p]):
+            f.get_related(instances)['sg-1']['c7n:annotation'] = True
+            self.assertEqual(
+                f.get_related(instances), {'sg-1': {'GroupId': 'sg-1', 'GroupName': 'web'}})
+
+    def test_related_index_population(self):
+        p = self.load_policy({'name': 'ec2', 'resource': 'ec2'})
+        manager = p.resource_manager.get_resource_manager('security-group')
+        manager.resources = lambda: [{'GroupId': 'sg-%d' % i} for i in range(3)]
+        manager.get_resources = lambda ids, *args: self.fail('fetched by id')
+        index = related.get_related_index(p.resource_manager, manager)
+        self.assertEqual(index.get({'sg-1', 'sg-2', 'sg-4'}, 2), {
+            'sg-1': {'GroupId': 'sg-1'}, 'sg-2': {'GroupId': 'sg-2'}})
+        self.assertTrue(index.complete)
+        self.assertEqual(index.get({'sg-0'}, 2), {'sg-0': {'GroupId': 'sg-0'}})
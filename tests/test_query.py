@@ -3,9 +3,13 @@
 import json
 import logging
 import os
+import threading
+import time
 
 
-from c7n.query import ResourceQuery, RetryPageIterator, TypeInfo
+from c7n.exceptions import ClientError
+from c7n.query import (
+    ChildResourceQuery, ResourceQuery, RetryPageIterator, TypeInfo, split_streamable)
 from c7n.resources.vpc import InternetGateway
 
 from botocore.config import Config
@@ -99,6 +103,52 @@ class ResourceQueryTest(BaseTest):
         assert repr(TypeInfo) == "<TypeInfo TypeInfo>"
 
 
+class ChildResourceQueryTest(BaseTest):
+
+    def get_query(self, errors=(), **kw):
+        p = self.load_policy({'name': 'records', 'resource': 'aws.rrset'})
+        query = ChildResourceQuery(p.resource_manager.session_factory, p.resource_manager, **kw)
+        threads = set()
+
+        def invoke(client, enum_op, params, path, retry=None):
+            threads.add(threading.get_ident())
+            zone = params['HostedZoneId']
+            # earlier parents complete last
+            time.sleep(0.1 / int(zone[-1]))
+            if zone in errors:
+                raise ClientError(
+                    {'Error': {'Code': 'NoSuchHostedZone', 'Message': zone}},
+                    'ListResourceRecordSets')
+            return [{'Name': '%s.example.com' % zone}]
+
+        query._invoke_client_enum = invoke
+        return p.resource_manager, query, threads
+
+    def test_parents_enumerated_concurrently(self):
+        manager, query, threads = self.get_query(errors=('zone2',))
+        log_output = self.capture_logging(
+            'custodian.resources.resourcerecordset', level=logging.WARNING)
+        resources = query.filter(manager, parent_ids=['zone1', 'zone2', 'zone3'])
+        self.assertEqual(
+            resources,
+            [{'Name': 'zone1.example.com', 'c7n:parent-id': 'zone1'},
+             {'Name': 'zone3.example.com', 'c7n:parent-id': 'zone3'}])
+        self.assertEqual(len(threads), 3)
+        self.assertIn('parent:zone2', log_output.getvalue())
+
+    def test_capture_parent_id(self):
+        manager, query, threads = self.get_query(capture_parent_id=True)
+        self.assertEqual(
+            list(query.iter_filter(manager, parent_ids=['zone1', 'zone2'])),
+            [[('zone1', {'Name': 'zone1.example.com', 'c7n:parent-id': 'zone1'})],
+             [('zone2', {'Name': 'zone2.example.com', 'c7n:parent-id': 'zone2'})]])
+
+    def test_all_parents_error(self):
+        manager, query, threads = self.get_query(errors=('zone1', 'zone2'))
+        with self.assertRaises(ClientError):
+            query.filter(manager, parent_ids=['zone1', 'zone2'])
+
+
 class ConfigSourceTest(BaseTest):
 
     def test_config_select(self):
@@ -128,6 +178,50 @@ class ConfigSourceTest(BaseTest):
         p.data['query'] = [{'clause': "configuration.imageId = 'xyz'"}]
         self.assertIn("imageId = 'xyz'", source.get_query_params(None)['expr'])
 
+    def test_config_batch_get(self):
+        factory = self.replay_flight_data('test_config_batch_get_unprocessed')
+        p = self.load_policy(
+            {'name': 'certs', 'resource': 'acm-certificate', 'source': 'config'},
+            session_factory=factory)
+        resources = p.resource_manager.get_resources([
+            'arn:aws:acm:us-east-1:644160558196:certificate/c1',
+            'arn:aws:acm:us-east-1:644160558196:certificate/c2'])
+        self.assertEqual(
+            [(r['DomainName'], r.get('Tags')) for r in resources],
+            [('c1.example.com', [{'Key': 'Env', 'Value': 'prod'}]),
+             ('c2.example.com', [{'Key': 'Env', 'Value': 'dev'}])])
+
+    def test_config_aggregator_select(self):
+        factory = self.replay_flight_data('test_config_aggregator_select')
+        p = self.load_policy(
+            {'name': 'org-certs', 'resource': 'acm-certificate', 'source': 'config',
+             'query': [{'aggregator': 'org'}]},
+            session_factory=factory)
+        source = p.resource_manager.get_source('config')
+        self.assertIn('awsRegion', source.get_query_params(None)['expr'])
+        self.assertIn('config:SelectAggregateResourceConfig', source.get_permissions())
+        resources = p.run()
+        self.assertEqual(
+            [(r['DomainName'], r['c7n:account-id'], r['c7n:region']) for r in resources],
+            [('a1.example.com', '111111111111', 'us-east-1'),
+             ('b1.example.com', '222222222222', 'eu-west-1')])
+
+    def test_config_aggregator_list(self):
+        factory = self.replay_flight_data('test_config_aggregator_list')
+        p = self.load_policy(
+            {'name': 'org-certs', 'resource': 'acm-certificate', 'source': 'config',
+             'query': [{'aggregator': 'org'}]},
+            session_factory=factory)
+        resources = p.run()
+        self.assertEqual(
+            [(r['DomainName'], r['c7n:account-id'], r['Tags']) for r in resources],
+            [('a1.example.com', '111111111111', []),
+             ('b1.example.com', '222222222222', [{'Key': 'Env', 'Value': 'prod'}]),
+             ('b2.example.com', '222222222222', [])])
+        self.assertIn(
+            'config:GetAggregateResourceConfig',
+            p.resource_manager.get_source('config').get_permissions())
+
 
 class QueryResourceManagerTest(BaseTest):
 
@@ -196,3 +290,40 @@ class QueryResourceManagerTest(BaseTest):
         # Check that the warning message was logged
         self.assertTrue("Resource not found: get_core_network using" in output.getvalue())
         self.assertTrue(resources[0]["CoreNetworkArn"] not in output.getvalue())
+
+    def test_stream_resources(self):
+        session_factory = self.replay_flight_data("test_query_manager")
+        p = self.load_policy(
+            {
+                "name": "igw-check",
+                "resource": "internet-gateway",
+                "stream": True,
+                "filters": [
+                    {"InternetGatewayId": "igw-2e65104a"},
+                    {"type": "value", "value_type": "resource_count",
+                     "op": "eq", "value": 1}],
+            },
+            session_factory=session_factory,
+        )
+        streamed, remainder = split_streamable(p.resource_manager.filters)
+        self.assertEqual(len(streamed), 1)
+        self.assertEqual(len(remainder), 1)
+        resources = p.run()
+        self.assertEqual(len(resources), 1)
+        self.assertEqual(resources[0]['InternetGatewayId'], 'igw-2e65104a')
+
+    def test_stream_filter_split(self):
+        p = self.load_policy(
+            {
+                "name": "ec2-stream",
+                "resource": "ec2",
+                "stream": True,
+                "filters": [
+                    {"or": [{"tag:Env": "prod"}, {"type": "tag-count", "count": 3}]},
+                    {"type": "instance-age", "days": 5},
+                    {"type": "reduce", "limit": 2},
+                    {"tag:App": "present"}],
+            })
+        streamed, remainder = split_streamable(p.resource_manager.filters)
+        self.assertEqual([f.type for f in streamed], ['or', 'instance-age'])
+        self.assertEqual([f.type for f in remainder], ['reduce', 'value'])
@@ -0,0 +1,128 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+from boto3 import Session
+from botocore.stub import Stubber
+
+from c7n import ratelimit
+
+from .common import BaseTest
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.slept.append(delay)
+        self.now += delay
+
+
+class TokenBucketTest(BaseTest):
+
+    def get_bucket(self):
+        clock = Clock()
+        return clock, ratelimit.TokenBucket(clock=clock, sleep=clock.sleep)
+
+    def test_unlimited_until_throttled(self):
+        clock, bucket = self.get_bucket()
+        for i in range(20):
+            self.assertEqual(bucket.acquire(), 0)
+            clock.now += 0.1
+        self.assertFalse(bucket.limited)
+        self.assertAlmostEqual(bucket.measured, 10.0, delta=1)
+
+        bucket.throttled()
+        self.assertEqual(bucket.rate, bucket.measured / 2)
+        bucket.rate = 5.0
+        # throttles close to a decrease don't compound it
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 5.0)
+
+        self.assertAlmostEqual(bucket.acquire(), 0.2)
+        self.assertAlmostEqual(bucket.acquire(), 0.2)
+        clock.now += 1.0
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 2.5)
+
+    def test_additive_increase(self):
+        clock, bucket = self.get_bucket()
+        bucket.throttled()
+        self.assertEqual(bucket.rate, ratelimit.MIN_RATE)
+        bucket.succeeded(0.5)
+        self.assertEqual(bucket.rate, ratelimit.MIN_RATE + 2)
+        self.assertEqual(bucket.latency, 0.5)
+        bucket.rate = ratelimit.MAX_RATE
+        bucket.succeeded(1.5)
+        self.assertFalse(bucket.limited)
+        self.assertAlmostEqual(bucket.latency, 0.6)
+
+
+class RateLimiterTest(BaseTest):
+
+    def test_get_workers(self):
+        limiter = ratelimit.RateLimiter()
+        limiter.get_bucket(('', 'us-east-1', 's3', 'GetBucketTagging'))
+        self.assertEqual(limiter.get_workers(10, 's3'), 10)
+
+        bucket = limiter.get_bucket(('', 'us-east-1', 's3', 'GetBucketPolicy'))
+        bucket.rate, bucket.latency = 4.0, 0.5
+        self.assertEqual(limiter.get_workers(10, 's3'), 2)
+        self.assertEqual(limiter.get_workers(10, 's3', 'us-east-1'), 2)
+        self.assertEqual(limiter.get_workers(10, 's3', 'us-west-2'), 10)
+        self.assertEqual(limiter.get_workers(10, 'ec2'), 10)
+        bucket.rate = 0.5
+        self.assertEqual(limiter.get_workers(10, 's3'), 1)
+
+    def test_session_hooks(self):
+        limiter = ratelimit.RateLimiter()
+        session = Session(region_name='us-east-1')
+        limiter.register(session, '123456789012')
+        client = session.client(
+            'sqs', aws_access_key_id='foo', aws_secret_access_key='bar')
+        stubber = Stubber(client)
+        stubber.add_response('list_queues', {'QueueUrls': []})
+        with stubber:
+            client.list_queues()
+        key = ('123456789012', 'us-east-1', 'sqs', 'ListQueues')
+        self.assertEqual(list(limiter.buckets), [key])
+        self.assertEqual(limiter.buckets[key].window_count, 1)
+
+        hooks = ratelimit.SessionHooks(limiter, '123456789012')
+        model = client.meta.service_model.operation_model('ListQueues')
+        hooks.needs_retry(
+            response=(None, {'Error': {'Code': 'RequestThrottled'}}),
+            operation=model,
+            request_dict={'context': {'client_region': 'us-east-1'}})
+        self.assertTrue(limiter.buckets[key].limited)
+
+    def test_quota_errors_not_throttles(self):
+        limiter = ratelimit.RateLimiter()
+        hooks = ratelimit.SessionHooks(limiter, '123456789012')
+        model = Session(region_name='us-east-1').client(
+            'lambda', aws_access_key_id='foo', aws_secret_access_key='bar'
+        ).meta.service_model.operation_model('CreateFunction')
+        for code in ('LimitExceededException', 'TransactionInProgressException'):
+            hooks.needs_retry(
+                response=(None, {'Error': {'Code': code}}),
+                operation=model,
+                request_dict={'context': {'client_region': 'us-east-1'}})
+        self.assertEqual(limiter.buckets, {})
+        self.assertTrue(ratelimit.is_throttle('ThrottlingException'))
+
+    def test_get_account(self):
+        self.assertEqual(ratelimit.get_account(
+            self.Factory('arn:aws:iam::123456789012:role/custodian', None)),
+            '123456789012')
+        self.assertEqual(ratelimit.get_account(self.Factory(None, 'dev')), 'dev')
+        self.assertEqual(ratelimit.get_account(self.Factory(None, None)), '')
+
+    class Factory:
+
+        def __init__(self, assume_role, profile):
+            self.assume_role = assume_role
+            self.profile = profile
@@ -1,11 +1,13 @@
 # Copyright The Cloud Custodian Authors.
 # SPDX-License-Identifier: Apache-2.0
+import copy
 import datetime
 import functools
 import json
 import logging
 import os
 import io
+import pickle
 import shutil
 import tempfile
 import time  # NOQA needed for some recordings
@@ -153,6 +155,182 @@ def generateBucketContents(s3, bucket, contents=None):
         key.put(Body=v, ContentLength=len(v), ContentType="text/plain")
 
 
+class BucketAugmentKeys(BaseTest):
+
+    def test_augment_keys(self):
+        p = self.load_policy({
+            "name": "s3-keys",
+            "resource": "s3",
+            "filters": [
+                {"tag:Env": "prod"},
+                {"or": [
+                    {"type": "global-grants"},
+                    {"Versioning.Status": "Enabled"}]}],
+            "actions": [{"type": "set-statements", "statements": []}]})
+        self.assertEqual(
+            p.resource_manager.get_augment_keys(),
+            {"Location", "Tags", "Acl", "Website", "Versioning", "Policy"})
+
+    def test_augment_keys_all(self):
+        p = self.load_policy({"name": "s3-inventory", "resource": "s3"})
+        self.assertIsNone(p.resource_manager.get_augment_keys())
+        p = self.load_policy({
+            "name": "s3-notify",
+            "resource": "s3",
+            "filters": [{"tag:Env": "prod"}],
+            "actions": [{"type": "notify", "to": ["a@example.com"],
+                         "transport": {"type": "sqs", "queue": "xyz"}}]})
+        self.assertIsNone(p.resource_manager.get_augment_keys())
+        related = p.resource_manager.get_resource_manager("s3")
+        self.assertIsNone(related.get_augment_keys())
+
+    def test_assemble_bucket_keys(self):
+        calls = []
+
+        class Client:
+            def __getattr__(self, name):
+                def method(Bucket):
+                    calls.append(name)
+                    return {"ResponseMetadata": {}, "TagSet": []}
+                return method
+
+        class Session:
+            def client(self, service, region_name=None, config=None):
+                return Client()
+
+        b = {"Name": "xyz", "Location": {"LocationConstraint": "us-west-2"}}
+        s3.assemble_bucket((Session, b), keys={"Location", "Tags"})
+        self.assertEqual(calls, ["get_bucket_tagging"])
+        self.assertEqual(b["Tags"], [])
+        s3.assemble_bucket((Session, b), keys={"Location", "Tags"})
+        self.assertEqual(calls, ["get_bucket_tagging"])
+        self.assertEqual(
+            [m[1] for m in s3.get_missing_augments(b, {"Policy", "Tags"})],
+            ["Policy"])
+
+    def get_recording_session(self, calls):
+
+        class Client:
+            def __getattr__(self, name):
+                def method(Bucket):
+                    calls.append((name, Bucket))
+                    tags = Bucket == "a" and [{"Key": "Env", "Value": "prod"}] or []
+                    return {"ResponseMetadata": {}, "TagSet": tags}
+                return method
+
+        class Session:
+            def client(self, service, region_name=None, config=None):
+                return Client()
+
+        return Session
+
+    def test_lazy_augment(self):
+        calls = []
+        p = self.load_policy({
+            "name": "s3-tags", "resource": "s3", "filters": [{"tag:Env": "prod"}]})
+        p.resource_manager.session_factory = self.get_recording_session(calls)
+        b = p.resource_manager.source.wrap([{"Name": "z", "Location": {}, "Tags": []}])[0]
+        self.assertIsInstance(b, s3.LazyBucket)
+        # undeclared augments are fetched on first read
+        self.assertEqual(b["Policy"], {"TagSet": []})
+        self.assertEqual(b.get("Acl"), {"TagSet": []})
+        self.assertEqual(b.get("Policy"), {"TagSet": []})
+        self.assertEqual(b.get("Other"), None)
+        self.assertRaises(KeyError, b.__getitem__, "Other")
+        self.assertEqual(calls, [("get_bucket_policy", "z"), ("get_bucket_acl", "z")])
+        self.assertEqual(type(pickle.loads(pickle.dumps(b))), dict)
+        self.assertEqual(type(copy.deepcopy(b)), dict)
+
+    def test_matched_buckets_completed(self):
+        self.patch(s3.S3, "executor_factory", MainThreadExecutor)
+        calls = []
+        p = self.load_policy({
+            "name": "s3-tags", "resource": "s3", "filters": [{"tag:Env": "prod"}]})
+        manager = p.resource_manager
+        manager.session_factory = self.get_recording_session(calls)
+        manager.source.resources = lambda query: [
+            {"Name": n, "BucketRegion": "us-east-1"} for n in ("a", "b")]
+        resources = manager.resources()
+        self.assertEqual([b["Name"] for b in resources], ["a"])
+        self.assertEqual(s3.get_missing_augments(resources[0]), [])
+        # only the matched bucket is fully augmented
+        self.assertEqual([c for c in calls if c[1] == "b"], [("get_bucket_tagging", "b")])
+        self.assertEqual(len(calls), len(s3.S3_AUGMENT_TABLE))
+
+    def test_assemble_bucket_client_pool(self):
+        sessions, regions = [], []
+
+        class Client:
+            def __init__(self, region):
+                self.region = region
+
+            def get_bucket_location(self, Bucket):
+                return {"ResponseMetadata": {}, "LocationConstraint": "EU"}
+
+            def get_bucket_tagging(self, Bucket):
+                regions.append((Bucket, self.region))
+                return {"ResponseMetadata": {}, "TagSet": []}
+
+        class Session:
+            def __init__(self):
+                sessions.append(self)
+
+            def client(self, service, region_name=None, config=None):
+                return Client(region_name)
+
+        pool = s3.BucketClientPool(Session)
+        buckets = [
+            {"Name": "a", "BucketRegion": "us-east-1"},
+            {"Name": "b", "BucketRegion": "us-west-2"},
+            {"Name": "c", "BucketRegion": "us-west-2"},
+            {"Name": "d"}]
+        for b in buckets:
+            s3.seed_bucket_location(b)
+            s3.assemble_bucket((Session, b), keys={"Location", "Tags"}, clients=pool)
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(
+            regions,
+            [("a", "us-east-1"), ("b", "us-west-2"),
+             ("c", "us-west-2"), ("d", "eu-west-1")])
+        self.assertEqual(buckets[0]["Location"], {"LocationConstraint": None})
+        self.assertEqual(buckets[3]["Location"], {"LocationConstraint": "eu-west-1"})
+        self.assertEqual(
+            sorted(pool.clients, key=str), [None, "eu-west-1", "us-east-1", "us-west-2"])
+
+    def test_assemble_bucket_redirect_sans_region(self):
+        calls, configs = [], []
+        redirect = ClientError(
+            {"Error": {"Code": "PermanentRedirect", "Message": "moved"}},
+            "GetBucketTagging")
+
+        class Client:
+            def __init__(self, region):
+                self.region = region
+
+            def get_bucket_tagging(self, Bucket):
+                calls.append(self.region)
+                if self.region != "us-east-1":
+                    raise redirect
+                return {"ResponseMetadata": {}, "TagSet": []}
+
+        class Session:
+            def client(self, service, region_name=None, config=None):
+                configs.append(config)
+                return Client(region_name)
+
+        # retried in the location constraint region
+        b = {"Name": "a"}
+        s3.assemble_bucket((Session, b), keys={"Tags"})
+        self.assertEqual(calls, [None, "us-east-1"])
+        self.assertEqual(b["Tags"], [])
+        self.assertEqual(configs[0].read_timeout, 200)
+
+        # unless that's the region which redirected
+        b = {"Name": "b", "Location": {"LocationConstraint": "us-west-2"}}
+        with self.assertRaises(ClientError):
+            s3.assemble_bucket((Session, b), keys={"Location", "Tags"})
+
+
 class BucketMetrics(BaseTest):
 
     def test_metrics_dims(self):
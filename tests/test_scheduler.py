@@ -0,0 +1,127 @@
+# Copyright The Cloud Custodian Authors.
+# SPDX-License-Identifier: Apache-2.0
+import contextvars
+import logging
+import threading
+import time
+
+from c7n import output
+from c7n.executor import MainThreadExecutor, ThreadPoolExecutor
+from c7n.planner import FetchPlanner
+from c7n.scheduler import PolicyScheduler
+
+from .common import BaseTest
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class PolicySchedulerTest(BaseTest):
+
+    def load_policies(self, *specs):
+        return [self.load_policy(
+            {'name': name, 'resource': resource}, config={'region': region}, cache=True)
+            for name, resource, region in specs]
+
+    def capture_root(self):
+        handler = RecordingHandler()
+        root = logging.getLogger()
+        root.addHandler(handler)
+        self.addCleanup(root.removeHandler, handler)
+        return handler
+
+    def test_region_affinity(self):
+        policies = self.load_policies(
+            ('sqs-east', 'sqs', 'us-east-1'),
+            ('sqs-west', 'sqs', 'us-west-2'),
+            ('ec2-east', 'ec2', 'us-east-1'),
+            ('ec2-west', 'ec2', 'us-west-2'),
+            ('sqs-east-2', 'sqs', 'us-east-1'))
+        scheduler = PolicyScheduler(FetchPlanner(policies), 2)
+        self.patch(PolicyScheduler, 'executor_factory', MainThreadExecutor)
+        executed = []
+        scheduler.run(lambda p: executed.append(p.name))
+        # a single worker drains its region before moving on, groups
+        # sharing a population execute together.
+        self.assertEqual(
+            executed, ['sqs-east', 'sqs-east-2', 'ec2-east', 'sqs-west', 'ec2-west'])
+
+    def test_ordered_log_output(self):
+        handler = self.capture_root()
+        policies = self.load_policies(
+            ('sqs-east', 'sqs', 'us-east-1'),
+            ('ec2-east', 'ec2', 'us-east-1'),
+            ('sqs-west', 'sqs', 'us-west-2'),
+            ('ec2-west', 'ec2', 'us-west-2'))
+        log = logging.getLogger('custodian.test-scheduler')
+        threads = set()
+
+        def execute(p):
+            threads.add(threading.get_ident())
+            log.warning("start %s", p.name)
+            # later policies complete first
+            time.sleep(0.05 * (len(policies) - policies.index(p)))
+            # records of the policy's own executor threads are buffered too
+            with ThreadPoolExecutor(max_workers=1) as w:
+                w.submit(log.warning, "end %s", p.name).result()
+
+        planner = FetchPlanner(policies)
+        with planner:
+            PolicyScheduler(planner, 4).run(execute)
+        self.assertEqual(len(threads), 4)
+        messages = [r.getMessage() for r in handler.records
+                    if r.name == 'custodian.test-scheduler']
+        self.assertEqual(
+            messages,
+            ['start sqs-east', 'end sqs-east', 'start ec2-east', 'end ec2-east',
+             'start sqs-west', 'end sqs-west', 'start ec2-west', 'end ec2-west'])
+        self.assertEqual(logging.getLogger().handlers[-1], handler)
+
+    def test_error_propagated(self):
+        handler = self.capture_root()
+        policies = self.load_policies(
+            ('sqs-east', 'sqs', 'us-east-1'),
+            ('sqs-west', 'sqs', 'us-west-2'))
+        executed = []
+
+        def execute(p):
+            logging.getLogger('custodian.test-scheduler').warning(p.name)
+            executed.append(p.name)
+            if p.name == 'sqs-east':
+                raise ValueError(p.name)
+
+        self.assertRaises(
+            ValueError, PolicyScheduler(FetchPlanner(policies), 2).run, execute)
+        self.assertEqual(sorted(executed), ['sqs-east', 'sqs-west'])
+        self.assertEqual(
+            [r.getMessage() for r in handler.records
+             if r.name == 'custodian.test-scheduler'],
+            ['sqs-east', 'sqs-west'])
+
+    def test_execution_log_filter(self):
+        record = logging.LogRecord(
+            'custodian.test', logging.INFO, __file__, 1, 'msg', (), None)
+        self.assertTrue(output.ExecutionLogFilter().filter(record))
+
+        token = output.EXECUTION.set('policy-a')
+        self.addCleanup(output.EXECUTION.reset, token)
+        log_filter = output.ExecutionLogFilter()
+        self.assertTrue(log_filter.filter(record))
+        with ThreadPoolExecutor(max_workers=1) as w:
+            self.assertTrue(w.submit(log_filter.filter, record).result())
+
+        other = contextvars.copy_context()
+        other.run(output.EXECUTION.set, 'policy-b')
+        self.assertFalse(other.run(log_filter.filter, record))
+        with ThreadPoolExecutor(max_workers=1) as w:
+            self.assertFalse(other.run(w.submit, log_filter.filter, record).result())
+        # records emitted outside of any policy execution
+        unscoped = contextvars.Context()
+        self.assertTrue(unscoped.run(log_filter.filter, record))
@@ -7,6 +7,7 @@ import time
 from freezegun import freeze_time
 from unittest.mock import MagicMock, call
 
+from c7n import tags
 from c7n.tags import universal_retry, coalesce_copy_user_tags
 from c7n.exceptions import PolicyExecutionError, PolicyValidationError
 from c7n.utils import yaml_load
@@ -163,6 +164,51 @@ class UniversalTagTest(BaseTest):
         results = policy.run()
         self.assertTrue('Tags' in results[0])
 
+    def get_state_machines(self, flight):
+        factory = self.replay_flight_data(flight)
+        p = self.load_policy(
+            {'name': 'sfn-tags', 'resource': 'step-machine'}, session_factory=factory)
+        arn = 'arn:aws:states:us-east-1:644160558196:stateMachine:%s'
+        return p.resource_manager, [
+            {'stateMachineArn': arn % n, 'name': n} for n in ('alpha', 'beta', 'gamma')]
+
+    def test_universal_augment_sweep(self):
+        self.patch(tags, 'TAG_SWEEP_THRESHOLD', 2)
+        manager, resources = self.get_state_machines('test_tags_universal_sweep')
+        tags.universal_augment(manager, resources)
+        self.assertEqual(
+            [r['Tags'] for r in resources],
+            [[{'Key': 'App', 'Value': 'alpha'}], [{'Key': 'App', 'Value': 'beta'}], []])
+
+    def test_universal_augment_sweep_fallback(self):
+        self.patch(tags, 'TAG_SWEEP_THRESHOLD', 2)
+        manager, resources = self.get_state_machines('test_tags_universal_sweep_fallback')
+        tags.universal_augment(manager, resources)
+        self.assertEqual(
+            [r['Tags'] for r in resources],
+            [[{'Key': 'App', 'Value': 'alpha'}], [], []])
+
+    def test_universal_augment_sweep_error(self):
+        self.patch(tags, 'TAG_SWEEP_THRESHOLD', 2)
+        manager, resources = self.get_state_machines('test_tags_universal_sweep_error')
+        output = self.capture_logging('custodian.resources.stepfunction')
+        tags.universal_augment(manager, resources)
+        self.assertEqual(
+            [r['Tags'] for r in resources],
+            [[{'Key': 'App', 'Value': 'alpha'}], [], []])
+        self.assertIn('Unable to sweep resource tags', output.getvalue())
+
+    def test_resource_type_filters(self):
+        self.assertEqual(
+            tags.get_resource_type_filters([
+                'arn:aws:states:us-east-1:123456789012:stateMachine:alpha',
+                'arn:aws:sqs:us-east-1:123456789012:queue',
+                'arn:aws:ecs:us-east-1:123456789012:service/cluster/svc']),
+            ['ecs:service', 'sqs', 'states:stateMachine'])
+        self.assertIsNone(tags.get_resource_type_filters(['queue']))
+        self.assertIsNone(tags.get_resource_type_filters([
+            'arn:aws:apigateway:us-east-1::/restapis/abc']))
+
     def test_retry_no_error(self):
         mock = MagicMock()
         mock.side_effect = [{"Result": 42}]
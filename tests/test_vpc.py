@@ -6,7 +6,9 @@ from .common import BaseTest, functional, event_data, load_data
 from unittest.mock import MagicMock
 
 from botocore.exceptions import ClientError as BotoClientError
+from c7n.config import Config
 from c7n.exceptions import PolicyValidationError
+from c7n.planner import FetchPlanner
 from c7n.resources.aws import shape_validate
 from pytest_terraform import terraform
 
@@ -2039,6 +2041,46 @@ class SecurityGroupTest(BaseTest):
         group_enis = used._get_eni_attributes()
         assert set(group_enis) == {'sg-123', 'sg-456', 'sg-789'}
 
+    def test_usage_graph_shared(self):
+        policies = [self.load_policy(
+            {"name": "sg-%s" % f, "resource": "security-group", "filters": [f]},
+            cache=True)
+            for f in ("used", "unused")]
+        scans = []
+
+        def get_lambda_sgs():
+            scans.append(1)
+            return {'sg-1': {'func-a', 'func-b'}}
+
+        groups = [{'GroupId': 'sg-1', 'VpcId': 'vpc-1'},
+                  {'GroupId': 'sg-2', 'VpcId': 'vpc-1'}]
+        with FetchPlanner(policies):
+            for p in policies:
+                f = p.resource_manager.filters[0]
+                self.patch(f, 'get_scanners', lambda: (('lambdas', get_lambda_sgs),))
+            # peered reference checks are recorded in the shared graph
+            graph = f.get_usage_graph()
+            graph.peered['sg-2'] = False
+            f.save_usage_graph(graph)
+            used, unused = [
+                p.resource_manager.filters[0].process([dict(g) for g in groups])
+                for p in policies]
+        self.assertEqual(len(scans), 1)
+        self.assertEqual([r['GroupId'] for r in used], ['sg-1'])
+        self.assertEqual(used[0]['c7n:UsedBy'], {'lambdas': ['func-a', 'func-b']})
+        self.assertEqual([r['GroupId'] for r in unused], ['sg-2'])
+
+    def test_usage_annotation_copy(self):
+        p = self.load_policy(
+            {"name": "sg-used", "resource": "security-group", "filters": ["used"]},
+            config=Config.empty(cache='memory', cache_period=5))
+        f = p.resource_manager.filters[0]
+        self.patch(p.resource_manager._cache, 'data', {})
+        self.patch(f, 'get_scanners', lambda: (('lambdas', lambda: {'sg-1': {'func-a'}}),))
+        used = f.process([{'GroupId': 'sg-1', 'VpcId': 'vpc-1'}])
+        used[0]['c7n:UsedBy']['lambdas'].append('func-b')
+        self.assertEqual(f.get_usage_graph().refs['sg-1'], {'lambdas': ['func-a']})
+
     def test_used(self):
         factory = self.replay_flight_data("test_security_group_used")
         p = self.load_policy(
@@ -343,7 +343,7 @@ class AzureModeCommon:
 
             ctx.metrics.put_metric("ResourceCount", len(resources), "Count", Scope="Policy")
             ctx.metrics.put_metric("ResourceTime", rt, "Seconds", Scope="Policy")
-            ctx.output.write_file("resources.json", utils.dumps(resources, indent=2))
+            ctx.output.write_resources(resources)
 
             at = time.time()
             for action in policy.resource_manager.actions:
@@ -5,7 +5,6 @@ import time
 
 from dateutil.tz import tz
 
-from c7n import utils
 from c7n.exceptions import PolicyValidationError
 from c7n.policy import execution, ServerlessExecutionMode, PullMode
 from c7n.utils import local_session, type_schema
@@ -61,7 +60,7 @@ class FunctionMode(ServerlessExecutionMode):
 
             ctx.metrics.put_metric("ResourceCount", len(resources), "Count", Scope="Policy")
             ctx.metrics.put_metric("ResourceTime", rt, "Seconds", Scope="Policy")
-            ctx.output.write_file("resources.json", utils.dumps(resources, indent=2))
+            ctx.output.write_resources(resources)
 
             for action in self.policy.resource_manager.actions:
                 if isinstance(action, EventAction):  # pragma: no cover
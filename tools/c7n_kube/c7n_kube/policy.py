@@ -178,7 +178,7 @@ class ValidatingControllerMode(K8sEventMode):
             if "debug" in event:
                 self.policy.log.info("Invoking actions %s", self.policy.resource_manager.actions)
 
-            ctx.output.write_file("resources.json", dumps(resources, indent=2))
+            ctx.output.write_resources(resources)
             for action in self.policy.resource_manager.actions:
                 self.policy.log.info(
                     "policy:%s invoking action:%s resources:%d",
@@ -369,7 +369,7 @@ def report_account(account, region, policies_config, output_path, cache_path, de
                     if k in r:
                         k = 'tag:' + k
                     r[k] = v
-        records.extend(policy_records)
+            records.append(r)
     return records
 
 
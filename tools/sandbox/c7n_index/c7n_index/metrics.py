@@ -299,14 +299,14 @@ def index_account_resources(config, account, region, policy, date):
         account['name'], region, policy['name'])
 
     # Look for AWS profile in config before Instance role
-    records = s3_resource_parser.record_set(
+    records = list(s3_resource_parser.record_set(
         lambda: SessionFactory(
             region, profile=account.get('profile'),
             assume_role=account.get('role'))(),
         bucket,
         key_prefix,
         date,
-        specify_hour=True)
+        specify_hour=True))
 
     for r in records:
         # Adding Custodian vars to each record